@@ -0,0 +1,57 @@
+"""
+Compare the binary `WireCodec` against pydantic's JSON for a few typical
+  events. Prints the encoded size and the per-call time of encoding and
+  decoding each event.
+
+Usage: python src/debug/bench_codec.py
+"""
+import sys, pathlib, timeit
+
+cd = pathlib.Path(__file__).parent.resolve()
+project_dir = cd.parent.parent.resolve()
+sys.path.insert(0, str(project_dir))
+
+from src.wonderland.models import User
+from src.wonderland.pubsub.codec import WireCodec
+from src.wonderland.pubsub.events import CreateItemInputEvent, LookInputEvent
+from src.wonderland.pubsub.events.look import LookOutputEvent
+from src.wonderland.session import Session
+
+
+def per_call(fn, number: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+def bench(name: str, event, number: int = 20_000):
+    klass = type(event)
+    wire = WireCodec.encode(event)
+    json = event.model_dump_json()
+    if hasattr(event, "_wire"):
+        # Measure a cold encode, not the memoized bytes
+        def wire_encode():
+            event._wire = None
+            WireCodec.encode(event)
+    else:
+        def wire_encode():
+            WireCodec.encode(event)
+    rows = [
+        ("wire", len(wire), per_call(wire_encode, number), per_call(lambda: WireCodec.decode(wire), number)),
+        ("json", len(json), per_call(event.model_dump_json, number), per_call(lambda: klass.model_validate_json(json), number)),
+    ]
+    print(f"\n{name}")
+    print(f"  {'codec':<6} {'bytes':>7} {'encode µs':>10} {'decode µs':>10}")
+    for codec, size, enc, dec in rows:
+        print(f"  {codec:<6} {size:>7} {enc:>10.2f} {dec:>10.2f}")
+
+
+if __name__ == "__main__":
+    session = Session(user=User(id=1, name="Mad Hatter", room_id=1))
+    bench("LookInputEvent", LookInputEvent(session=session, raw_message="look"))
+    bench("CreateItemInputEvent", CreateItemInputEvent(session=session, raw_message="create apple", item_name="apple"))
+    markup = "You look around the Pleasant Garden." + " You see an apple." * 200
+    bench("LookOutputEvent (200 things)", LookOutputEvent(markup=markup))
+
+    event = LookOutputEvent(markup=markup)
+    WireCodec.encode(event)
+    shared = per_call(lambda: WireCodec.encode(event), 200_000)
+    print(f"\nBroadcast: re-encoding a memoized output event costs {shared:.3f} µs per recipient")
@@ -0,0 +1,59 @@
+"""
+Measure the per-call overhead of the hot crud queries. Each query is timed
+  twice: through `crud`, whose statements are built once, and as a `select`
+  rebuilt on every call like the crud functions used to do. Then prints the
+  hit rate of SQLAlchemy's compiled cache.
+
+Runs against a throwaway database in a temporary directory.
+
+Usage: python src/debug/bench_queries.py [calls per query]
+"""
+import os, sys, pathlib, tempfile, timeit
+
+cd = pathlib.Path(__file__).parent.resolve()
+project_dir = cd.parent.parent.resolve()
+sys.path.insert(0, str(project_dir))
+os.chdir(tempfile.mkdtemp())
+
+from sqlmodel import select
+
+from src.wonderland import crud
+from src.wonderland.core.db import StatementCache, new_session
+from src.wonderland.models import LandCreate, Room, RoomCreate, Thing, ThingCreate, User, UserCreate
+
+
+def per_call(fn, number: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+def populate(orm) -> tuple[int, int]:
+    user = crud.create_user(session=orm, data=UserCreate(name="alice"))
+    land = crud.create_land(session=orm, data=LandCreate(name="Wonderland", owner_id=user.id))
+    room = crud.create_room(session=orm, data=RoomCreate(name="Hall", description="A long hall."), land_id=land.id)
+    things = [ThingCreate(name=name) for name in ("key", "bottle", "cake") * 10]
+    crud.create_things_for_room_bulk(session=orm, data=things, room_id=room.id)
+    return user.id, room.id
+
+
+if __name__ == "__main__":
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+    orm = new_session()
+    user_id, room_id = populate(orm)
+    queries = {
+        "get_room": (
+            lambda: crud.get_room(session=orm, room_id=room_id),
+            lambda: orm.exec(select(Room).where(Room.id == room_id)).one(),
+        ),
+        "list_things_by_room": (
+            lambda: crud.list_things_by_room(session=orm, room_id=room_id),
+            lambda: orm.exec(select(Thing).where(Thing.room_id == room_id)).all(),
+        ),
+        "get_user_by_name": (
+            lambda: crud.get_user_by_name(session=orm, name="alice"),
+            lambda: orm.exec(select(User).where(User.name == "alice")).first(),
+        ),
+    }
+    print(f"{'query':<22}{'prebuilt':>12}{'rebuilt':>12}")
+    for name, (prebuilt, rebuilt) in queries.items():
+        print(f"{name:<22}{per_call(prebuilt, number):>10.1f}µs{per_call(rebuilt, number):>10.1f}µs")
+    print(f"Compiled cache: {StatementCache.stats()}")
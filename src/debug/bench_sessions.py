@@ -0,0 +1,58 @@
+"""
+Measure the memory cost of live sessions and of the input events which
+  reference them. Opens 10k sessions, each with its own logged in user, then
+  creates one input event per session. Finally hibernates 90% of the
+  sessions, as if idle, and measures what stays resident.
+
+Usage: python src/debug/bench_sessions.py [session count]
+"""
+import sys, pathlib, tracemalloc
+
+cd = pathlib.Path(__file__).parent.resolve()
+project_dir = cd.parent.parent.resolve()
+sys.path.insert(0, str(project_dir))
+
+from src.wonderland.models import User
+from src.wonderland.pubsub.events import LookInputEvent
+from src.wonderland.session import SessionRegistry
+
+
+def measure(fn) -> tuple[int, object]:
+    before, _ = tracemalloc.get_traced_memory()
+    result = fn()
+    after, _ = tracemalloc.get_traced_memory()
+    return after - before, result
+
+
+def open_sessions(count: int) -> list:
+    return [
+        SessionRegistry.open(user=User(id=index, name=f"Player {index}", room_id=index % 100))
+        for index in range(1, count + 1)
+    ]
+
+
+def reference_sessions(sessions: list) -> list:
+    return [LookInputEvent(session=session, raw_message="look") for session in sessions]
+
+
+def hibernate_idle(sessions: list, active: int):
+    for session in sessions[active:]:
+        SessionRegistry.hibernate(session.id)
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    active = count // 10
+    tracemalloc.start()
+    session_bytes, sessions = measure(lambda: open_sessions(count))
+    event_bytes, events = measure(lambda: reference_sessions(sessions))
+    print(f"{count} sessions: {session_bytes / 2**20:.2f} MiB, {session_bytes / count:.0f} bytes per session")
+    print(f"{count} input events: {event_bytes / 2**20:.2f} MiB, {event_bytes / count:.0f} bytes per event")
+    print(f"Sessions in room 1: {len(SessionRegistry.in_room(1))}")
+
+    del events
+    freed, _ = measure(lambda: hibernate_idle(sessions, active))
+    tracemalloc.stop()
+    # The session shells are still held here, as a connected client would
+    print(f"After hibernating {count - active} idle sessions: {-freed / 2**20:.2f} MiB released")
+    print(f"Sessions: {SessionRegistry.stats()}")
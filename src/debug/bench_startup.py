@@ -0,0 +1,65 @@
+"""
+Measure the cold start of the app with `python -X importtime`, in a fresh
+  interpreter: the time spent importing wonderland's own modules, the time
+  spent importing dependencies, and the time `App()` takes to build.
+
+Exits with status 1 when wonderland's own startup (its imports plus building
+  the app) exceeds the budget, so it can gate CI.
+
+Usage: python src/debug/bench_startup.py [budget in ms] [runs]
+"""
+import sys, pathlib, subprocess
+
+cd = pathlib.Path(__file__).parent.resolve()
+project_dir = cd.parent.parent.resolve()
+
+BUDGET_MS = 200.0
+"""Wonderland's own import and build time, dependencies excluded. Declaring
+  the SQLModel tables in `models` takes most of it."""
+
+CHILD = """
+import time
+from src.wonderland.app import App
+imported = time.perf_counter()
+App()
+print((time.perf_counter() - imported) * 1000)
+"""
+
+
+def measure() -> dict[str, float]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD],
+        cwd=project_dir,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    own = dependencies = 0.0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        if name.strip().startswith("src."):
+            own += int(self_us) / 1000
+        else:
+            dependencies += int(self_us) / 1000
+    return {
+        "own_imports_ms": own,
+        "dependency_imports_ms": dependencies,
+        "build_ms": float(result.stdout.strip().splitlines()[-1]),
+    }
+
+
+if __name__ == "__main__":
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else BUDGET_MS
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    # The fastest run is the least disturbed by the rest of the machine
+    best = min((measure() for _ in range(runs)), key=lambda r: r["own_imports_ms"] + r["build_ms"])
+    startup = best["own_imports_ms"] + best["build_ms"]
+    print(f"wonderland imports:  {best['own_imports_ms']:8.1f} ms")
+    print(f"dependency imports:  {best['dependency_imports_ms']:8.1f} ms")
+    print(f"App() build:         {best['build_ms']:8.1f} ms")
+    print(f"startup (own):       {startup:8.1f} ms, budget {budget:.1f} ms")
+    if startup > budget:
+        print("Startup budget exceeded.")
+        sys.exit(1)
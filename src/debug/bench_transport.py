@@ -0,0 +1,96 @@
+"""
+Measure the bytes sent per output event to a client, for each transport mode:
+  plain markup, permessage-deflate with and without a shared context, and
+  structured room deltas with and without deflate. Replays a player looking
+  around a large room again and again while other players now and then add
+  or take things, then checks the client rebuilds every message.
+
+Runs against a throwaway database in a temporary directory.
+
+Usage: python src/debug/bench_transport.py [looks]
+"""
+import os, sys, json, pathlib, random, tempfile, time
+
+cd = pathlib.Path(__file__).parent.resolve()
+project_dir = cd.parent.parent.resolve()
+sys.path.insert(0, str(project_dir))
+os.chdir(tempfile.mkdtemp())
+
+from src.wonderland import crud
+from src.wonderland.core.db import new_session
+from src.wonderland.core.snapshots import RoomSnapshots
+from src.wonderland.models import LandCreate, RoomCreate, ThingCreate, UserCreate
+from src.wonderland.pubsub.events.base import BaseOutputEvent
+from src.wonderland.pubsub.events.look import LookOutputEvent, RoomView
+from src.wonderland.render import LookRenderer
+from src.wonderland.transport import DeflateParams, DeltaDecoder, OutboundStream, PerMessageDeflate
+
+NAMES = [f"{color} {item}" for color in ("red", "green", "blue", "golden", "tiny") for item in ("key", "bottle", "cake", "teacup", "rose", "card")]
+
+
+def record(looks: int) -> list[BaseOutputEvent]:
+    """The output events of a player looking around, `looks` times."""
+    rng = random.Random(0)
+    orm = new_session()
+    user = crud.create_user(session=orm, data=UserCreate(name="alice"))
+    land = crud.create_land(session=orm, data=LandCreate(name="Wonderland", owner_id=user.id))
+    room = crud.create_room(session=orm, data=RoomCreate(name="Great Hall", description="A long, low hall, lit up by a row of lamps."), land_id=land.id)
+    things = [ThingCreate(name=rng.choice(NAMES)) for _ in range(2_000)]
+    crud.create_things_for_room_bulk(session=orm, data=things, room_id=room.id)
+    events = []
+    for idx in range(looks):
+        if idx % 10 == 9:
+            # Someone else changed the room
+            if rng.random() < 0.5:
+                thing = crud.create_thing_for_room(session=orm, data=ThingCreate(name=rng.choice(NAMES)), room_id=room.id)
+                events.append(BaseOutputEvent(markup=f"Bob drops a {thing.name}."))
+            else:
+                thing_id, name = rng.choice(RoomSnapshots.get(room.id).things)
+                crud.delete_thing_by_id(session=orm, thing_id=thing_id, room_id=room.id)
+                events.append(BaseOutputEvent(markup=f"Bob picks up a {name}."))
+        snapshot = RoomSnapshots.get(room.id)
+        events.append(LookOutputEvent(markup=LookRenderer.render(snapshot), room=RoomView.from_snapshot(snapshot)))
+    return events
+
+
+def replay(events: list[BaseOutputEvent], deflate: DeflateParams | None, deltas: bool) -> tuple[dict, float]:
+    stream = OutboundStream(deflate=deflate, deltas=deltas)
+    client_deflate = PerMessageDeflate(deflate, is_server=False) if deflate is not None else None
+    client_deltas = DeltaDecoder()
+    encode_seconds = 0.0
+    for event in events:
+        started = time.perf_counter()
+        message = stream.encode(event)
+        encode_seconds += time.perf_counter() - started
+        data = message.data
+        if client_deflate is not None:
+            data = client_deflate.decompress(data, message.compressed)
+        if not deltas:
+            assert data.decode() == event.markup
+            continue
+        body = json.loads(data)
+        if "room" in body:
+            view = client_deltas.apply(body["room"])
+            assert view == event.room, (view, event.room)
+        else:
+            assert body["markup"] == event.markup
+    return stream.stats(), encode_seconds / len(events) * 1e6
+
+
+if __name__ == "__main__":
+    looks = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    events = record(looks)
+    modes = {
+        "plain": (None, False),
+        "deflate, no context takeover": (DeflateParams(server_context_takeover=False), False),
+        "deflate, shared context": (DeflateParams(), False),
+        "deltas": (None, True),
+        "deltas + deflate, shared context": (DeflateParams(), True),
+    }
+    print(f"{len(events)} output events, {looks} of them looks at a room of 2,000 things")
+    print(f"  {'mode':<34} {'bytes/event':>11} {'vs plain':>9} {'encode µs':>10}")
+    plain = None
+    for mode, (deflate, deltas) in modes.items():
+        stats, encode_us = replay(events, deflate, deltas)
+        plain = plain or stats["bytes_per_event"]
+        print(f"  {mode:<34} {stats['bytes_per_event']:>11.1f} {stats['bytes_per_event'] / plain:>8.1%} {encode_us:>10.2f}")
@@ -0,0 +1,27 @@
+"""
+Feed a recorded event journal back through the Topic. Useful to rebuild the
+  world after a crash, or to reproduce a performance problem with the exact
+  sequence of events that caused it.
+
+Usage: python src/debug/replay_journal.py [JOURNAL_DIR]
+"""
+import sys, pathlib, time
+
+cd = pathlib.Path(__file__).parent.resolve()
+project_dir = cd.parent.parent.resolve()
+sys.path.insert(0, str(project_dir))
+
+from src.wonderland.app import App as Wonderland
+from src.wonderland.core.db import new_session
+from src.wonderland.pubsub.journal import Journal
+from src.wonderland.session import Session
+
+
+if __name__ == "__main__":
+    directory = sys.argv[1] if len(sys.argv) > 1 else None
+    Session.set_orm(new_session())
+    Wonderland()
+    started = time.perf_counter()
+    count = Journal.replay(directory)
+    elapsed = time.perf_counter() - started
+    print(f"Replayed {count} events in {elapsed:.3f}s ({count / max(elapsed, 1e-9):,.0f} events/s)")
@@ -0,0 +1,86 @@
+"""
+Replay a recorded session trace (see `TraceRecorder`) against a fresh database
+  seeded like the debug client's, then compare its outputs and performance
+  with a stored baseline. Exits with status 1 on a mismatch, a regression or
+  a missing baseline.
+
+Usage: python src/debug/replay_trace.py TRACE [--baseline FILE] [--update-baseline] [--speed X] [--runs N]
+
+The trace is replayed --runs times (`Settings.TRACE_RUNS`), each time in a
+  new process on a new database, and the median of the replays is compared.
+  The baseline defaults to TRACE with a `.baseline.json` suffix. It is only
+  written with --update-baseline: once on a new machine, then after intended
+  changes. Baselines hold timings of the machine they were made on and are
+  not committed. With --speed 1 the trace is replayed in real time, the default
+  is full speed: compare a replay with a baseline made at the same speed.
+"""
+import os, sys, argparse, json, pathlib, subprocess, tempfile
+
+cd = pathlib.Path(__file__).parent.resolve()
+project_dir = cd.parent.parent.resolve()
+sys.path.insert(0, str(project_dir))
+launch_dir = pathlib.Path.cwd()
+os.chdir(tempfile.mkdtemp())
+
+from src.debug.seed import seed_data_for_debug
+from src.wonderland.app import App as Wonderland
+from src.wonderland.core.db import new_session
+from src.wonderland.core.settings import Settings
+from src.wonderland.session import Session
+from src.wonderland.trace import ReplayResult, TraceReplayer, load_baseline, save_baseline
+
+
+def replay_once(trace: pathlib.Path, speed: float | None) -> ReplayResult:
+    """Replay the trace in a new process, on its own database and with its own peak RSS."""
+    command = [sys.executable, __file__, str(trace), "--once"]
+    if speed is not None:
+        command += ["--speed", str(speed)]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode:
+        sys.exit(f"A replay failed:\n{completed.stderr}")
+    return ReplayResult.from_baseline(json.loads(completed.stdout))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a session trace and check it against its baseline.")
+    parser.add_argument("trace", type=pathlib.Path)
+    parser.add_argument("--baseline", type=pathlib.Path)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--speed", type=float)
+    parser.add_argument("--runs", type=int, default=Settings.TRACE_RUNS)
+    parser.add_argument("--once", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    trace = launch_dir / args.trace
+    baseline_path = launch_dir / (args.baseline or trace.with_suffix(".baseline.json"))
+
+    if args.once:
+        # A fresh database, in the throwaway directory
+        orm = new_session()
+        Session.set_orm(orm)
+        seed_data_for_debug(orm)
+        result = TraceReplayer(Wonderland, speed=args.speed).replay(trace)
+        print(json.dumps(result.as_baseline()))
+        sys.exit(0)
+
+    baseline = None
+    if not args.update_baseline:
+        baseline = load_baseline(baseline_path)
+        if baseline is None:
+            sys.exit(f"FAILED no baseline at {baseline_path}, write one with --update-baseline")
+
+    result = ReplayResult.median([replay_once(trace, args.speed) for _ in range(args.runs)])
+    rss = f"{result.peak_rss_mb:.1f} MB" if result.peak_rss_mb is not None else "n/a"
+    print(
+        f"Replayed {result.inputs} inputs {args.runs} times, median {result.events_per_second:,.0f} inputs/s, "
+        f"p99 {result.p99_ms:.3f} ms, peak RSS {rss}, {len(result.outputs)} outputs"
+    )
+    if args.update_baseline:
+        save_baseline(baseline_path, result)
+        print(f"Baseline written to {baseline_path}")
+        sys.exit(0)
+    try:
+        result.check(baseline)
+    except AssertionError as e:
+        print(f"FAILED {type(e).__name__}: {e}")
+        sys.exit(1)
+    print("OK, within the baseline's budgets")
@@ -0,0 +1,43 @@
+"""
+The world the debug tools start from: the Mad Hatter, in the Pleasant Garden.
+"""
+from sqlmodel import Session as OrmSession
+
+from src.wonderland import crud
+from src.wonderland import models as m
+
+
+def seed_data_for_debug(orm: OrmSession) -> m.User:
+    user = crud.get_user_by_name(
+        session=orm,
+        name="Mad Hatter",
+    )
+    if not user:
+        user = crud.create_user(
+            session=orm,
+            data=m.UserCreate(name="Mad Hatter")
+        )
+    if user.room_id is not None:
+        return user
+    land = crud.create_land(
+        session=orm,
+        data=m.LandCreate(
+            name="Wonderland",
+            owner_id=user.id,
+        ),
+    )
+    room = crud.create_room(
+        session=orm,
+        data=m.RoomCreate(
+            name="Pleasant Garden",
+            description="A large table is set under the tree here, just outside the March Hare’s house.",
+        ),
+        land_id=land.id,
+    )
+    user = crud.update_user(
+        session=orm,
+        user=user,
+        field="room_id",
+        value=room.id,
+    )
+    return user
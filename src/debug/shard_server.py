@@ -0,0 +1,73 @@
+"""
+Play the debug world split over several worker processes, one per land, see
+  `ShardRouter`. Lines are read from the standard input and the outputs of
+  the shards are printed as they come back. Walk "east" from the Pleasant
+  Garden to be handed off to the shard of the Croquet Ground.
+
+Runs against a throwaway database in a temporary directory.
+
+Usage: python src/debug/shard_server.py [shards]
+"""
+import os, sys, pathlib, tempfile, threading, time
+
+cd = pathlib.Path(__file__).parent.resolve()
+project_dir = cd.parent.parent.resolve()
+sys.path.insert(0, str(project_dir))
+if __name__ == "__main__":
+    # Not in the shard processes, which re-import this module: they inherit
+    # the working directory, and so the database, of the router.
+    os.chdir(tempfile.mkdtemp())
+
+from src.debug.seed import seed_data_for_debug
+from src.wonderland import crud
+from src.wonderland import models as m
+from src.wonderland.app import App as Wonderland
+from src.wonderland.core.db import new_session
+from src.wonderland.pubsub.events.base import BaseOutputEvent
+from src.wonderland.pubsub.topic import Topic
+from src.wonderland.session import Session
+from src.wonderland.shard import ShardRouter
+
+
+def seed_second_land(orm, user: m.User):
+    """A second land, east of the Pleasant Garden."""
+    land = crud.create_land(session=orm, data=m.LandCreate(name="Queen's Garden", owner_id=user.id))
+    room = crud.create_room(
+        session=orm,
+        data=m.RoomCreate(name="Croquet Ground", description="The croquet balls are live hedgehogs."),
+        land_id=land.id,
+    )
+    for name, source_id, target_id in (("east", user.room_id, room.id), ("west", room.id, user.room_id)):
+        crud.create_room_portal(session=orm, data=m.RoomPortalCreate(name=name, source_id=source_id, target_id=target_id))
+
+
+answered = threading.Event()
+
+
+def print_output(connection_id: int, event: BaseOutputEvent):
+    print(event.markup, flush=True)
+    answered.set()
+
+
+if __name__ == "__main__":
+    shards = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+    orm = new_session()
+    Session.set_orm(orm)
+    user = seed_data_for_debug(orm)
+    seed_second_land(orm, user)
+
+    router = ShardRouter(shards=shards, on_output=print_output)
+    router.start()
+    # Parsed and throttled here, handled by the shard owning the player's room
+    wonderland = Wonderland(push=router.push_event)
+    Topic.add_handler(BaseOutputEvent, lambda event, **kwargs: print_output(0, event))
+    session = Session(user=user)
+    router.connect(session)
+    for line in sys.stdin:
+        answered.clear()
+        wonderland.handle_input(session, line.rstrip("\n"))
+        # Let the shard answer (and hand the player off) before the next
+        # line, the first one waits for the workers to start.
+        if answered.wait(timeout=30):
+            time.sleep(0.2)
+    router.close()
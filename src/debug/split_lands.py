@@ -0,0 +1,29 @@
+"""
+Split the global database into one database per land: move the rooms,
+  things and portals of every land into LANDS_DIR/land_<id>.db, renumbering
+  them into the land's id range. Users and lands stay in database.db.
+
+Stop the server and back up database.db first. Then start the server with
+  Settings.LAND_SHARDS_DIR set to the same directory.
+
+Usage: python src/debug/split_lands.py [LANDS_DIR]
+"""
+import sys, pathlib
+
+cd = pathlib.Path(__file__).parent.resolve()
+project_dir = cd.parent.parent.resolve()
+sys.path.insert(0, str(project_dir))
+
+from src.wonderland.core.db import new_session
+from src.wonderland.core.settings import Settings
+from src.wonderland.core.storage import LandStorage
+
+
+if __name__ == "__main__":
+    Settings.LAND_SHARDS_DIR = pathlib.Path(sys.argv[1] if len(sys.argv) > 1 else "lands")
+    # Creates the tables of a fresh database, as the server would
+    new_session().close()
+    moved = LandStorage.split()
+    for land_id, count in sorted(moved.items()):
+        print(f"Land {land_id}: {count} records moved to {Settings.LAND_SHARDS_DIR / LandStorage.shard_of_land(land_id)}.db")
+    print(f"Split {len(moved)} lands, {sum(moved.values())} records.")
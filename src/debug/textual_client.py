@@ -13,49 +13,15 @@ from textual import on
 from textual.app import App, ComposeResult
 from textual.widgets import Header, Footer, Input, Log
 
-from src.wonderland import models as m
 from src.wonderland.pubsub.events.base import BaseOutputEvent
 from src.wonderland.pubsub.topic import Topic
+from src.wonderland.pubsub.journal import Journal
 from src.wonderland.app import App as Wonderland
-from src.wonderland import crud
-from src.wonderland.session import Session
-from src.wonderland.core.db import new_session, OrmSession
-
-
-def seed_data_for_debug(orm: OrmSession) -> m.User:
-    user = crud.get_user_by_name(
-        session=orm,
-        name="Mad Hatter",
-    )
-    if not user:
-        user = crud.create_user(
-            session=orm,
-            data=m.UserCreate(name="Mad Hatter")
-        )
-    if user.room_id is not None:
-        return user
-    land = crud.create_land(
-        session=orm,
-        data=m.LandCreate(
-            name="Wonderland",
-            owner_id=user.id,
-        ),
-    )
-    room = crud.create_room(
-        session=orm,
-        data=m.RoomCreate(
-            name="Pleasant Garden",
-            description="A large table is set under the tree here, just outside the March Hare’s house.",
-        ),
-        land_id=land.id,
-    )
-    user = crud.update_user(
-        session=orm,
-        user=user,
-        field="room_id",
-        value=room.id,
-    )
-    return user
+from src.wonderland.session import SessionRegistry
+from src.wonderland.core.compaction import Compactor
+from src.wonderland.core.db import new_session
+from src.wonderland.trace import TraceRecorder
+from src.debug.seed import seed_data_for_debug
 
 
 class CliApp(App):
@@ -93,9 +59,20 @@ class CliApp(App):
 
         # Construct a new wonderland session
         # TODO: Consider renaming to context?
-        self.session = Session(user=user)
+        self.session = SessionRegistry.open(user=user)
         self.session.set_orm(self.orm)
-        self.wonderland = Wonderland()
+        # Record every line of input, for performance replays
+        self.trace = TraceRecorder()
+        self.trace.attach()
+        self.wonderland = Wonderland(trace=self.trace)
+
+        # Record every input event so the session can be replayed later
+        self.journal = Journal()
+        self.journal.attach()
+
+        # Purge deleted things in the background
+        self.compactor = Compactor()
+        self.compactor.start()
 
         # Define a simple subscriber for output events
         log_output = self.query_one("#app-output")
@@ -107,18 +84,12 @@ class CliApp(App):
     def on_input(self, event: Input.Submitted) -> None:
         """When the user hits return within the Input element."""
         event.input.clear()
-        # Ignore empty commands
-        if not event.value.strip():
-            return
-        cmd = self.wonderland.command_registry.get_command(event.value)
-        wevent = cmd.get_event(
-            session=self.session,
-            raw_message=event.value,
-            **cmd.parse(event.value),
-        )
-        Topic.push(wevent)
+        self.wonderland.handle_input(self.session, event.value)
 
     def on_unmount(self) -> None:
+        self.compactor.stop()
+        self.journal.close()
+        self.trace.close()
         Topic.close()
 
 
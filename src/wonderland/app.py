@@ -1,19 +1,191 @@
-from src.wonderland.commands.factory import CommandFactory
+from typing import Callable
+
+from src.wonderland.commands.base import BaseCommand
+from src.wonderland.commands.limits import RateLimiter
+from src.wonderland.commands.manifest import CommandSpec
 from src.wonderland.commands.registry import CommandRegistry
 from src.wonderland.pubsub import events
+from src.wonderland.pubsub.events.base import BaseInputEvent
+from src.wonderland.pubsub.events.help import HelpDocument
+from src.wonderland.pubsub.events.throttle import ThrottledOutputEvent
+from src.wonderland.pubsub.topic import Topic
+from src.wonderland.session import Session, SessionRegistry
+from src.wonderland.trace import TraceRecorder
 
 
 class App:
-    def __init__(self):
-        self.command_classes = []
+    def __init__(
+            self,
+            rate_limiter: RateLimiter | None = None,
+            trace: TraceRecorder | None = None,
+            push: Callable[[BaseInputEvent], None] | None = None,
+    ):
+        """
+        :param rate_limiter: Throttles the input of each session. Defaults to
+            the limits in `Settings`.
+        :param trace: Records every line of input, to replay it later.
+        :param push: Where input events go. Defaults to `Topic.push`, e.g.
+            `ShardRouter.push_event` sends them to the shard of the player.
+        """
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter()
+        self.trace = trace
+        self.push = push if push is not None else Topic.push
+        self.command_specs: list[CommandSpec] = []
         self.build_commands()
         self.command_registry = CommandRegistry()
-        self.command_registry.load_commands()
+        self.command_registry.declare(*self.command_specs)
+        self.command_registry.subscribe(HelpDocument.rebuild)
 
     def build_commands(self):
-        self.command_classes.extend([
-            CommandFactory.create_command(trigger="help", event_class=events.HelpInputEvent),
-            CommandFactory.create_command(trigger="create", event_class=events.CreateItemInputEvent, pos_args=["item_name"]),
-            CommandFactory.create_command(trigger="delete", event_class=events.DeleteItemInputEvent, pos_args=["item_name"]),
-            CommandFactory.create_command(trigger="look", event_class=events.LookInputEvent),
+        """
+        Declare the commands. Their classes and event modules are only built
+        and imported when a player first uses them, see `CommandSpec`.
+        """
+        self.command_specs.extend([
+            CommandSpec(
+                "look",
+                "look:LookInputEvent",
+                description="Describe your environment.",
+            ),
+            CommandSpec(
+                "create",
+                "create_item:CreateItemInputEvent",
+                pos_args=["item_name"],
+                description="Create something and drop it on the ground.\nExample: create apple",
+            ),
+            CommandSpec(
+                "delete",
+                "delete_thing:DeleteItemInputEvent",
+                pos_args=["item_name"],
+                description="Make something here vanish.\nExample: delete apple",
+            ),
+            CommandSpec(
+                "go",
+                "go:GoInputEvent",
+                pos_args=["exit"],
+                description="Walk through an exit of the room.\nExample: go north",
+            ),
+            CommandSpec(
+                "batch",
+                "batch:BatchInputEvent",
+                pos_args=["script"],
+                description=(
+                    "Run several commands at once, in a single step.\n"
+                    "Commands are separated by ; or new lines.\n"
+                    "Example: batch create apple; create pear; look"
+                ),
+            ),
+            CommandSpec(
+                "help",
+                "help:HelpInputEvent",
+                description="Shows this help message.",
+            ),
+            CommandSpec(
+                "memory",
+                "memory:MemoryInputEvent",
+                pos_args=["action"],
+                description=(
+                    "Report where the server's memory goes.\n"
+                    "memory start: trace allocations, memory diff: write the growth since the last diff to disk, "
+                    "memory stop: stop tracing."
+                ),
+                admin=True,
+            ),
         ])
+
+    def handle_input(self, session: Session, raw: str) -> BaseInputEvent | None:
+        """
+        Turn a line of input into an event and push it to the Topic.
+
+        The line is matched against the session's active command context
+        first (e.g. the answer to a prompt), then against the registry.
+
+        Several commands separated by `;` or new lines, or given to the
+        `batch` command, are pushed as a single `BatchInputEvent`.
+
+        Input over the session's rate limit is rejected before any event is
+        built, and a `ThrottledOutputEvent` is pushed instead. Of a batch,
+        the commands up to the first one over its limit still run.
+
+        A hibernated session is resumed first, see `SessionRegistry.touch`.
+
+        :param session: The session which sent the input.
+        :param raw: The line of input.
+        :return: The pushed event, `None` for blank input.
+        """
+        if not raw.strip():
+            return None
+        if self.trace is not None:
+            self.trace.record(session, raw)
+        SessionRegistry.touch(session)
+        trigger, *script = raw.split(maxsplit=1)
+        is_batch = trigger.lower() == "batch"
+        if is_batch:
+            raw_script = script[0] if script else ""
+        else:
+            raw_script = raw
+        lines = self.command_registry.split_script(raw_script)
+        if not lines:
+            return None
+        commands = [self.resolve_command(session, line) for line in lines]
+        allowed = self.rate_limiter.allow(session, [command.trigger for command in commands])
+        if not allowed:
+            Topic.push(ThrottledOutputEvent(
+                markup="You are doing that too fast. Take a breath and try again.",
+            ))
+            return None
+        throttled = lines[allowed:]
+        commands, lines = commands[:allowed], lines[:allowed]
+        if len(lines) == 1 and not is_batch:
+            event = self.build_event(session, commands[0], lines[0])
+        else:
+            event = events.BatchInputEvent(
+                session=session,
+                raw_message=raw,
+                events=[
+                    self.build_event(session, command, line)
+                    for command, line in zip(commands, lines)
+                ],
+            )
+        self.push(event)
+        if throttled:
+            Topic.push(ThrottledOutputEvent(
+                markup=(
+                    f"You are doing that too fast, only the first {allowed} of "
+                    f"{allowed + len(throttled)} commands ran. Take a breath and "
+                    f"send the last {len(throttled)} again."
+                ),
+            ))
+        return event
+
+    def resolve_command(self, session: Session, raw: str) -> BaseCommand:
+        """
+        Find the command for a single line of input, in the session's active
+        context first, then in the registry. Admin commands are unknown to
+        players who are not admins, see `User.is_admin`.
+        """
+        context = session.active_context()
+        if context is not None:
+            command = context.resolve(raw)
+            if command is not None:
+                return command
+        command = self.command_registry.get_command(raw)
+        if command.admin and (session.user is None or not session.user.is_admin):
+            return self.command_registry.get_command("help")
+        return command
+
+    @staticmethod
+    def build_event(session: Session, command: BaseCommand, raw: str) -> BaseInputEvent:
+        """
+        Build the input event of a resolved command.
+
+        :param session: The session which sent the input.
+        :param command: The command, see `resolve_command`.
+        :param raw: The line of input.
+        :return: The input event, not pushed yet.
+        """
+        return command.get_event(
+            session=session,
+            raw_message=raw,
+            **command.parse(raw),
+        )
@@ -1,19 +1,37 @@
+import typing as t
+
 from pydantic import BaseModel
 
 from src.wonderland.pubsub.events.base import BaseEvent
 
 
 class BaseCommand(BaseModel):
+    registered: t.ClassVar[bool] = True
+    """Whether `CommandRegistry` loads this command class."""
+
     trigger: str
     pos_args: list[str]
     opt_args: list[str]
     event_class: type[BaseEvent]
+    description: str = ""
+    admin: bool = False
+    """Only users with `User.is_admin` may run it, it is unknown to the others."""
+
+    @property
+    def usage(self) -> str:
+        """A one line synopsis of the command, e.g. `create <item_name>`."""
+        parts = [self.trigger]
+        parts.extend(f"<{arg}>" for arg in self.pos_args)
+        parts.extend(f"[{arg} <{arg}>]" for arg in self.opt_args)
+        return " ".join(parts)
 
     def parse(self, raw: str) -> dict[str, str]:
         """
         This looks bad. I should do a write-up on what's going on here.
         """
-        raw_cp = raw.replace(self.trigger, "").strip()
+        # The trigger is the first word, in any case. Arguments may contain it.
+        _, *rest = raw.split(maxsplit=1)
+        raw_cp = rest[0].strip() if rest else ""
         if len(raw_cp) == 0:
             return dict()
 
@@ -0,0 +1,145 @@
+import time
+import typing as t
+from functools import cache
+
+from src.wonderland.commands.base import BaseCommand
+from src.wonderland.commands.factory import CommandFactory
+from src.wonderland.pubsub.events.base import BaseEvent
+
+
+class PromptCommand(BaseCommand):
+    """
+    A command which only exists within a `CommandContext`.
+
+    Prompt commands are never loaded into the global `CommandRegistry`. An
+    empty trigger makes the command an "answer": the whole line becomes its
+    first positional argument. Preset arguments are passed to the event as
+    is, e.g. the id of the thing picked from a list.
+    """
+
+    registered: t.ClassVar[bool] = False
+    preset: dict[str, t.Any] = {}
+
+    def parse(self, raw: str) -> dict[str, str]:
+        if self.trigger:
+            return super().parse(raw)
+        answer = raw.strip()
+        if not self.pos_args or not answer:
+            return dict()
+        return {self.pos_args[0]: answer}
+
+    def get_event(self, **args) -> BaseEvent:
+        return self.event_class(**self.preset, **args)
+
+
+@cache
+def _prompt_command(trigger: str, event_class: type[BaseEvent], pos_args: tuple[str, ...] = ()) -> type[PromptCommand]:
+    """The `PromptCommand` class of an answer, built once and reused by every prompt."""
+    return CommandFactory.create_command(
+        trigger=trigger,
+        event_class=event_class,
+        pos_args=list(pos_args),
+        base=PromptCommand,
+    )
+
+
+class CommandContext:
+    """
+    A table of commands which is only available for a while, such as the
+    answers to a prompt.
+
+    **Notes:**
+
+    -   Each session has a stack of contexts, the top one is active. Input is
+        resolved against the active context first, by its first word, with a
+        single dictionary lookup.
+
+    -   A context may have a fallback command which receives any input that
+        did not match, e.g. the username typed at the login prompt.
+
+    -   A context expires `timeout` seconds after it was last used. An expired
+        context is dropped and input is resolved by the root registry again.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            commands: t.Iterable[BaseCommand] = (),
+            *,
+            fallback: BaseCommand | None = None,
+            timeout: float | None = None,
+    ):
+        self.name = name
+        self.fallback = fallback
+        self.timeout = timeout
+        self._table: dict[str, BaseCommand] = {command.trigger: command for command in commands}
+        self._last_used = time.monotonic()
+
+    def __repr__(self):
+        return f"CommandContext({self.name!r}, {list(self._table)!r})"
+
+    @property
+    def commands(self) -> list[BaseCommand]:
+        return list(self._table.values())
+
+    def expired(self, now: float | None = None) -> bool:
+        if self.timeout is None:
+            return False
+        return (now or time.monotonic()) - self._last_used > self.timeout
+
+    def resolve(self, raw: str) -> BaseCommand | None:
+        """
+        Find the command for a line of input.
+
+        :param raw: The line of input.
+        :return: The matching command, the fallback, or `None`.
+        """
+        self._last_used = time.monotonic()
+        trigger, _, _ = raw.strip().partition(" ")
+        return self._table.get(trigger.lower(), self.fallback)
+
+    @classmethod
+    def prompt(
+            cls,
+            name: str,
+            *,
+            event_class: type[BaseEvent],
+            answer_arg: str,
+            timeout: float | None = None,
+            **preset: t.Any,
+    ) -> "CommandContext":
+        """
+        Build a context where any input is the answer to a question.
+
+        :param name: The name of the context.
+        :param event_class: The event created from the answer.
+        :param answer_arg: The event field receiving the answer.
+        :param timeout: Seconds before the prompt is abandoned.
+        :param preset: Extra fields passed to the event.
+        :return: The new context.
+        """
+        answer = _prompt_command("", event_class, (answer_arg,))
+        return cls(name, fallback=answer(preset=preset), timeout=timeout)
+
+    @classmethod
+    def choice(
+            cls,
+            name: str,
+            options: t.Mapping[str, tuple[type[BaseEvent], dict[str, t.Any]]],
+            *,
+            timeout: float | None = None,
+    ) -> "CommandContext":
+        """
+        Build a context offering a fixed set of answers, e.g. "yes" / "no" or
+        a numbered list of things.
+
+        :param name: The name of the context.
+        :param options: The event class and preset event fields per answer.
+        :param timeout: Seconds before the choice is abandoned.
+        :return: The new context.
+        """
+        commands = [
+            _prompt_command(trigger, event_class)(preset=preset)
+            for trigger, (event_class, preset) in options.items()
+        ]
+        return cls(name, commands, timeout=timeout)
@@ -16,19 +16,24 @@ class CommandFactory:
             trigger: str,
             event_class: type[BaseEvent],
             pos_args: list[str] | None = None,
-            opt_args: list[str] | None = None
+            opt_args: list[str] | None = None,
+            description: str = "",
+            admin: bool = False,
+            base: type[BaseCommand] = BaseCommand,
     ) -> type[BaseCommand]:
         if pos_args is None:
             pos_args = []
         if opt_args is None:
             opt_args = []
         klass = create_model(
-            trigger.capitalize() + 'Command',
-            __base__=BaseCommand,
+            (trigger or "answer").capitalize() + 'Command',
+            __base__=base,
             trigger=(str, trigger),
             event_class=(t.Type[BaseEvent], event_class),
             pos_args=(t.List[str], pos_args),
             opt_args=(t.List[str], opt_args),
+            description=(str, description),
+            admin=(bool, admin),
         )
         # klass = type(trigger.capitalize() + 'Command', (BaseCommand,), {
         #     "trigger": trigger,
@@ -0,0 +1,107 @@
+import time
+from collections import Counter
+from typing import Callable, Sequence
+
+from src.wonderland.core.settings import Settings
+from src.wonderland.session import Session
+
+
+class TokenBucket:
+    """
+    Allows `rate` actions per second on average, with bursts of up to
+    `capacity` actions.
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def refill(self, now: float) -> float:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.tokens
+
+
+class RateLimiter:
+    """
+    Throttle the commands of each session before they become events.
+
+    **Notes:**
+
+    -   Every session gets one token bucket per command trigger it used, so
+        cheap commands (`look`) and expensive ones (`create`) have separate
+        budgets, see `Settings.RATE_LIMITS`. The number of triggers is fixed,
+        so a session costs constant memory.
+
+    -   Buckets live on the session itself. A session's input is handled by
+        one thread at a time, so checking a bucket takes no lock.
+
+    -   The allowed / throttled counters are best effort under concurrency.
+    """
+
+    def __init__(
+            self,
+            limits: dict[str, tuple[float, float]] | None = None,
+            default: tuple[float, float] = Settings.RATE_LIMIT_DEFAULT,
+            clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        :param limits: Commands per second and burst size, per trigger.
+        :param default: The limit of the triggers missing from `limits`.
+        :param clock: Seconds, e.g. the trace time of a replay, see `TraceReplayer`.
+        """
+        self.limits = Settings.RATE_LIMITS if limits is None else limits
+        self.default = default
+        self.clock = clock
+        self.allowed: Counter[str] = Counter()
+        self.throttled: Counter[str] = Counter()
+
+    def allow(self, session: Session, triggers: Sequence[str]) -> int:
+        """
+        Spend one token per command, in order, until a command is over its
+        limit. A batch larger than a bucket's capacity can still run in parts.
+
+        :param session: The session sending the commands.
+        :param triggers: The trigger of each command, repeated per use.
+        :return: How many of the first commands may run, the rest are throttled.
+        """
+        now = self.clock()
+        # Read the private attribute directly, pydantic's attribute lookup
+        # for private fields costs more than the rest of this method.
+        buckets = session.__pydantic_private__["_buckets"]
+        if len(triggers) == 1:
+            trigger = triggers[0]
+            bucket = buckets.get(trigger) or self._new_bucket(buckets, trigger, now)
+            if bucket.refill(now) < 1:
+                self.throttled[trigger] += 1
+                return 0
+            bucket.tokens -= 1
+            self.allowed[trigger] += 1
+            return 1
+        refilled = set()
+        for idx, trigger in enumerate(triggers):
+            bucket = buckets.get(trigger) or self._new_bucket(buckets, trigger, now)
+            if trigger not in refilled:
+                bucket.refill(now)
+                refilled.add(trigger)
+            if bucket.tokens < 1:
+                self.throttled.update(triggers[idx:])
+                return idx
+            bucket.tokens -= 1
+            self.allowed[trigger] += 1
+        return len(triggers)
+
+    def _new_bucket(self, buckets: dict[str, TokenBucket], trigger: str, now: float) -> TokenBucket:
+        rate, capacity = self.limits.get(trigger, self.default)
+        bucket = buckets[trigger] = TokenBucket(rate, capacity, now)
+        return bucket
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        return {
+            "allowed": dict(self.allowed),
+            "throttled": dict(self.throttled),
+        }
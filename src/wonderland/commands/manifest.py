@@ -0,0 +1,71 @@
+import importlib
+import typing as t
+
+from src.wonderland.commands.base import BaseCommand
+from src.wonderland.commands.factory import CommandFactory
+from src.wonderland.pubsub.events.base import BaseEvent
+
+
+EVENTS_PACKAGE = "src.wonderland.pubsub.events"
+
+
+class CommandSpec:
+    """
+    A command declared by name, without importing its event module or
+    building its command class.
+
+    **Notes:**
+
+    -   The event class is given as `"module:ClassName"`, relative to the
+        events package, e.g. `"look:LookInputEvent"`. Importing the module
+        registers its handlers, so handlers are only loaded once a player
+        first uses the command.
+
+    -   `materialize` builds the command class with `CommandFactory`. The
+        `CommandRegistry` does so the first time the trigger is typed.
+
+    -   A spec describes itself like a command (`trigger`, `description`,
+        `usage`...), so the help document is rendered without
+        materializing anything.
+    """
+
+    __slots__ = ("trigger", "event", "pos_args", "opt_args", "description", "admin")
+
+    def __init__(
+            self,
+            trigger: str,
+            event: str,
+            *,
+            pos_args: t.Sequence[str] = (),
+            opt_args: t.Sequence[str] = (),
+            description: str = "",
+            admin: bool = False,
+    ):
+        self.trigger = trigger
+        self.event = event
+        self.pos_args = list(pos_args)
+        self.opt_args = list(opt_args)
+        self.description = description
+        self.admin = admin
+
+    def __repr__(self):
+        return f"CommandSpec({self.trigger!r}, {self.event!r})"
+
+    # Only reads `trigger`, `pos_args` and `opt_args`
+    usage = BaseCommand.usage
+
+    def event_class(self) -> type[BaseEvent]:
+        """Import the event module and return the event class."""
+        module, _, name = self.event.partition(":")
+        return getattr(importlib.import_module(f"{EVENTS_PACKAGE}.{module}"), name)
+
+    def materialize(self) -> type[BaseCommand]:
+        """Build the command class."""
+        return CommandFactory.create_command(
+            trigger=self.trigger,
+            event_class=self.event_class(),
+            pos_args=self.pos_args,
+            opt_args=self.opt_args,
+            description=self.description,
+            admin=self.admin,
+        )
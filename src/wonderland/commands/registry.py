@@ -1,19 +1,99 @@
+from typing import Callable
+
 from src.wonderland.commands.base import BaseCommand
+from src.wonderland.commands.manifest import CommandSpec
 
 
 class CommandRegistry:
     def __init__(self):
-        self._map_by_trigger = dict()
+        self._map_by_trigger: dict[str, BaseCommand | CommandSpec] = dict()
+        self._listeners: list[Callable[["CommandRegistry"], None]] = list()
         self.load_commands()
 
     def load_commands(self):
         for klass in BaseCommand.__subclasses__():
+            if not klass.registered:
+                continue
             instance = klass()
             self._map_by_trigger[instance.trigger] = instance
+        self._notify()
+
+    def register(self, command: BaseCommand):
+        """Add a command, replacing any command with the same trigger."""
+        self._map_by_trigger[command.trigger] = command
+        self._notify()
+
+    def declare(self, *specs: CommandSpec):
+        """
+        Add commands which are only built when their trigger is first used,
+        replacing any command with the same trigger.
+        """
+        for spec in specs:
+            self._map_by_trigger[spec.trigger] = spec
+        self._notify()
+
+    def _materialize(self, trigger: str) -> BaseCommand | None:
+        command = self._map_by_trigger.get(trigger)
+        if command.__class__ is CommandSpec:
+            command = self._map_by_trigger[trigger] = command.materialize()()
+        return command
+
+    def remove(self, trigger: str) -> BaseCommand | CommandSpec | None:
+        """Remove the command with the given trigger, if any."""
+        command = self._map_by_trigger.pop(trigger, None)
+        if command is not None:
+            self._notify()
+        return command
+
+    @property
+    def commands(self) -> list[BaseCommand]:
+        """The registered commands, in registration order. Builds every declared command."""
+        return [self._materialize(trigger) for trigger in list(self._map_by_trigger)]
+
+    @property
+    def declared(self) -> list[BaseCommand | CommandSpec]:
+        """The registered commands, in registration order, as they are."""
+        return list(self._map_by_trigger.values())
+
+    def subscribe(self, listener: Callable[["CommandRegistry"], None]):
+        """
+        Call the listener now, and again whenever commands are registered or
+        removed.
+
+        :param listener: Called with the registry.
+        """
+        self._listeners.append(listener)
+        listener(self)
+
+    def _notify(self):
+        for listener in self._listeners:
+            listener(self)
+
+    @staticmethod
+    def split_script(raw: str) -> list[str]:
+        """
+        Split input into commands on `;` and new lines, in a single pass.
+        Separators within double quotes are kept.
+
+        :param raw: One or more commands.
+        :return: The non-blank commands, in order.
+        """
+        lines = []
+        start = 0
+        quoted = False
+        for idx, char in enumerate(raw):
+            if char == '"':
+                quoted = not quoted
+            elif not quoted and char in ";\n":
+                lines.append(raw[start:idx])
+                start = idx + 1
+        lines.append(raw[start:])
+        return [line.strip() for line in lines if line.strip()]
 
     def get_command(self, raw: str, help_on_none=True) -> BaseCommand:
-        for trigger, command in self._map_by_trigger.items():
-            if raw.startswith(trigger):
-                return command
+        trigger, _, _ = raw.strip().partition(" ")
+        command = self._materialize(trigger.lower())
+        if command is not None:
+            return command
         if help_on_none:
-            return self._map_by_trigger.get("help")
+            return self._materialize("help")
@@ -0,0 +1,165 @@
+import time
+from logging import Logger, getLogger
+from threading import Event, Thread
+from typing import Iterable
+
+from sqlalchemy import Engine, bindparam, delete, func, select, update
+
+from src.wonderland.core.settings import Settings
+from src.wonderland.core.storage import LandStorage
+from src.wonderland.models import RoomPortal, Thing
+
+
+class Compactor:
+    """
+    Purge deleted things and give their space back to the file system, in the
+    background.
+
+    **Notes:**
+
+    -   Deleting a thing only marks it deleted (a tombstone), see
+        `crud.delete_thing_by_id`. The compactor later removes the tombstones
+        for good, `batch` at a time, oldest first.
+
+    -   The contents of a purged container are deleted too, and their own
+        contents, down to the last level: they become tombstones themselves
+        and are purged by a following slice.
+
+    -   A portal whose key is purged loses its key (`key_id` is nulled), in
+        its land's database or any other. A locked portal without a key can
+        only be unlocked by a builder.
+
+    -   Each slice then runs `PRAGMA incremental_vacuum` for at most
+        `vacuum_pages` pages, so the database file shrinks without a full
+        `VACUUM` locking it for seconds. Only databases created with
+        `auto_vacuum = INCREMENTAL` (see `core.db`) shrink, an older one must
+        be vacuumed once by hand first.
+
+    -   A slice works on a single database and holds its write lock briefly.
+        With lands in their own databases (see `LandStorage`) the slices go
+        round every database in turn.
+    """
+
+    def __init__(
+            self,
+            *,
+            interval: float = Settings.COMPACTION_INTERVAL,
+            batch: int = Settings.COMPACTION_BATCH,
+            vacuum_pages: int = Settings.COMPACTION_VACUUM_PAGES,
+    ):
+        self.interval = interval
+        self.batch = batch
+        self.vacuum_pages = vacuum_pages
+        self.slices = 0
+        self.purged = 0
+        """Tombstones removed so far."""
+        self.cascaded = 0
+        """Things deleted because a container they are in was purged."""
+        self.unkeyed = 0
+        """Portals whose key was purged."""
+        self.pages_freed = 0
+        self._logger: Logger = getLogger("Compactor")
+        self._stop = Event()
+        self._thread: Thread | None = None
+        self._next_shard = 0
+
+    def run_slice(self, engine: Engine, others: Iterable[Engine] = ()) -> int:
+        """
+        Purge one batch of tombstones from a database, then free some pages.
+
+        :param engine: The database.
+        :param others: The other databases, whose portals may be unlocked by
+            a purged thing, see `LandStorage`.
+        :return: How many tombstones were purged.
+        """
+        table = Thing.__table__
+        with engine.begin() as connection:
+            thing_ids = connection.execute(
+                select(table.c.id)
+                .where(table.c.deleted_at != None)  # noqa: E711
+                .order_by(table.c.deleted_at)
+                .limit(self.batch)
+            ).scalars().all()
+            if thing_ids:
+                parameters = [{"thing_id": thing_id} for thing_id in thing_ids]
+                contents = select(table.c.id).where(table.c.id.in_(thing_ids)).cte("contents", recursive=True)
+                contents = contents.union(select(table.c.id).where(table.c.container_id == contents.c.id))
+                connection.execute(
+                    update(table)
+                    .where(table.c.id.in_(select(contents.c.id)), table.c.deleted_at == None)  # noqa: E711
+                    .values(deleted_at=time.time(), version=table.c.version + 1)
+                )
+                # The driver has no row count for a statement starting with `WITH`
+                cascaded = connection.execute(select(func.changes())).scalar()
+                self.unkeyed += self._unkey(connection, parameters)
+                for other in others:
+                    # Committed apart, the keys were tombstones already
+                    with other.begin() as other_connection:
+                        self.unkeyed += self._unkey(other_connection, parameters)
+                connection.execute(delete(table).where(table.c.id == bindparam("thing_id")), parameters)
+                self.purged += len(thing_ids)
+                self.cascaded += cascaded
+        connection = engine.raw_connection()
+        try:
+            sqlite = connection.driver_connection
+            free_pages = sqlite.execute("PRAGMA freelist_count").fetchone()[0]
+            if free_pages:
+                # `executescript` steps the pragma to the end, `execute` would
+                # only free a single page.
+                sqlite.executescript(f"PRAGMA incremental_vacuum({int(self.vacuum_pages)});")
+                self.pages_freed += free_pages - sqlite.execute("PRAGMA freelist_count").fetchone()[0]
+        finally:
+            connection.close()
+        self.slices += 1
+        return len(thing_ids)
+
+    @staticmethod
+    def _unkey(connection, parameters: list[dict]) -> int:
+        table = RoomPortal.__table__
+        unkeyed = connection.execute(
+            update(table)
+            .where(table.c.key_id == bindparam("thing_id"))
+            .values(key_id=None, version=table.c.version + 1),
+            parameters,
+        ).rowcount
+        return max(unkeyed, 0)
+
+    def run_once(self) -> int:
+        """Run one slice on the next database in turn."""
+        shards = LandStorage.shards()
+        shard_id = shards[self._next_shard % len(shards)]
+        self._next_shard += 1
+        others = [LandStorage.engine(other) for other in shards if other != shard_id]
+        return self.run_slice(LandStorage.engine(shard_id), others)
+
+    def stats(self) -> dict:
+        return {
+            "slices": self.slices,
+            "purged": self.purged,
+            "cascaded": self.cascaded,
+            "unkeyed": self.unkeyed,
+            "pages_freed": self.pages_freed,
+        }
+
+    # +-----------------------------------------------------------------------+
+    # |                              T H R E A D                              |
+    # +-----------------------------------------------------------------------+
+    def start(self):
+        """Run slices in a background thread, every `interval` seconds."""
+        self._stop.clear()
+        self._thread = Thread(target=self._run, name="compactor", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                # Retried by the next slice, e.g. when the database was busy
+                self._logger.exception("Compaction slice failed")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -1,13 +1,133 @@
+from sqlalchemy import Table, event, literal
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.interfaces import CacheStats
 from sqlmodel import create_engine, Session as OrmSession, SQLModel
 
+from src.wonderland.core.storage import LandStorage
+
 engine = create_engine("sqlite:///database.db")
 
 
 def new_session() -> OrmSession:
     """
-    Generate a new ORM session.
+    Generate a new ORM session. With `Settings.LAND_SHARDS_DIR` set, the
+    session routes each land to its own database, see `LandStorage`.
 
     :returns: the new ORM session.
     """
     SQLModel.metadata.create_all(engine)
+    upgrade(engine)
+    return open_session()
+
+
+def upgrade(database: Engine, tables: list[Table] | None = None):
+    """
+    Bring the tables of a database created by an older version up to date:
+    `create_all` creates missing tables, but never changes existing ones.
+    Missing columns are added (with their default, for the existing rows)
+    and missing indexes are created. Safe to run on every start.
+
+    :param database: The database to upgrade.
+    :param tables: The tables to upgrade, defaults to every table.
+    """
+    tables = tables if tables is not None else list(SQLModel.metadata.tables.values())
+    with database.begin() as connection:
+        for table in tables:
+            existing = {row[1] for row in connection.exec_driver_sql(f'PRAGMA table_info("{table.name}")')}
+            for column in table.columns:
+                if column.name not in existing:
+                    connection.exec_driver_sql(_add_column(table, column, database))
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+
+
+def _add_column(table: Table, column, database: Engine) -> str:
+    ddl = f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column.type.compile(dialect=database.dialect)}'
+    default = column.default.arg if column.default is not None and column.default.is_scalar else None
+    if default is not None:
+        value = literal(default, column.type).compile(dialect=database.dialect, compile_kwargs={"literal_binds": True})
+        ddl += f" DEFAULT {value}"
+        if not column.nullable:
+            # SQLite only adds a NOT NULL column which has a default
+            ddl += " NOT NULL"
+    return ddl
+
+
+def open_session() -> OrmSession:
+    """
+    Open an ORM session on a database which is already set up, e.g. a short
+    lived one in a background thread.
+
+    :returns: the new ORM session.
+    """
+    if LandStorage.enabled():
+        return LandStorage.new_session()
     return OrmSession(engine)
+
+
+def incremental_vacuum(database: Engine):
+    """
+    Create the database of an engine with `auto_vacuum = INCREMENTAL`, so the
+    `Compactor` can give the pages freed by deletes back in small slices.
+    Only applies to a database without tables yet.
+
+    :param database: An engine of wonderland, not yet connected.
+    """
+    event.listen(database, "connect", _incremental_vacuum)
+
+
+def _incremental_vacuum(dbapi_connection, connection_record):
+    dbapi_connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
+
+incremental_vacuum(engine)
+
+
+# +---------------------------------------------------------------------------+
+# |                       S T A T E M E N T   C A C H E                       |
+# +---------------------------------------------------------------------------+
+class StatementCache:
+    """
+    Count how often SQLAlchemy's compiled cache served the statements sent to
+    the database.
+
+    **Notes:**
+
+    -   A miss means the statement was compiled to SQL again. The hot crud
+        queries are built once, at import, with bound parameters, so after
+        warming up every call should be a hit.
+
+    -   Counted for every engine, from the `after_cursor_execute` event.
+    """
+
+    _counts: dict[CacheStats, int] = {stat: 0 for stat in CacheStats}
+
+    def __new__(cls, *args, **kwargs):
+        """This class is not meant to be instantiated."""
+        raise NotImplementedError("Will not instantiate StatementCache class.")
+
+    @classmethod
+    def count(cls, stat: CacheStats):
+        cls._counts[stat] += 1
+
+    @classmethod
+    def stats(cls) -> dict:
+        hits = cls._counts[CacheStats.CACHE_HIT]
+        misses = cls._counts[CacheStats.CACHE_MISS]
+        return {
+            "hits": hits,
+            "misses": misses,
+            "uncached": sum(cls._counts.values()) - hits - misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        }
+
+    @classmethod
+    def reset(cls):
+        for stat in cls._counts:
+            cls._counts[stat] = 0
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _count_cache_hit(connection, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        StatementCache.count(context.cache_hit)
@@ -0,0 +1,170 @@
+import gc
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+from threading import Lock
+from types import FunctionType, ModuleType
+
+from pydantic import BaseModel
+from sqlalchemy.orm import InstanceState, Session as SaSession
+
+from src.wonderland.core.settings import Settings
+from src.wonderland.pubsub.events.base import BaseEvent
+from src.wonderland.pubsub.topic import Topic
+from src.wonderland.session import Session, SessionRegistry
+
+_OPAQUE = (type, ModuleType, FunctionType, InstanceState, SaSession)
+"""Counted without what they reference: shared by everything, or the ORM's own bookkeeping."""
+
+
+def deep_sizeof(obj: object) -> int:
+    """
+    The bytes taken by an object and everything it references, each object
+    counted once. Pydantic models are followed through their fields and
+    private attributes, ORM instances through their columns only.
+    """
+    seen = set()
+    stack = [obj]
+    size = 0
+    while stack:
+        current = stack.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        size += sys.getsizeof(current)
+        if isinstance(current, _OPAQUE):
+            continue
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        elif isinstance(current, BaseModel):
+            stack.append(current.__dict__)
+            if current.__pydantic_private__:
+                stack.append(current.__pydantic_private__)
+        elif hasattr(current, "__dict__"):
+            stack.append(current.__dict__)
+        elif hasattr(current, "__slots__"):
+            stack.extend(getattr(current, slot) for slot in current.__slots__ if hasattr(current, slot))
+    return size
+
+
+class MemoryAccounting:
+    """
+    Tell where the memory of a running server goes.
+
+    **Notes:**
+
+    -   `report` counts the live events per class, sizes the queued events
+        and every live session, and reads the size of the ORM identity map.
+        It walks the whole heap (`gc.get_objects`), so it is meant for an
+        admin now and then, not for a periodic metric.
+
+    -   `start` traces allocations with `tracemalloc`, which slows every
+        allocation down until `stop`. Each `diff` compares the heap with the
+        previous diff (or with `start`) and writes the biggest growth to
+        `Settings.MEMORY_DIR`, along with the snapshot itself, so it can be
+        reloaded with `tracemalloc.Snapshot.load` and compared later.
+
+    -   Sizes are those of the objects and everything they reference, shared
+        objects (e.g. the `User` of two sessions) are counted in both.
+    """
+
+    _snapshot: tracemalloc.Snapshot | None = None
+    _diffs: int = 0
+    _lock = Lock()
+
+    def __new__(cls, *args, **kwargs):
+        """This class is not meant to be instantiated."""
+        raise NotImplementedError("Will not instantiate MemoryAccounting class.")
+
+    # +-----------------------------------------------------------------------+
+    # |                              R E P O R T                              |
+    # +-----------------------------------------------------------------------+
+    @classmethod
+    def report(cls, topic: Topic | None = None) -> dict:
+        """
+        Account for the memory held by events, sessions and the ORM.
+
+        :param topic: The topic whose queue to size, defaults to the active one.
+        :return: The report, JSON serializable.
+        """
+        topic = topic or Topic.active()
+        events = Counter(type(obj).__qualname__ for obj in gc.get_objects() if isinstance(obj, BaseEvent))
+        lanes = Counter()
+        queued = topic.queued()
+        for lane, event in queued:
+            lanes[lane] += deep_sizeof(event)
+        live, hibernated = SessionRegistry.snapshot()
+        sessions = [deep_sizeof(session) for session in live]
+        orm = getattr(Session, "orm", None)
+        traced, peak = tracemalloc.get_traced_memory()
+        return {
+            "events": dict(events.most_common()),
+            "queue": {"depth": len(queued), "bytes": sum(lanes.values()), "lanes": dict(lanes)},
+            "orm": {"identity_map": len(orm.identity_map) if orm is not None else 0},
+            "sessions": {
+                "live": len(sessions),
+                "bytes": sum(sessions),
+                "mean_bytes": sum(sessions) / len(sessions) if sessions else 0.0,
+                "max_bytes": max(sessions, default=0),
+                "hibernated": len(hibernated),
+                "hibernated_bytes": sum(len(record) for record in hibernated),
+            },
+            "tracemalloc": {"tracing": tracemalloc.is_tracing(), "bytes": traced, "peak_bytes": peak},
+        }
+
+    # +-----------------------------------------------------------------------+
+    # |                         T R A C E M A L L O C                         |
+    # +-----------------------------------------------------------------------+
+    @classmethod
+    def start(cls, frames: int = Settings.MEMORY_TRACE_FRAMES):
+        """Trace allocations, from now on the reference of the next `diff`."""
+        with cls._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+            cls._snapshot = cls._take()
+
+    @classmethod
+    def diff(cls, directory: Path | str | None = None, *, top: int = Settings.MEMORY_TOP_STATS) -> Path:
+        """
+        Write the allocations which grew since the last diff to disk.
+
+        :param directory: Where to write, defaults to `Settings.MEMORY_DIR`.
+        :param top: Lines of the diff, biggest growth first.
+        :return: The diff, a text file next to its `.snapshot`.
+        :raises RuntimeError: When allocations are not traced, see `start`.
+        """
+        with cls._lock:
+            if not tracemalloc.is_tracing() or cls._snapshot is None:
+                raise RuntimeError("Allocations are not traced, start tracing first.")
+            directory = Path(directory or Settings.MEMORY_DIR)
+            directory.mkdir(parents=True, exist_ok=True)
+            snapshot = cls._take()
+            stats = snapshot.compare_to(cls._snapshot, "lineno")
+            cls._diffs += 1
+            path = directory / f"memory-{time.strftime('%Y%m%d-%H%M%S')}-{cls._diffs:04d}.txt"
+            growth = sum(stat.size_diff for stat in stats)
+            lines = [f"{growth / 1024:+,.1f} KiB in {len(stats)} places since the previous snapshot."]
+            lines.extend(str(stat) for stat in stats[:top])
+            path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+            snapshot.dump(str(path.with_suffix(".snapshot")))
+            cls._snapshot = snapshot
+            return path
+
+    @classmethod
+    def stop(cls):
+        with cls._lock:
+            tracemalloc.stop()
+            cls._snapshot = None
+
+    @staticmethod
+    def _take() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ))
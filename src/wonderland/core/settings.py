@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 
@@ -9,3 +10,131 @@ class Settings:
     VERSION = "0.1.0"
     BASE_DIR = Path(__file__).resolve().parent.parent
     SRC_DIR = BASE_DIR.parent
+
+    # +-----------------------------------------------------------------------+
+    # |                             J O U R N A L                             |
+    # +-----------------------------------------------------------------------+
+    JOURNAL_DIR = Path("journal")
+    JOURNAL_SEGMENT_BYTES = 16 * 1024 * 1024
+    JOURNAL_COMMIT_INTERVAL = 0.002
+    JOURNAL_COMMIT_BATCH = 512
+
+    # +-----------------------------------------------------------------------+
+    # |                              M E M O R Y                              |
+    # +-----------------------------------------------------------------------+
+    MEMORY_DIR = Path("memory")
+    """Where the "memory" command writes tracemalloc snapshots and diffs."""
+    MEMORY_TRACE_FRAMES = 10
+    """Frames kept per allocation while tracing, more costs memory and time."""
+    MEMORY_TOP_STATS = 30
+    """Lines of a diff, biggest growth first."""
+
+    # +-----------------------------------------------------------------------+
+    # |                               T R A C E                               |
+    # +-----------------------------------------------------------------------+
+    TRACE_DIR = Path("traces")
+    TRACE_RUNS = 5
+    """Replays of a trace, each in its own process, whose median is compared with the baseline."""
+    TRACE_MIN_THROUGHPUT = 0.6
+    """Replayed inputs per second, as a share of the baseline's, below which replay fails."""
+    TRACE_MAX_P99 = 2.0
+    """99th percentile latency, as a multiple of the baseline's, above which replay fails."""
+    TRACE_MAX_RSS = 1.3
+    """Peak resident memory, as a multiple of the baseline's, above which replay fails."""
+
+    # +-----------------------------------------------------------------------+
+    # |                            D A T A B A S E                            |
+    # +-----------------------------------------------------------------------+
+    LAND_SHARDS_DIR: Path | None = None
+    """Directory of the per-land databases, `None` keeps every land in the global one."""
+    LAND_ID_SPAN = 1_000_000_000
+    """Ids allocated by each land database. Never change it once lands were split."""
+
+    # +-----------------------------------------------------------------------+
+    # |                          C O M P A C T I O N                          |
+    # +-----------------------------------------------------------------------+
+    COMPACTION_INTERVAL = 1.0
+    """Seconds between two compaction slices."""
+    COMPACTION_BATCH = 500
+    """Deleted things purged per slice."""
+    COMPACTION_VACUUM_PAGES = 256
+    """Free pages given back to the file system per slice."""
+
+    # +-----------------------------------------------------------------------+
+    # |                           T R A N S P O R T                           |
+    # +-----------------------------------------------------------------------+
+    TRANSPORT_DEFLATE = True
+    """Accept clients offering permessage-deflate, see `transport.negotiate_deflate`."""
+    TRANSPORT_DEFLATE_LEVEL = 6
+    TRANSPORT_DEFLATE_MIN_BYTES = 64
+    """Smaller messages are sent uncompressed, deflate would only grow them."""
+    TRANSPORT_DELTAS = False
+    """Default of the structured delta mode, for clients which did not ask."""
+
+    # +-----------------------------------------------------------------------+
+    # |                              S H A R D S                              |
+    # +-----------------------------------------------------------------------+
+    SHARD_COUNT = os.cpu_count() or 1
+
+    # +-----------------------------------------------------------------------+
+    # |                               T O P I C                               |
+    # +-----------------------------------------------------------------------+
+    TOPIC_LANES = {"system": 8, "output": 4, "input": 1}
+    """Queue lanes and their scheduling weights, highest priority first."""
+    TOPIC_LANE_MAX_WAIT = 0.5
+    """Seconds after which a queued event may take the turn of a higher lane, except "system"'s."""
+
+    # +-----------------------------------------------------------------------+
+    # |                            H A N D L E R S                            |
+    # +-----------------------------------------------------------------------+
+    HANDLER_TIMEOUT = None
+    """Default deadline of event handlers in seconds, `None` runs them inline."""
+    HANDLER_THREADS = 8
+    HANDLER_BREAKER_THRESHOLD = 3
+    """Consecutive timeouts which disable a handler."""
+    HANDLER_BREAKER_COOLDOWN = 30.0
+    DEAD_LETTER_SIZE = 1000
+    HANDLER_CONFLICT_RETRIES = 3
+    """Retries of a handler which lost an optimistic concurrency race."""
+    HANDLER_CONFLICT_BACKOFF = 0.002
+
+    # +-----------------------------------------------------------------------+
+    # |                          S I M U L A T I O N                          |
+    # +-----------------------------------------------------------------------+
+    SIM_TICK_SECONDS = 1.0
+    SIM_MOVE_CHANCE = 0.1
+    """Chance of a wandering entity to take an exit, per tick."""
+    SIM_PERSIST_EVERY = 30
+    """Ticks between two writes of the simulation state to the database."""
+
+    # +-----------------------------------------------------------------------+
+    # |                            S E S S I O N S                            |
+    # +-----------------------------------------------------------------------+
+    SESSION_IDLE_TIMEOUT = 600.0
+    """Seconds without input before a session is hibernated."""
+    SESSION_GRACE = 120.0
+    """Seconds a disconnected session can be resumed by a reconnecting client."""
+    SESSION_SWEEP_INTERVAL = 30.0
+    START_ROOM_ID: int | None = None
+    """The room new users start in, `None` for the first room created."""
+    ADMIN_NAMES: frozenset[str] = frozenset()
+    """Users made admins when they log in, e.g. to run "memory"."""
+
+    # +-----------------------------------------------------------------------+
+    # |                            C O M M A N D S                            |
+    # +-----------------------------------------------------------------------+
+    PROMPT_TIMEOUT = 60.0
+    LOOK_MAX_NAMES = 20
+    """Kinds of things listed by "look", the rest of the room is only counted."""
+    SNAPSHOT_MAX_THINGS = 1000
+    """Things listed by id in a room snapshot, see `RoomSnapshots`."""
+    DELETE_MAX_CHOICES = 10
+    """Things offered when "delete" matches several, the rest are only counted."""
+    RATE_LIMIT_DEFAULT = (5.0, 20.0)
+    """Commands per second and burst size of a session, per command."""
+    RATE_LIMITS = {
+        "look": (10.0, 30.0),
+        "help": (2.0, 10.0),
+        "create": (2.0, 20.0),
+        "delete": (2.0, 20.0),
+    }
@@ -0,0 +1,184 @@
+import time
+import typing as t
+from itertools import count
+from threading import Lock
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session as SaSession
+from sqlmodel import Session as OrmSession
+
+from src.wonderland import crud
+from src.wonderland.core.db import open_session
+from src.wonderland.core.settings import Settings
+from src.wonderland.core.versions import RoomVersions
+from src.wonderland.models import Room, Thing
+
+
+class RoomSnapshot(t.NamedTuple):
+    """What can be seen in a room at one version. Never changes once built."""
+
+    room_id: int
+    version: int
+    name: str
+    description: str | None
+    counts: tuple[tuple[str, int], ...]
+    """How many things of each name, for the first `Settings.LOOK_MAX_NAMES` names."""
+    total: int
+    """How many things are in the room."""
+    things: tuple[tuple[int, str], ...]
+    """Ids and names of the first `Settings.SNAPSHOT_MAX_THINGS` things."""
+    built_at: float
+    """`time.monotonic()` when the snapshot was built."""
+    tick: int = 0
+    """When its build started, on the clock of `RoomSnapshots.invalidate`."""
+
+
+class RoomSnapshots:
+    """
+    The current, immutable snapshot of every room which was looked at.
+
+    **Notes:**
+
+    -   Readers such as "look" take the current snapshot with a single
+        dictionary lookup. They take no lock and do not touch the ORM (but to
+        build the first snapshot of a room), so they do not wait on writers,
+        nor writers on them.
+
+    -   Writers never change a snapshot: once their transaction is committed
+        the room's snapshot is invalidated, and the next reader builds a new
+        one from the database which replaces the old one (copy on write). A
+        writer only pays for a dictionary write, and a room changed many
+        times between two looks is rebuilt once. ORM writes are caught from
+        the session events. Bulk statements bypass them and must call
+        `invalidate` themselves.
+
+    -   A snapshot is only replaced by one whose build started later, so
+        readers racing to rebuild the same room never go back in time. A
+        build which started before an invalidation is stale, even if it
+        finished after it.
+
+    -   Only rooms which were read at least once are kept up to date.
+    """
+
+    _snapshots: dict[int, RoomSnapshot] = dict()
+    _invalidated: dict[int, int] = dict()
+    """The tick of the last invalidation of each room."""
+    _clock = count(1)
+    _publish_lock = Lock()
+
+    rebuilds: int = 0
+    misses: int = 0
+
+    def __new__(cls, *args, **kwargs):
+        """This class is not meant to be instantiated."""
+        raise NotImplementedError("Will not instantiate RoomSnapshots class.")
+
+    @classmethod
+    def get(cls, room_id: int, *, orm: OrmSession | None = None) -> RoomSnapshot:
+        """
+        The current snapshot of a room, built on the first read.
+
+        :param room_id: The room.
+        :param orm: The reader's ORM session. When it changed the room within
+            a transaction not committed yet (e.g. a "batch"), the reader gets
+            a private snapshot including its own changes.
+        :return: The snapshot, safe to use from any thread.
+        """
+        if orm is not None and orm.info.get("transaction_depth"):
+            if room_id in orm.info.get("snapshot_rooms", ()):
+                return cls._build(orm, room_id)
+        snapshot = cls._snapshots.get(room_id)
+        if snapshot is None:
+            cls.misses += 1
+            snapshot = cls._rebuild(room_id)
+        elif snapshot.tick < cls._invalidated.get(room_id, 0):
+            snapshot = cls._rebuild(room_id)
+        return snapshot
+
+    @classmethod
+    def invalidate(cls, *room_ids: int | None):
+        """Mark the snapshots of rooms stale after a commit which changed them."""
+        # `next()` on a counter is atomic, no lock needed
+        tick = next(cls._clock)
+        for room_id in room_ids:
+            if room_id is not None:
+                cls._invalidated[room_id] = tick
+
+    @classmethod
+    def _build(cls, orm: OrmSession, room_id: int) -> RoomSnapshot:
+        # Read before querying: the snapshot is at least as new as its version
+        tick = next(cls._clock)
+        version = RoomVersions.get(room_id)
+        room = crud.get_room(session=orm, room_id=room_id)
+        counts = crud.count_things_by_name_in_room(session=orm, room_id=room_id, limit=Settings.LOOK_MAX_NAMES)
+        things = crud.page_things_by_room(session=orm, room_id=room_id, limit=Settings.SNAPSHOT_MAX_THINGS)
+        total = len(things)
+        if total == Settings.SNAPSHOT_MAX_THINGS:
+            total = crud.count_things_in_room(session=orm, room_id=room_id)
+        return RoomSnapshot(
+            room_id=room_id,
+            version=version,
+            name=room.name,
+            description=room.description,
+            counts=tuple((name, count) for name, count in counts),
+            total=total,
+            things=tuple((thing_id, name) for thing_id, name in things),
+            built_at=time.monotonic(),
+            tick=tick,
+        )
+
+    @classmethod
+    def _rebuild(cls, room_id: int) -> RoomSnapshot:
+        with open_session() as orm:
+            snapshot = cls._build(orm, room_id)
+        with cls._publish_lock:
+            cls.rebuilds += 1
+            current = cls._snapshots.get(room_id)
+            if current is not None and current.tick > snapshot.tick:
+                return current
+            cls._snapshots[room_id] = snapshot
+        return snapshot
+
+    @classmethod
+    def stats(cls) -> dict:
+        now = time.monotonic()
+        snapshots = list(cls._snapshots.values())
+        ages = [now - snapshot.built_at for snapshot in snapshots]
+        return {
+            "rooms": len(snapshots),
+            "rebuilds": cls.rebuilds,
+            "misses": cls.misses,
+            "stale": sum(snapshot.tick < cls._invalidated.get(snapshot.room_id, 0) for snapshot in snapshots),
+            "max_age_seconds": max(ages, default=0.0),
+            "mean_age_seconds": sum(ages) / len(ages) if ages else 0.0,
+        }
+
+    @classmethod
+    def clear(cls):
+        cls._snapshots.clear()
+        cls._invalidated.clear()
+
+
+def _collect_rooms(session: SaSession, flush_context):
+    rooms = session.info.setdefault("snapshot_rooms", set())
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(instance, Thing):
+            rooms.add(instance.room_id)
+            rooms.update(inspect(instance).attrs.room_id.history.deleted)
+        elif isinstance(instance, Room):
+            rooms.add(instance.id)
+
+
+def _publish_rooms(session: SaSession):
+    rooms = session.info.pop("snapshot_rooms", None)
+    if rooms:
+        RoomSnapshots.invalidate(*rooms)
+
+
+def _discard_rooms(session: SaSession, previous_transaction=None):
+    session.info.pop("snapshot_rooms", None)
+
+
+event.listen(SaSession, "after_flush", _collect_rooms)
+event.listen(SaSession, "after_commit", _publish_rooms)
+event.listen(SaSession, "after_soft_rollback", _discard_rooms)
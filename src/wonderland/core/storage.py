@@ -0,0 +1,324 @@
+from pathlib import Path
+from threading import Lock
+from typing import Any, Iterable, Iterator
+
+from sqlalchemy import Connection, Engine, Table, bindparam, delete, insert, select, text, update
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.orm import Mapper, ORMExecuteState
+from sqlalchemy.sql import operators, visitors
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter
+from sqlmodel import Session as OrmSession, SQLModel, create_engine
+
+from src.wonderland.core.settings import Settings
+from src.wonderland.models import Land, Room, RoomPortal, Thing, User
+
+
+GLOBAL = "global"
+"""The shard of users, lands, and of everything created before sharding."""
+
+LAND_TABLES: list[Table] = [Room.__table__, RoomPortal.__table__, Thing.__table__]
+"""The tables stored in the database of each land."""
+
+GLOBAL_TABLES: set[Table] = {User.__table__, Land.__table__}
+"""The tables only stored in the global database."""
+
+
+class _RoutedSession(OrmSession, ShardedSession):
+    """An ORM session whose land databases are opened on first use."""
+
+    def get_bind(self, mapper=None, *, shard_id=None, instance=None, clause=None, **kw) -> Engine:
+        if shard_id is None:
+            shard_id = self._choose_shard_and_assign(mapper, instance=instance, clause=clause)
+        return LandStorage.engine(shard_id)
+
+
+class LandStorage:
+    """
+    Store the rooms, things and portals of each `Land` in its own SQLite
+    database, so builders in different lands never wait on the same writer
+    lock.
+
+    **Notes:**
+
+    -   Users and lands stay in the global database, `core.db.engine`. The
+        rest of a land lives in `Settings.LAND_SHARDS_DIR / land_<id>.db`.
+
+    -   A record's id says where it lives. Each land database allocates ids
+        from its own range, starting at `land_id * Settings.LAND_ID_SPAN`, so
+        routing by id is a division, never a lookup. Smaller ids live in the
+        global database, as does everything when sharding is off or before
+        the database was split, see `split`.
+
+    -   `crud` is unchanged: its queries are routed by the ids they compare
+        (`room_id`, `land_id`, `id`...). A query without any, such as listing
+        every portal, runs on every database and the rows are concatenated.
+
+    -   A thing moved into a room of another land is created again over there,
+        with a new id, see `crud.move_things`.
+
+    -   A transaction writing to several lands commits their databases one
+        after the other, not atomically.
+    """
+
+    _engines: dict[str, Engine] = dict()
+    _lock = Lock()
+
+    def __new__(cls, *args, **kwargs):
+        """This class is not meant to be instantiated."""
+        raise NotImplementedError("Will not instantiate LandStorage class.")
+
+    @classmethod
+    def enabled(cls) -> bool:
+        return Settings.LAND_SHARDS_DIR is not None
+
+    # +-----------------------------------------------------------------------+
+    # |                               S H A R D S                             |
+    # +-----------------------------------------------------------------------+
+    @staticmethod
+    def shard_of_land(land_id: int | None) -> str:
+        if land_id is None or Settings.LAND_SHARDS_DIR is None:
+            return GLOBAL
+        return f"land_{land_id}"
+
+    @classmethod
+    def shard_of_id(cls, record_id: int | None) -> str:
+        """The shard of a room, portal or thing by its id."""
+        if record_id is None:
+            return GLOBAL
+        land_id = record_id // Settings.LAND_ID_SPAN
+        return cls.shard_of_land(land_id) if land_id else GLOBAL
+
+    @classmethod
+    def lands(cls) -> list[int]:
+        """The ids of the lands which have a database."""
+        if Settings.LAND_SHARDS_DIR is None:
+            return []
+        paths = Path(Settings.LAND_SHARDS_DIR).glob("land_*.db")
+        return sorted(int(path.stem.removeprefix("land_")) for path in paths)
+
+    @classmethod
+    def shards(cls) -> list[str]:
+        return [GLOBAL, *(cls.shard_of_land(land_id) for land_id in cls.lands())]
+
+    @classmethod
+    def engine(cls, shard_id: str) -> Engine:
+        """The engine of a shard, creating the land database if needed."""
+        engine = cls._engines.get(shard_id)
+        if engine is not None:
+            return engine
+        with cls._lock:
+            if shard_id not in cls._engines:
+                cls._engines[shard_id] = cls._create_engine(shard_id)
+        return cls._engines[shard_id]
+
+    @classmethod
+    def _create_engine(cls, shard_id: str) -> Engine:
+        # Imported here, `core.db` builds its sessions from this module
+        from src.wonderland.core.db import engine, incremental_vacuum, upgrade
+        if shard_id == GLOBAL:
+            return engine
+        directory = Path(Settings.LAND_SHARDS_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        engine = create_engine(f"sqlite:///{directory / shard_id}.db")
+        incremental_vacuum(engine)
+        SQLModel.metadata.create_all(engine, tables=LAND_TABLES)
+        upgrade(engine, LAND_TABLES)
+        first_id = int(shard_id.removeprefix("land_")) * Settings.LAND_ID_SPAN
+        with engine.begin() as connection:
+            for table in LAND_TABLES:
+                # The tables are AUTOINCREMENT, SQLite then never allocates an
+                # id below the sequence, nor reuses one.
+                connection.execute(
+                    text(
+                        "INSERT INTO sqlite_sequence (name, seq) SELECT :name, :seq "
+                        "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :name)"
+                    ),
+                    {"name": table.name, "seq": first_id},
+                )
+        return engine
+
+    # +-----------------------------------------------------------------------+
+    # |                              R O U T I N G                            |
+    # +-----------------------------------------------------------------------+
+    _routes = {
+        Room.__table__.c.id: "id",
+        Room.__table__.c.land_id: "land",
+        Thing.__table__.c.id: "id",
+        Thing.__table__.c.room_id: "id",
+        Thing.__table__.c.container_id: "id",
+        RoomPortal.__table__.c.id: "id",
+        RoomPortal.__table__.c.source_id: "id",
+    }
+    """The columns a query can be routed by, and whether they hold record or land ids."""
+
+    @classmethod
+    def _choose_shard(cls, mapper: Mapper, instance: Any = None, clause=None) -> str:
+        """Where to write a new record."""
+        if instance is None or mapper.local_table in GLOBAL_TABLES:
+            return GLOBAL
+        if isinstance(instance, Room):
+            return cls.shard_of_land(instance.land_id)
+        if isinstance(instance, RoomPortal):
+            return cls.shard_of_id(instance.source_id)
+        if isinstance(instance, Thing):
+            # A thing carried by a player, in no room nor container, is global
+            return cls.shard_of_id(instance.id or instance.room_id or instance.container_id)
+        return GLOBAL
+
+    @classmethod
+    def _choose_identity(cls, mapper: Mapper, primary_key, **kwargs) -> list[str]:
+        """Where to look for a record by primary key."""
+        if mapper.local_table in GLOBAL_TABLES:
+            return [GLOBAL]
+        return [cls.shard_of_id(primary_key[0])]
+
+    @classmethod
+    def _choose_execute(cls, orm_context: ORMExecuteState) -> Iterable[str]:
+        """Where to run a query."""
+        tables = {mapper.local_table for mapper in orm_context.all_mappers}
+        if tables and tables <= GLOBAL_TABLES:
+            return [GLOBAL]
+        shards = set(cls._route_criteria(orm_context))
+        return sorted(shards) if shards else cls.shards()
+
+    @classmethod
+    def _route_criteria(cls, orm_context: ORMExecuteState) -> Iterator[str]:
+        """The shards of every routable comparison in a query's criteria."""
+        statement = orm_context.statement
+        parameters = orm_context.parameters or {}
+        criteria = getattr(statement, "whereclause", None)
+        if criteria is None:
+            return
+        for element in visitors.iterate(criteria):
+            if not isinstance(element, BinaryExpression):
+                continue
+            route = cls._routes.get(element.left)
+            if route is None or not isinstance(element.right, BindParameter):
+                continue
+            if element.operator is operators.eq:
+                values = [cls._bound_value(element.right, parameters)]
+            elif element.operator is operators.in_op:
+                values = cls._bound_value(element.right, parameters)
+            else:
+                continue
+            for value in values:
+                yield cls.shard_of_land(value) if route == "land" else cls.shard_of_id(value)
+
+    @staticmethod
+    def _bound_value(bind: BindParameter, parameters) -> Any:
+        if isinstance(parameters, dict) and bind.key in parameters:
+            return parameters[bind.key]
+        return bind.effective_value
+
+    # +-----------------------------------------------------------------------+
+    # |                                S P L I T                              |
+    # +-----------------------------------------------------------------------+
+    @classmethod
+    def split(cls) -> dict[int, int]:
+        """
+        Move the rooms, things and portals of every land out of the global
+        database, into the land's own. They are given ids in the land's range
+        and every reference to them follows: players standing in a room,
+        portals, containers and keys.
+
+        Run it with the server stopped, on a backup. Running it again only
+        moves what was created in the global database since.
+
+        :return: How many records moved, per land id.
+        """
+        if not cls.enabled():
+            raise RuntimeError("Set Settings.LAND_SHARDS_DIR to split the lands.")
+        room, portal, thing = LAND_TABLES
+        with cls.engine(GLOBAL).begin() as connection:
+            rooms = [row for row in cls._rows(connection, room) if row["land_id"] is not None]
+            land_of_room = {row["id"]: row["land_id"] for row in rooms}
+            things = cls._rows(connection, thing)
+            land_of_thing = cls._land_of_things(things, land_of_room)
+            things = [row for row in things if row["id"] in land_of_thing]
+            portals = [row for row in cls._rows(connection, portal) if row["source_id"] in land_of_room]
+
+            groups = dict()
+            for table, rows, land_of in (
+                    (room, rooms, lambda row: row["land_id"]),
+                    (thing, things, lambda row: land_of_thing[row["id"]]),
+                    (portal, portals, lambda row: land_of_room[row["source_id"]]),
+            ):
+                for row in rows:
+                    groups.setdefault((table, land_of(row)), []).append(row)
+
+            # Renumber everything first, portals may lead to another land
+            ids = {table: dict() for table in LAND_TABLES}
+            moved = dict()
+            for (table, land_id), rows in groups.items():
+                last_id = cls._reserve_ids(table, land_id, len(rows))
+                first_id = last_id - len(rows) + 1
+                ids[table].update((row["id"], new_id) for row, new_id in zip(rows, range(first_id, last_id + 1)))
+                moved[land_id] = moved.get(land_id, 0) + len(rows)
+
+            rename = {
+                "room_id": ids[room], "source_id": ids[room], "target_id": ids[room],
+                "container_id": ids[thing], "key_id": ids[thing],
+            }
+            for (table, land_id), rows in groups.items():
+                copies = [
+                    {key: rename.get(key, {}).get(value, value) for key, value in row.items()} | {"id": ids[table][row["id"]]}
+                    for row in rows
+                ]
+                with cls.engine(cls.shard_of_land(land_id)).begin() as land_connection:
+                    land_connection.execute(insert(table), copies)
+            for table, renamed in ids.items():
+                if renamed:
+                    statement = delete(table).where(table.c.id == bindparam("old_id"))
+                    connection.execute(statement, [{"old_id": old_id} for old_id in renamed])
+
+            # References left behind in the global database
+            for table, column, renamed in (
+                    (User.__table__, "room_id", ids[room]),
+                    (portal, "target_id", ids[room]),
+                    (portal, "key_id", ids[thing]),
+                    (thing, "container_id", ids[thing]),
+            ):
+                if renamed:
+                    statement = update(table).where(table.c[column] == bindparam("old_id")).values({column: bindparam("new_id")})
+                    connection.execute(statement, [{"old_id": old, "new_id": new} for old, new in renamed.items()])
+        return moved
+
+    @staticmethod
+    def _rows(connection: Connection, table: Table) -> list[dict]:
+        """The rows of the global database which are not in a land's range yet."""
+        statement = select(table).where(table.c.id < Settings.LAND_ID_SPAN).order_by(table.c.id)
+        return [dict(row) for row in connection.execute(statement).mappings()]
+
+    @staticmethod
+    def _land_of_things(things: list[dict], land_of_room: dict[int, int]) -> dict[int, int]:
+        """The land of each thing in a room, or in a container in a room."""
+        land_of_thing = {row["id"]: land_of_room[row["room_id"]] for row in things if row["room_id"] in land_of_room}
+        pending = [row for row in things if row["id"] not in land_of_thing and row["container_id"] is not None]
+        while pending:
+            found = [row for row in pending if row["container_id"] in land_of_thing]
+            if not found:
+                break
+            for row in found:
+                land_of_thing[row["id"]] = land_of_thing[row["container_id"]]
+            pending = [row for row in pending if row["id"] not in land_of_thing]
+        return land_of_thing
+
+    @classmethod
+    def _reserve_ids(cls, table: Table, land_id: int, count: int) -> int:
+        """Allocate ids in the database of a land, returning the last one."""
+        with cls.engine(cls.shard_of_land(land_id)).begin() as connection:
+            return connection.execute(
+                text("UPDATE sqlite_sequence SET seq = seq + :count WHERE name = :name RETURNING seq"),
+                {"name": table.name, "count": count},
+            ).scalar_one()
+
+    @classmethod
+    def new_session(cls) -> OrmSession:
+        """An ORM session routing every record to its land's database."""
+        for shard_id in cls.shards():
+            cls.engine(shard_id)
+        return _RoutedSession(
+            shard_chooser=cls._choose_shard,
+            identity_chooser=cls._choose_identity,
+            execute_chooser=cls._choose_execute,
+        )
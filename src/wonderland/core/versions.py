@@ -0,0 +1,64 @@
+from itertools import count
+
+from sqlalchemy import event, inspect
+
+from src.wonderland.models import Room, Thing, User
+
+
+class RoomVersions:
+    """
+    A version counter per room, bumped whenever what is visible in the room
+    changes: its things, its occupants, its name or its description.
+
+    **Notes:**
+
+    -   Versions are bumped from ORM flush events, so every change made
+        through the ORM is caught no matter which code path made it. Bulk
+        `update()` / `delete()` statements bypass the ORM and must call
+        `bump` themselves.
+
+    -   Versions come from one process-wide monotonic clock, so a version is
+        never reused even if a room is deleted and its id recycled. Caches
+        keyed by `(room_id, version)` never serve stale entries.
+    """
+
+    _clock = count(1)
+    _versions: dict[int, int] = dict()
+
+    def __new__(cls, *args, **kwargs):
+        """This class is not meant to be instantiated."""
+        raise NotImplementedError("Will not instantiate RoomVersions class.")
+
+    @classmethod
+    def get(cls, room_id: int | None) -> int:
+        """The current version of a room, 0 if it never changed."""
+        return cls._versions.get(room_id, 0)
+
+    @classmethod
+    def bump(cls, *room_ids: int | None):
+        """Mark rooms as changed."""
+        for room_id in room_ids:
+            if room_id is not None:
+                # `next()` on a counter is atomic, no lock needed
+                cls._versions[room_id] = next(cls._clock)
+
+
+def _bump_current_room(mapper, connection, target):
+    RoomVersions.bump(target.room_id)
+
+
+def _bump_old_and_new_room(mapper, connection, target):
+    history = inspect(target).attrs.room_id.history
+    RoomVersions.bump(target.room_id, *history.deleted)
+
+
+def _bump_room(mapper, connection, target):
+    RoomVersions.bump(target.id)
+
+
+for _model in (Thing, User):
+    event.listen(_model, "after_insert", _bump_current_room)
+    event.listen(_model, "after_update", _bump_old_and_new_room)
+    event.listen(_model, "after_delete", _bump_current_room)
+event.listen(Room, "after_update", _bump_room)
+event.listen(Room, "after_delete", _bump_room)
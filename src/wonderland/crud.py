@@ -1,7 +1,15 @@
-from typing import Any, Sequence
-
-from sqlmodel import Session, select
-
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from typing import TYPE_CHECKING, Any, Iterator, Sequence
+
+from sqlalchemy import bindparam, inspect
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.exc import StaleDataError
+from sqlmodel import Session, func, select, update
+
+from src.wonderland.core.settings import Settings
+from src.wonderland.core.storage import LandStorage
 from src.wonderland.models import (
     User, UserCreate,
     Land, LandCreate,
@@ -10,14 +18,102 @@ from src.wonderland.models import (
     Thing, ThingCreate,
 )
 
+if TYPE_CHECKING:
+    from src.wonderland.core.locks import LockManager
+
 class NoResults(Exception):
     """Raised when no results are returning for a query."""
 
 
 class MoreThanOne(Exception):
     """Raised when more than on result was found for a query."""
-    def __init__(self, results: Sequence[Any]):
+    def __init__(self, results: Sequence[Any], total: int | None = None):
         self.results = results
+        self.total = total if total is not None else len(results)
+        """How many results there are, `results` may only be the first ones."""
+
+
+class Conflict(Exception):
+    """
+    Raised when a record changed or vanished since it was read, see
+    `models.Versioned`. Nothing was written, read the record again and
+    retry.
+    """
+
+
+# The hot queries are built once, with bound parameters, instead of on every
+# call. SQLAlchemy then finds their compiled SQL in its cache by a memoized
+# key, see `core.db.StatementCache`.
+
+
+# +---------------------------------------------------------------------------+
+# |                           T R A N S A C T I O N                           |
+# +---------------------------------------------------------------------------+
+@contextmanager
+def transaction(session: Session) -> Iterator[Session]:
+    """
+    Run several crud calls in a single database transaction.
+
+    Within the block the crud functions flush their changes instead of
+    committing them. The transaction is committed once when the outermost
+    block exits, or rolled back if it raises.
+
+    :param session: The ORM session.
+    :return: The same session.
+    """
+    depth = session.info.get("transaction_depth", 0)
+    session.info["transaction_depth"] = depth + 1
+    try:
+        yield session
+        if depth == 0:
+            try:
+                session.commit()
+            except StaleDataError as e:
+                raise Conflict(str(e)) from e
+    except BaseException:
+        if depth == 0:
+            session.rollback()
+        raise
+    finally:
+        session.info["transaction_depth"] = depth
+
+
+def _commit(session: Session):
+    """
+    Commit, or flush within a `transaction`. Updates and deletes of
+    versioned records are compare and swap, a lost race raises `Conflict`.
+    """
+    in_transaction = session.info.get("transaction_depth")
+    try:
+        if in_transaction:
+            session.flush()
+        else:
+            session.commit()
+    except StaleDataError as e:
+        if not in_transaction:
+            session.rollback()
+        raise Conflict(str(e)) from e
+
+
+def _local(session: Session, record: Any) -> Any:
+    """
+    The copy of a record held by a session. Records outlive the session
+    which loaded them, e.g. the `User` a handler with a deadline logged in
+    on its own session, see `HandlerSupervisor`.
+    """
+    if record in session:
+        return record
+    try:
+        return session.merge(record)
+    except StaleDataError as e:
+        raise Conflict(str(e)) from e
+
+
+def _publish(record: Any, original: Any):
+    """Copy what a session committed back onto the record it was given."""
+    if record is not original:
+        for column in inspect(record).mapper.column_attrs:
+            set_committed_value(original, column.key, getattr(record, column.key))
 
 
 # +---------------------------------------------------------------------------+
@@ -26,22 +122,39 @@ class MoreThanOne(Exception):
 def create_user(*, session: Session, data: UserCreate) -> User:
     record = User.model_validate(data)
     session.add(record)
-    session.commit()
+    _commit(session)
     session.refresh(record)
     return record
 
 
 def update_user(*, session: Session, user: User, field: str, value: Any) -> User:
-    user.sqlmodel_update({field: value})
-    session.add(user)
-    session.commit()
-    session.refresh(user)
+    record = _local(session, user)
+    record.sqlmodel_update({field: value})
+    _commit(session)
+    session.refresh(record)
+    _publish(record, user)
+    return user
+
+
+def refresh_user(*, session: Session, user: User) -> User:
+    """Read a user again, e.g. after another process moved them."""
+    record = _local(session, user)
+    session.refresh(record)
+    _publish(record, user)
     return user
 
 
+_GET_USER_BY_NAME = select(User).where(User.name == bindparam("name"))
+_GET_USER = select(User).where(User.id == bindparam("user_id"))
+
+
 def get_user_by_name(*, session: Session, name: str) -> User | None:
-    statement = select(User).where(User.name == name)
-    session_user = session.exec(statement).first()
+    session_user = session.exec(_GET_USER_BY_NAME, params={"name": name}).first()
+    return session_user
+
+
+def get_user(*, session: Session, user_id: int) -> User | None:
+    session_user = session.exec(_GET_USER, params={"user_id": user_id}).first()
     return session_user
 
 
@@ -51,30 +164,42 @@ def get_user_by_name(*, session: Session, name: str) -> User | None:
 def create_land(*, session: Session, data: LandCreate) -> Land:
     record = Land.model_validate(data)
     session.add(record)
-    session.commit()
+    _commit(session)
     session.refresh(record)
     return record
 
 
+_GET_LAND = select(Land).where(Land.id == bindparam("land_id"))
+_LIST_LANDS_BY_USER = select(Land).where(Land.owner_id == bindparam("user_id"))
+_STREAM_LANDS_BY_USER = select(Land.id, Land.name).where(Land.owner_id == bindparam("user_id")).order_by(Land.id)
+
+
 def get_land(*, session: Session, land_id: int) -> Land | None:
-    statement = select(Land).where(Land.id == land_id)
-    land = session.exec(statement).first()
+    land = session.exec(_GET_LAND, params={"land_id": land_id}).first()
     return land
 
 
 def list_lands_by_user(*, session: Session, user_id: int) -> Sequence[Land]:
-    statement = select(Land).where(Land.owner_id == user_id)
-    lands = session.exec(statement).all()
+    lands = session.exec(_LIST_LANDS_BY_USER, params={"user_id": user_id}).all()
     return lands
 
 
+def stream_lands_by_user(*, session: Session, user_id: int, batch: int = 1000) -> Iterator[tuple[int, str]]:
+    """The ids and names of a user's lands, fetched `batch` rows at a time."""
+    yield from session.exec(
+        _STREAM_LANDS_BY_USER,
+        params={"user_id": user_id},
+        execution_options={"yield_per": batch},
+    )
+
+
 # +---------------------------------------------------------------------------+
 # |                                 T H I N G                                 |
 # +---------------------------------------------------------------------------+
 def create_thing_for_user(*, session: Session, data: ThingCreate, user_id: int) -> Thing:
     record = Thing.model_validate(data, update={"user_id": user_id})
     session.add(record)
-    session.commit()
+    _commit(session)
     session.refresh(record)
     return record
 
@@ -82,7 +207,7 @@ def create_thing_for_user(*, session: Session, data: ThingCreate, user_id: int)
 def create_thing_for_room(*, session: Session, data: ThingCreate, room_id: int) -> Thing:
     record = Thing.model_validate(data, update={"room_id": room_id})
     session.add(record)
-    session.commit()
+    _commit(session)
     session.refresh(record)
     return record
 
@@ -90,33 +215,260 @@ def create_thing_for_room(*, session: Session, data: ThingCreate, room_id: int)
 def create_thing_for_thing(*, session: Session, data: ThingCreate, thing_id: int) -> Thing:
     record = Thing.model_validate(data, update={"thing_id": thing_id})
     session.add(record)
-    session.commit()
+    _commit(session)
     session.refresh(record)
     return record
 
 
+def create_things_for_room_bulk(*, session: Session, data: Sequence[ThingCreate], room_id: int) -> list[int]:
+    """Create many things in one flush, returning their ids without reloading them."""
+    records = [Thing.model_validate(item, update={"room_id": room_id}) for item in data]
+    session.add_all(records)
+    session.flush()
+    thing_ids = [record.id for record in records]
+    _commit(session)
+    return thing_ids
+
+
+_MOVE_THINGS = (
+    update(Thing.__table__)
+    .where(Thing.__table__.c.id == bindparam("thing_id"))
+    .values(room_id=bindparam("target_id"), version=Thing.__table__.c.version + 1)
+)
+
+
+def move_things(
+        *,
+        session: Session,
+        moves: Sequence[tuple[int, int]],
+        locks: "LockManager | None" = None,
+) -> dict[int, int]:
+    """
+    Move many things at once, with a single bulk UPDATE by primary key per
+    land database.
+
+    Bypasses the ORM events, the caller must bump the `RoomVersions` of the
+    rooms involved, and invalidate their `RoomSnapshots` once committed.
+
+    :param session: The ORM session.
+    :param moves: Pairs of thing id and target room id.
+    :param locks: The locks of the world, if any. The target rooms and the
+        things are locked during the move, the caller locks the rooms the
+        things leave.
+    :return: The new id of each thing which moved to another land database,
+        where it was created again, see `LandStorage`.
+    """
+    renumbered = dict()
+    if not moves:
+        return renumbered
+    held = nullcontext()
+    if locks is not None:
+        held = locks.acquire(
+            *(("room", room_id) for _, room_id in moves),
+            *(("thing", thing_id) for thing_id, _ in moves),
+        )
+    with held:
+        by_shard = defaultdict(list)
+        for thing_id, room_id in moves:
+            shard_id = LandStorage.shard_of_id(thing_id)
+            if shard_id == LandStorage.shard_of_id(room_id):
+                by_shard[shard_id].append({"thing_id": thing_id, "target_id": room_id})
+            else:
+                thing = session.get(Thing, thing_id)
+                copy = Thing(name=thing.name, description=thing.description, room_id=room_id, user_id=thing.user_id)
+                session.add(copy)
+                session.delete(thing)
+                renumbered[thing_id] = copy
+        # A Core executemany rather than the ORM bulk update, so the version of
+        # every moved thing is bumped and stale copies elsewhere conflict.
+        for shard_id, parameters in by_shard.items():
+            session.connection(bind_arguments={"shard_id": shard_id}).execute(_MOVE_THINGS, parameters)
+        if renumbered:
+            session.flush()
+            renumbered = {thing_id: copy.id for thing_id, copy in renumbered.items()}
+        _commit(session)
+    return renumbered
+
+
+def delete_things_by_id(*, session: Session, thing_ids: Sequence[int]):
+    """
+    Delete many things at once, leaving tombstones, see `delete_thing_by_id`.
+    Bypasses the ORM events, the caller must bump the `RoomVersions` of the
+    rooms involved, and invalidate their `RoomSnapshots` once committed.
+    """
+    if not thing_ids:
+        return
+    statement = (
+        update(Thing)
+        .where(Thing.id.in_(thing_ids), _LIVE)
+        .values(deleted_at=time.time(), version=Thing.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    session.execute(statement)
+    _commit(session)
+
+
+# A deleted thing is a tombstone until the `Compactor` purges it, every query
+# of things leaves them out.
+_LIVE = Thing.deleted_at == None  # noqa: E711
+_LIST_THINGS_BY_ROOM = select(Thing).where(Thing.room_id == bindparam("room_id"), _LIVE)
+_PAGE_THINGS_BY_ROOM = (
+    select(Thing.id, Thing.name)
+    .where(Thing.room_id == bindparam("room_id"), _LIVE, Thing.id > bindparam("after_id"))
+    .order_by(Thing.id)
+    .limit(bindparam("limit"))
+)
+_STREAM_THINGS_BY_ROOM = (
+    select(Thing.id, Thing.name)
+    .where(Thing.room_id == bindparam("room_id"), _LIVE)
+    .order_by(Thing.id)
+)
+_COUNT_THINGS_IN_ROOM = select(func.count(Thing.id)).where(Thing.room_id == bindparam("room_id"), _LIVE)
+_COUNT_THINGS_BY_NAME_IN_ROOM = (
+    select(Thing.name, func.count(Thing.id))
+    .where(Thing.room_id == bindparam("room_id"), _LIVE)
+    .group_by(Thing.name)
+    .order_by(func.min(Thing.id))
+)
+_COUNT_THINGS_BY_NAME_IN_ROOM_LIMITED = _COUNT_THINGS_BY_NAME_IN_ROOM.limit(bindparam("limit"))
+_LIST_THINGS_BY_NAME = select(Thing).where(Thing.name == bindparam("name"), Thing.room_id == bindparam("room_id"), _LIVE)
+_PAGE_THINGS_BY_NAME = (
+    select(Thing.id, Thing.name)
+    .where(
+        Thing.name == bindparam("name"),
+        Thing.room_id == bindparam("room_id"),
+        _LIVE,
+        Thing.id > bindparam("after_id"),
+    )
+    .order_by(Thing.id)
+    .limit(bindparam("limit"))
+)
+_FIRST_THINGS_BY_NAME = (
+    select(Thing)
+    .where(Thing.name == bindparam("name"), Thing.room_id == bindparam("room_id"), _LIVE)
+    .order_by(Thing.id)
+    .limit(bindparam("limit"))
+)
+_COUNT_THINGS_BY_NAME = (
+    select(func.count(Thing.id))
+    .where(Thing.name == bindparam("name"), Thing.room_id == bindparam("room_id"), _LIVE)
+)
+_GET_THING_IN_ROOM = select(Thing).where(Thing.id == bindparam("thing_id"), Thing.room_id == bindparam("room_id"), _LIVE)
+
+
 def list_things_by_room(*, session: Session, room_id: int) -> Sequence[Thing]:
-    statement = select(Thing).where(Thing.room_id == room_id)
-    things = session.exec(statement).all()
+    things = session.exec(_LIST_THINGS_BY_ROOM, params={"room_id": room_id}).all()
     return things
 
 
+def page_things_by_room(
+        *,
+        session: Session,
+        room_id: int,
+        after_id: int = 0,
+        limit: int = 100,
+) -> Sequence[tuple[int, str]]:
+    """
+    One page of the ids and names of the things in a room, by keyset: pass
+    the last id of a page as `after_id` to get the next one. Each page costs
+    the same, however deep it is.
+    """
+    params = {"room_id": room_id, "after_id": after_id, "limit": limit}
+    rows = session.exec(_PAGE_THINGS_BY_ROOM, params=params).all()
+    return rows
+
+
+def stream_things_by_room(*, session: Session, room_id: int, batch: int = 1000) -> Iterator[tuple[int, str]]:
+    """The ids and names of the things in a room, fetched `batch` rows at a time."""
+    yield from session.exec(
+        _STREAM_THINGS_BY_ROOM,
+        params={"room_id": room_id},
+        execution_options={"yield_per": batch},
+    )
+
+
+def count_things_in_room(*, session: Session, room_id: int) -> int:
+    return session.exec(_COUNT_THINGS_IN_ROOM, params={"room_id": room_id}).one()
+
+
+def count_things_by_name_in_room(
+        *,
+        session: Session,
+        room_id: int,
+        limit: int | None = None,
+) -> Sequence[tuple[str, int]]:
+    """
+    How many things of each name are in a room, in order of appearance.
+
+    :param limit: Only return the first names.
+    """
+    if limit is None:
+        counts = session.exec(_COUNT_THINGS_BY_NAME_IN_ROOM, params={"room_id": room_id}).all()
+    else:
+        params = {"room_id": room_id, "limit": limit}
+        counts = session.exec(_COUNT_THINGS_BY_NAME_IN_ROOM_LIMITED, params=params).all()
+    return counts
+
+
 def list_things_by_name(*, session: Session, name: str, room_id: int) -> Sequence[Thing]:
-    statement = select(Thing).where(Thing.name == name, Thing.room_id == room_id)
-    things = session.exec(statement).all()
+    things = session.exec(_LIST_THINGS_BY_NAME, params={"name": name, "room_id": room_id}).all()
     return things
 
 
-def delete_thing_by_name(*, session: Session, name: str, room_id: int) -> Thing:
-    statement = select(Thing).where(Thing.name == name, Thing.room_id == room_id)
-    things = session.exec(statement).all()
+def page_things_by_name(
+        *,
+        session: Session,
+        name: str,
+        room_id: int,
+        after_id: int = 0,
+        limit: int = 100,
+) -> Sequence[tuple[int, str]]:
+    """One page of the ids and names of the things with a name, see `page_things_by_room`."""
+    params = {"name": name, "room_id": room_id, "after_id": after_id, "limit": limit}
+    rows = session.exec(_PAGE_THINGS_BY_NAME, params=params).all()
+    return rows
+
+
+def count_things_by_name(*, session: Session, name: str, room_id: int) -> int:
+    return session.exec(_COUNT_THINGS_BY_NAME, params={"name": name, "room_id": room_id}).one()
+
+
+def delete_thing_by_name(*, session: Session, name: str, room_id: int, choices: int = 10) -> Thing:
+    """
+    Delete the only thing with a name in a room, see `delete_thing_by_id`.
+
+    :param choices: How many of the matching things `MoreThanOne` carries
+        when there are several. The others are only counted.
+    """
+    params = {"name": name, "room_id": room_id, "limit": choices}
+    things = session.exec(_FIRST_THINGS_BY_NAME, params=params).all()
     if len(things) == 0:
         raise NoResults()
     if len(things) > 1:
-        raise MoreThanOne(things)
-    session.delete(things[0])
-    session.commit()
-    return things[0]
+        total = None
+        if len(things) == choices:
+            total = count_things_by_name(session=session, name=name, room_id=room_id)
+        raise MoreThanOne(things, total)
+    return _tombstone(session, things[0])
+
+
+def delete_thing_by_id(*, session: Session, thing_id: int, room_id: int) -> Thing:
+    """
+    Delete a thing in a room. It is only marked deleted, a single row update,
+    and vanishes from every query at once. The `Compactor` purges it later,
+    along with its contents.
+    """
+    thing = session.exec(_GET_THING_IN_ROOM, params={"thing_id": thing_id, "room_id": room_id}).first()
+    if thing is None:
+        raise NoResults()
+    return _tombstone(session, thing)
+
+
+def _tombstone(session: Session, thing: Thing) -> Thing:
+    thing.deleted_at = time.time()
+    session.add(thing)
+    _commit(session)
+    return thing
 
 
 # +---------------------------------------------------------------------------+
@@ -125,7 +477,7 @@ def delete_thing_by_name(*, session: Session, name: str, room_id: int) -> Thing:
 def create_room(*, session: Session, data: RoomCreate, land_id: int) -> Room:
     record = Room.model_validate(data, update={"land_id": land_id})
     session.add(record)
-    session.commit()
+    _commit(session)
     session.refresh(record)
     return record
 
@@ -133,12 +485,56 @@ def create_room(*, session: Session, data: RoomCreate, land_id: int) -> Room:
 def create_room_portal(*, session: Session, data: RoomPortalCreate) -> RoomPortal:
     record = RoomPortal.model_validate(data)
     session.add(record)
-    session.commit()
+    _commit(session)
     session.refresh(record)
     return record
 
 
+_GET_ROOM = select(Room).where(Room.id == bindparam("room_id"))
+_GET_ROOM_PORTAL = select(RoomPortal).where(RoomPortal.id == bindparam("portal_id"))
+_GET_ROOM_PORTAL_BY_NAME = select(RoomPortal).where(
+    RoomPortal.source_id == bindparam("room_id"),
+    func.lower(RoomPortal.name) == bindparam("name"),
+)
+
+
 def get_room(*, session: Session, room_id: int) -> Room | None:
-    statement = select(Room).where(Room.id == room_id)
-    room = session.exec(statement).one()
+    room = session.exec(_GET_ROOM, params={"room_id": room_id}).one()
     return room
+
+
+_GET_FIRST_ROOM = select(Room).order_by(Room.id).limit(1)
+_LIST_ROOM_LANDS = select(Room.id, Room.land_id)
+_LIST_OPEN_PORTAL_EDGES = select(RoomPortal.source_id, RoomPortal.target_id).where(
+    RoomPortal.is_locked == False,  # noqa: E712
+    RoomPortal.source_id != None,  # noqa: E711
+    RoomPortal.target_id != None,  # noqa: E711
+)
+
+
+def get_start_room(*, session: Session) -> Room | None:
+    """The room new users start in, see `Settings.START_ROOM_ID`."""
+    if Settings.START_ROOM_ID is not None:
+        return session.exec(_GET_ROOM, params={"room_id": Settings.START_ROOM_ID}).first()
+    return session.exec(_GET_FIRST_ROOM).first()
+
+
+def list_room_lands(*, session: Session) -> Sequence[tuple[int, int | None]]:
+    rows = session.exec(_LIST_ROOM_LANDS).all()
+    return rows
+
+
+def list_open_portal_edges(*, session: Session) -> Sequence[tuple[int, int]]:
+    edges = session.exec(_LIST_OPEN_PORTAL_EDGES).all()
+    return edges
+
+
+def get_room_portal(*, session: Session, portal_id: int) -> RoomPortal | None:
+    portal = session.exec(_GET_ROOM_PORTAL, params={"portal_id": portal_id}).first()
+    return portal
+
+
+def get_room_portal_by_name(*, session: Session, room_id: int, name: str) -> RoomPortal | None:
+    """An exit of a room, by its name, ignoring case."""
+    portal = session.exec(_GET_ROOM_PORTAL_BY_NAME, params={"room_id": room_id, "name": name.lower()}).first()
+    return portal
@@ -1,17 +1,40 @@
 import typing as t
 
 from sqlmodel import SQLModel, Field, Relationship
-from sqlalchemy import Column, JSON, ARRAY
+from sqlalchemy import Column, Index, JSON, ARRAY, text
+from sqlalchemy.orm import declared_attr
+
+
+# +---------------------------------------------------------------------------+
+# |                            V E R S I O N I N G                            |
+# +---------------------------------------------------------------------------+
+class Versioned:
+    """
+    Optimistic concurrency control for a table with a `version` column.
+
+    Every UPDATE and DELETE of a row made through the ORM is a compare and
+    swap: it only matches the row if its version is still the one which was
+    read, and bumps it. A row changed in the meantime (by another ORM
+    session, another shard, the simulation...) raises `StaleDataError`,
+    which `crud` turns into `crud.Conflict`.
+    """
+
+    @declared_attr
+    def __mapper_args__(cls):
+        return {"version_id_col": cls.__table__.c.version}
 
 
 # +---------------------------------------------------------------------------+
 # |                                  U S E R                                  |
 # +---------------------------------------------------------------------------+
-class User(SQLModel, table=True):
+class User(Versioned, SQLModel, table=True):
     id: int | None = Field(default=None, primary_key=True)
+    version: int = Field(default=1)
     name: str
     description: str | None = Field(default=None)
     room_id: int | None = Field(default=None, foreign_key="room.id")
+    is_admin: bool = Field(default=False)
+    """May run the admin commands, e.g. "memory"."""
     room: t.Optional["Room"] | None = Relationship(back_populates="users")
     lands: list["Land"] = Relationship(back_populates="owner")
     things: list["Thing"] = Relationship(back_populates="user")
@@ -19,6 +42,7 @@ class User(SQLModel, table=True):
 
 class UserCreate(SQLModel):
     name: str
+    room_id: int | None = None
 
 
 # +---------------------------------------------------------------------------+
@@ -41,10 +65,21 @@ class LandCreate(SQLModel):
 # +---------------------------------------------------------------------------+
 # |                                 T H I N G                                 |
 # +---------------------------------------------------------------------------+
-class Thing(SQLModel, table=True):
+class Thing(Versioned, SQLModel, table=True):
+    __table_args__ = (
+        # Tombstones are left out of the room index, queries filtering on
+        # `deleted_at IS NULL` never visit them.
+        Index("ix_thing_live_room", "room_id", "name", sqlite_where=text("deleted_at IS NULL")),
+        Index("ix_thing_tombstone", "deleted_at", sqlite_where=text("deleted_at IS NOT NULL")),
+        {"sqlite_autoincrement": True},
+    )
+
     id: int | None = Field(default=None, primary_key=True)
+    version: int = Field(default=1)
     name: str
     description: str | None = Field(default=None)
+    deleted_at: float | None = Field(default=None)
+    """When the thing was deleted. The `Compactor` purges it later."""
     room_id: int | None = Field(default=None, foreign_key="room.id")
     room: t.Optional["Room"] = Relationship(back_populates="things")
     container_id: int | None = Field(default=None, foreign_key="thing.id")
@@ -62,8 +97,11 @@ class ThingCreate(SQLModel):
 # +---------------------------------------------------------------------------+
 # |                                  R O O M                                  |
 # +---------------------------------------------------------------------------+
-class Room(SQLModel, table=True):
+class Room(Versioned, SQLModel, table=True):
+    __table_args__ = {"sqlite_autoincrement": True}
+
     id: int | None = Field(default=None, primary_key=True)
+    version: int = Field(default=1)
     name: str
     description: str | None
     land_id: int | None = Field(default=None, foreign_key="land.id")
@@ -78,8 +116,11 @@ class RoomCreate(SQLModel):
     description: str | None
 
 
-class RoomPortal(SQLModel, table=True):
+class RoomPortal(Versioned, SQLModel, table=True):
+    __table_args__ = {"sqlite_autoincrement": True}
+
     id: int | None = Field(default=None, primary_key=True)
+    version: int = Field(default=1)
     name: str | None
     description: str | None
     is_locked: bool = Field(default=False)
@@ -92,5 +133,6 @@ class RoomPortal(SQLModel, table=True):
 
 class RoomPortalCreate(SQLModel):
     name: str | None
+    description: str | None = None
     source_id: int
     target_id: int
@@ -0,0 +1,259 @@
+import struct
+import types
+import typing as t
+import zlib
+
+from pydantic import BaseModel, TypeAdapter
+
+from src.wonderland.pubsub.events.base import BaseEvent, BaseOutputEvent
+
+
+class UnknownEventType(Exception):
+    """Raised when decoding a message whose type tag is not registered."""
+
+
+class SchemaMismatch(Exception):
+    """Raised when a message was encoded with a different version of an event's schema."""
+
+
+class WireCodec:
+    """
+    A compact, schema-driven binary codec for events.
+
+    **Notes:**
+
+    -   Every message starts with a header: the wire format version (`u8`),
+        the event type tag (`u32`) and the event schema version (`u16`). The
+        payload is the event's fields in declaration order without any field
+        names. Strings are `u32` length prefixed UTF-8, integers are `i64`,
+        floats are `f64`, booleans and "is present" flags are a single byte.
+        Nested models are inlined. Fields of any other type fall back to
+        pydantic's JSON, length prefixed.
+
+    -   The type tag is the crc32 of the event's import path, so every process
+        agrees on it without a shared table. The schema version is derived
+        from the field names and kinds, so a producer and a consumer running
+        different versions of an event are detected instead of misread.
+
+    -   Encoders and decoders are generated once per event class from its
+        `model_fields` and compiled, so the per-message cost is a single
+        function call.
+
+    -   Decoding builds events without validating them again. For small
+        input events it is about as fast as pydantic's (compiled) JSON, not
+        faster: the codec pays off in message size and in output events
+        shared by many recipients.
+
+    -   Output events are encoded at most once. The bytes are memoized on the
+        event, so broadcasting one output to many recipients shares a single
+        immutable `bytes` object.
+    """
+
+    FORMAT_VERSION = 1
+    """Version of the framing itself, bumped when the header layout changes."""
+
+    _header = struct.Struct("<BIH")
+    _by_tag: dict[int, tuple[type[BaseEvent], int, t.Callable]] = dict()
+    _by_class: dict[type[BaseEvent], tuple[bytes, t.Callable]] = dict()
+    _model_codecs: dict[type[BaseModel], tuple[t.Callable, t.Callable]] = dict()
+
+    def __new__(cls, *args, **kwargs):
+        """This class is not meant to be instantiated."""
+        raise NotImplementedError("Will not instantiate WireCodec class.")
+
+    # +-----------------------------------------------------------------------+
+    # |                             P U B L I C                               |
+    # +-----------------------------------------------------------------------+
+    @classmethod
+    def encode(cls, event: BaseEvent) -> bytes:
+        """
+        Encode an event into its binary wire format.
+
+        :param event: The event to encode.
+        :return: The encoded message.
+        """
+        is_output = isinstance(event, BaseOutputEvent)
+        if is_output:
+            # Read the private attribute directly, pydantic's attribute
+            # lookup for private fields is slower than the encoding itself.
+            memoized = event.__pydantic_private__["_wire"]
+            if memoized is not None:
+                return memoized
+        try:
+            header, encoder = cls._by_class[type(event)]
+        except KeyError:
+            header, encoder = cls._by_class[cls.register(type(event))]
+        parts = [header]
+        encoder(event, parts)
+        data = b"".join(parts)
+        if is_output:
+            event.__pydantic_private__["_wire"] = data
+        return data
+
+    @classmethod
+    def decode(cls, data: bytes | memoryview) -> BaseEvent:
+        """
+        Decode a message produced by `encode`.
+
+        :param data: The encoded message.
+        :return: The decoded event.
+        """
+        # Slicing `bytes` and decoding the slice is cheaper than through a
+        # memoryview, only wrap what is not `bytes` already.
+        view = data if type(data) is bytes else memoryview(data)
+        fmt, tag, version = cls._header.unpack_from(view, 0)
+        if fmt != cls.FORMAT_VERSION:
+            raise SchemaMismatch(f"Unsupported wire format version {fmt}.")
+        entry = cls._by_tag.get(tag)
+        if entry is None:
+            # Event modules are imported lazily, this one may not be yet
+            from src.wonderland.pubsub import events
+            events.load_all()
+            cls.register_all()
+            entry = cls._by_tag.get(tag)
+            if entry is None:
+                raise UnknownEventType(f"No event registered for tag {tag:#010x}.")
+        klass, expected, decoder = entry
+        if version != expected:
+            raise SchemaMismatch(
+                f"{klass.__name__} schema version {version} does not match "
+                f"the local version {expected}."
+            )
+        event, _ = decoder(view, cls._header.size)
+        return event
+
+    @classmethod
+    def register(cls, event_klass: type[BaseEvent]) -> type[BaseEvent]:
+        """
+        Generate and register the codec for an event class.
+
+        :param event_klass: The event type to register.
+        :return: The same event type, so this can be used as a decorator.
+        """
+        if event_klass in cls._by_class:
+            return event_klass
+        tag = zlib.crc32(f"{event_klass.__module__}:{event_klass.__qualname__}".encode())
+        if tag in cls._by_tag and cls._by_tag[tag][0] is not event_klass:
+            raise ValueError(
+                f"Type tag collision between {event_klass.__qualname__} and "
+                f"{cls._by_tag[tag][0].__qualname__}."
+            )
+        encoder, decoder, signature = cls._build(event_klass)
+        version = zlib.crc32(signature.encode()) & 0xFFFF
+        cls._by_class[event_klass] = (cls._header.pack(cls.FORMAT_VERSION, tag, version), encoder)
+        cls._by_tag[tag] = (event_klass, version, decoder)
+        return event_klass
+
+    @classmethod
+    def register_all(cls, root: type[BaseEvent] = BaseEvent):
+        """Register every imported subclass of the given event class."""
+        for klass in root.__subclasses__():
+            cls.register(klass)
+            cls.register_all(klass)
+
+    # +-----------------------------------------------------------------------+
+    # |                         G E N E R A T I O N                           |
+    # +-----------------------------------------------------------------------+
+    @classmethod
+    def _build(cls, model: type[BaseModel]) -> tuple[t.Callable, t.Callable, str]:
+        namespace = {
+            "_u8": struct.Struct("<B"),
+            "_u32": struct.Struct("<I"),
+            "_i64": struct.Struct("<q"),
+            "_f64": struct.Struct("<d"),
+            "_model": model,
+            "_str": str,
+        }
+        enc = ["def encode(obj, out):"]
+        dec = ["def decode(view, pos):", "    values = {}"]
+        signature = []
+        for idx, (name, field) in enumerate(model.model_fields.items()):
+            kind, annotation, optional = cls._classify(field.annotation)
+            signature.append(f"{name}:{kind}{'?' if optional else ''}")
+            indent = "    "
+            enc.append(f"    value = obj.{name}")
+            if optional:
+                enc.append("    if value is None:")
+                enc.append("        out.append(b'\\x00')")
+                enc.append("    else:")
+                enc.append("        out.append(b'\\x01')")
+                dec.append("    present = view[pos]; pos += 1")
+                dec.append("    if not present:")
+                dec.append(f"        values[{name!r}] = None")
+                dec.append("    else:")
+                indent = "        "
+            if kind == "str":
+                enc.append(f"{indent}data = value.encode()")
+                enc.append(f"{indent}out.append(_u32.pack(len(data)))")
+                enc.append(f"{indent}out.append(data)")
+                dec.append(f"{indent}size, = _u32.unpack_from(view, pos); pos += 4")
+                dec.append(f"{indent}values[{name!r}] = _str(view[pos:pos + size], 'utf-8'); pos += size")
+            elif kind in ("int", "float", "bool"):
+                packer = {"int": "_i64", "float": "_f64", "bool": "_u8"}[kind]
+                size = {"int": 8, "float": 8, "bool": 1}[kind]
+                enc.append(f"{indent}out.append({packer}.pack(value))")
+                dec.append(f"{indent}values[{name!r}], = {packer}.unpack_from(view, pos); pos += {size}")
+                if kind == "bool":
+                    dec.append(f"{indent}values[{name!r}] = bool(values[{name!r}])")
+            elif kind == "model":
+                sub_encoder, sub_decoder = cls._model_codec(annotation)
+                namespace[f"_enc_{idx}"] = sub_encoder
+                namespace[f"_dec_{idx}"] = sub_decoder
+                enc.append(f"{indent}_enc_{idx}(value, out)")
+                dec.append(f"{indent}values[{name!r}], pos = _dec_{idx}(view, pos)")
+                signature[-1] += f"({annotation.__qualname__})"
+            else:
+                adapter = TypeAdapter(annotation)
+                namespace[f"_json_{idx}"] = adapter
+                enc.append(f"{indent}data = _json_{idx}.dump_json(value)")
+                enc.append(f"{indent}out.append(_u32.pack(len(data)))")
+                enc.append(f"{indent}out.append(data)")
+                dec.append(f"{indent}size, = _u32.unpack_from(view, pos); pos += 4")
+                dec.append(f"{indent}values[{name!r}] = _json_{idx}.validate_json(bytes(view[pos:pos + size])); pos += size")
+        if len(enc) == 1:
+            enc.append("    pass")
+        if issubclass(model, BaseEvent) and model.model_post_init is BaseModel.model_post_init:
+            # Events are trusted to be valid, they were valid when encoded.
+            # Every field was decoded, so the instance is assembled directly:
+            # `model_construct` would cost more than the whole decoding.
+            namespace["_new"] = object.__new__
+            namespace["_set"] = object.__setattr__
+            namespace["_fields"] = frozenset(model.model_fields)
+            namespace["_private"] = tuple(model.__private_attributes__.items())
+            dec.append("    event = _new(_model)")
+            dec.append("    _set(event, '__dict__', values)")
+            dec.append("    _set(event, '__pydantic_fields_set__', set(_fields))")
+            dec.append("    _set(event, '__pydantic_extra__', None)")
+            dec.append("    _set(event, '__pydantic_private__', {name: attr.get_default() for name, attr in _private} if _private else None)")
+            dec.append("    return event, pos")
+        elif issubclass(model, BaseEvent):
+            dec.append("    return _model.model_construct(**values), pos")
+        else:
+            # Nested models may be ORM tables, which must be built through
+            # validation to get their instrumented state set up.
+            dec.append("    return _model.model_validate(values), pos")
+        exec(compile("\n".join(enc) + "\n" + "\n".join(dec), f"<wire {model.__qualname__}>", "exec"), namespace)
+        return namespace["encode"], namespace["decode"], ";".join(signature)
+
+    @classmethod
+    def _model_codec(cls, model: type[BaseModel]) -> tuple[t.Callable, t.Callable]:
+        if model not in cls._model_codecs:
+            encoder, decoder, _ = cls._build(model)
+            cls._model_codecs[model] = (encoder, decoder)
+        return cls._model_codecs[model]
+
+    @staticmethod
+    def _classify(annotation: t.Any) -> tuple[str, t.Any, bool]:
+        optional = False
+        if t.get_origin(annotation) in (t.Union, types.UnionType):
+            members = [a for a in t.get_args(annotation) if a is not type(None)]
+            optional = len(members) < len(t.get_args(annotation))
+            if len(members) == 1:
+                annotation = members[0]
+        if annotation is bool:
+            return "bool", annotation, optional
+        if annotation in (str, int, float):
+            return annotation.__name__, annotation, optional
+        if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            return "model", annotation, optional
+        return "json", annotation, optional
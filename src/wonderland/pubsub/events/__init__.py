@@ -1,12 +1,53 @@
-from .create_item import CreateItemInputEvent
-from .delete_thing import DeleteItemInputEvent
-from .help import HelpInputEvent
-from .look import LookInputEvent
+"""
+The input events of the game.
+
+Event modules are imported on first access, e.g. `events.LookInputEvent`
+imports `events.look` and registers its handlers. Nothing is imported with
+the package itself, so startup only pays for the events actually used.
+"""
+import importlib
+import pkgutil
+
+
+_MANIFEST = {
+    "BatchInputEvent": "batch",
+    "CancelInputEvent": "cancel",
+    "CreateItemInputEvent": "create_item",
+    "DeleteItemInputEvent": "delete_thing",
+    "GoInputEvent": "go",
+    "HelpInputEvent": "help",
+    "LookInputEvent": "look",
+    "MemoryInputEvent": "memory",
+}
+"""The module defining each exported event class."""
+
+
+def __getattr__(name: str):
+    module = _MANIFEST.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f"{__name__}.{module}"), name)
+    globals()[name] = value
+    return value
+
+
+def load_all():
+    """Import every event module, e.g. before decoding events by type tag."""
+    for name in _MANIFEST:
+        __getattr__(name)
+    # Modules of events which are not commands, e.g. ambient and throttled
+    # output events, are not in the manifest.
+    for module in pkgutil.walk_packages(__path__, prefix=f"{__name__}."):
+        importlib.import_module(module.name)
 
 
 __all__ = [
+    "BatchInputEvent",
+    "CancelInputEvent",
     "CreateItemInputEvent",
     "DeleteItemInputEvent",
+    "GoInputEvent",
     "HelpInputEvent",
     "LookInputEvent",
+    "MemoryInputEvent",
 ]
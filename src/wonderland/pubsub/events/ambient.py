@@ -0,0 +1,10 @@
+from src.wonderland.pubsub.events.base import BaseOutputEvent
+
+
+class AmbientOutputEvent(BaseOutputEvent):
+    """
+    Something happening in a room on its own, e.g. an NPC wandering in. Only
+    the players in `room_id` should see it, see `SessionRegistry.in_room`.
+    """
+
+    room_id: int
@@ -0,0 +1,10 @@
+from .client_connect import ClientConnectInputEvent
+from .client_disconnect import ClientDisconnectInputEvent
+from .login import LoginInputEvent
+
+
+__all__ = [
+    "ClientConnectInputEvent",
+    "ClientDisconnectInputEvent",
+    "LoginInputEvent",
+]
@@ -1,9 +1,10 @@
+from src.wonderland.pubsub.events.app.login import LOGIN_CONTEXT, LoginInputEvent
 from src.wonderland.pubsub.events.base import BaseInputEvent, BaseOutputEvent
 from src.wonderland.pubsub.topic import Topic
 
 
 class ClientConnectInputEvent(BaseInputEvent):
-    ...
+    lane = "system"
 
 
 class ClientConnectOutputEvent(BaseOutputEvent):
@@ -18,6 +19,14 @@ def handle_client_connect_input_event(event: ClientConnectInputEvent, **kwargs):
     -   Spawn thread for this client's events?
     -   Create a session for this client's thread?
     """
+    # Imported here, the commands package imports the events package
+    from src.wonderland.commands.context import CommandContext
+
+    event.session.push_context(CommandContext.prompt(
+        LOGIN_CONTEXT,
+        event_class=LoginInputEvent,
+        answer_arg="username",
+    ))
     output_event = ClientConnectOutputEvent(
         markup="What is your username?",
     )
@@ -1,23 +1,19 @@
 from src.wonderland.pubsub.events.base import (
     BaseInputEvent,
     BaseOutputEvent,
-    BaseEvent,
 )
 from src.wonderland.pubsub.topic import Topic
+from src.wonderland.session import SessionRegistry
 
 
 class ClientDisconnectInputEvent(BaseInputEvent):
-    ...
+    lane = "system"
 
 
 class ClientDisconnectOutputEvent(BaseOutputEvent):
     ...
 
 
-class ClientDisconnectSystemEvent(BaseEvent):
-    ...
-
-
 @Topic.register(ClientDisconnectInputEvent)
 def handle_client_disconnect_input_event(event: ClientDisconnectInputEvent, **kwargs):
     """
@@ -26,14 +22,8 @@ def handle_client_disconnect_input_event(event: ClientDisconnectInputEvent, **kw
     -   Close any database connections in the session?
     -   Close any open threads related to this session?
     """
+    SessionRegistry.hibernate(event.session_id, disconnected=True)
     output_event = ClientDisconnectOutputEvent(
         markup="Bye",
     )
-    system_event = ClientDisconnectSystemEvent()
     Topic.push(output_event)
-    Topic.push(system_event)
-
-
-@Topic.register(ClientDisconnectSystemEvent)
-def handle_client_disconnect_system_event(event: ClientDisconnectSystemEvent, **kwargs):
-    Topic.close()
@@ -0,0 +1,39 @@
+from src.wonderland import crud
+from src.wonderland.core.settings import Settings
+from src.wonderland.models import UserCreate
+from src.wonderland.pubsub.events.base import BaseInputEvent, BaseOutputEvent
+from src.wonderland.pubsub.topic import Topic
+from src.wonderland.session import SessionRegistry
+
+
+LOGIN_CONTEXT = "login"
+
+
+class LoginInputEvent(BaseInputEvent):
+    username: str = ""
+
+
+class LoginOutputEvent(BaseOutputEvent):
+    ...
+
+
+@Topic.register(LoginInputEvent)
+def handle_login_input_event(event: LoginInputEvent, **kwargs):
+    username = event.username.strip()
+    if not username:
+        Topic.push(LoginOutputEvent(markup="What is your username?"))
+        return
+    orm = event.session.get_orm()
+    user = crud.get_user_by_name(session=orm, name=username)
+    if user is None:
+        room = crud.get_start_room(session=orm)
+        user = crud.create_user(
+            session=orm,
+            data=UserCreate(name=username, room_id=room.id if room is not None else None),
+        )
+    if not user.is_admin and user.name in Settings.ADMIN_NAMES:
+        user = crud.update_user(session=orm, user=user, field="is_admin", value=True)
+    session = event.session
+    SessionRegistry.bind_user(session, user)
+    session.pop_context(LOGIN_CONTEXT)
+    Topic.push(LoginOutputEvent(markup=f"Welcome, {user.name}."))
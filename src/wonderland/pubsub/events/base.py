@@ -1,23 +1,86 @@
-from pydantic import BaseModel
+import importlib
+import typing as t
 
-from src.wonderland.session import Session
+from pydantic import BaseModel, BeforeValidator, PlainSerializer, PrivateAttr, model_validator
+
+from src.wonderland.session import Session, SessionRegistry
 
 
 class BaseEvent(BaseModel):
-    ...
+    lane: t.ClassVar[str] = "system"
+    """The priority lane of the `Topic` queue this event waits in."""
 
 
 class BaseInputEvent(BaseEvent):
+    lane: t.ClassVar[str] = "input"
     raw_message: str
-    session: Session
+    session_id: int
+    user_id: int | None = None
     io_flag: str = "i"
 
+    @model_validator(mode="before")
+    @classmethod
+    def _reference_session(cls, data: t.Any) -> t.Any:
+        """
+        Accept a live `session=` and keep only a reference to it, so the
+        session and its `User` are never copied into the event.
+        """
+        if isinstance(data, dict) and "session" in data:
+            data = dict(data)
+            session = data.pop("session")
+            if session.id is None:
+                SessionRegistry.attach(session)
+            data["session_id"] = session.id
+            data.setdefault("user_id", session.user.id if session.user is not None else None)
+        return data
+
+    @property
+    def session(self) -> Session:
+        """The live session which sent the event, see `SessionRegistry`."""
+        return SessionRegistry.resolve(self.session_id, self.user_id)
+
 
 class BaseOutputEvent(BaseEvent):
+    lane: t.ClassVar[str] = "output"
     markup: str
     io_flag: str = "o"
+    _wire: bytes | None = PrivateAttr(default=None)
+    """The encoded wire message, memoized by `WireCodec.encode`."""
 
     @property
     def as_plain_text(self):
         return self.markup
 
+
+# +---------------------------------------------------------------------------+
+# |                         T A G G E D   E V E N T S                         |
+# +---------------------------------------------------------------------------+
+def event_type_path(klass: type[BaseEvent]) -> str:
+    """The import path of an event type, e.g. `"src.wonderland.pubsub.events.look:LookInputEvent"`."""
+    return f"{klass.__module__}:{klass.__qualname__}"
+
+
+def import_event_type(path: str) -> type[BaseEvent]:
+    """The event type at an import path, see `event_type_path`."""
+    module_name, _, qualname = path.partition(":")
+    klass = importlib.import_module(module_name)
+    for attr in qualname.split("."):
+        klass = getattr(klass, attr)
+    return klass
+
+
+def _tag_event(event: BaseEvent) -> dict:
+    return {"type": event_type_path(type(event)), "event": event.model_dump(mode="json")}
+
+
+def _untag_event(value: t.Any) -> t.Any:
+    if isinstance(value, dict) and "type" in value:
+        return import_event_type(value["type"]).model_validate(value["event"])
+    return value
+
+
+TaggedInputEvent = t.Annotated[BaseInputEvent, BeforeValidator(_untag_event), PlainSerializer(_tag_event)]
+"""
+An input event of any type, serialized as `{"type": ..., "event": ...}` so it
+is decoded back into its own type rather than into `BaseInputEvent`.
+"""
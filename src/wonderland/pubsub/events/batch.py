@@ -0,0 +1,32 @@
+from src.wonderland import crud
+from src.wonderland.pubsub.events.base import BaseInputEvent, BaseOutputEvent, TaggedInputEvent
+from src.wonderland.pubsub.topic import Topic
+
+
+class BatchInputEvent(BaseInputEvent):
+    events: list[TaggedInputEvent]
+
+
+class BatchOutputEvent(BaseOutputEvent):
+    ...
+
+
+@Topic.register(BatchInputEvent)
+def handle_batch_input_event(event: BatchInputEvent, **kwargs):
+    """
+    Run every event of the batch in order, within one database transaction,
+    and reply once with all of their outputs.
+    """
+    with Topic.collect(BaseOutputEvent) as outputs:
+        try:
+            with crud.transaction(event.session.get_orm()):
+                for input_event in event.events:
+                    Topic.dispatch(input_event)
+            markup = "\n".join(output.markup for output in outputs)
+        except Exception as e:
+            Topic._get_logger().exception("Batch failed on %r", input_event.raw_message)
+            markup = (
+                f"The batch failed on \"{input_event.raw_message}\" and nothing "
+                f"was changed: {e}"
+            )
+    Topic.push(BatchOutputEvent(markup=markup))
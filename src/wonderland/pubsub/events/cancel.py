@@ -0,0 +1,16 @@
+from src.wonderland.pubsub.events.base import BaseInputEvent, BaseOutputEvent
+from src.wonderland.pubsub.topic import Topic
+
+
+class CancelInputEvent(BaseInputEvent):
+    ...
+
+
+class CancelOutputEvent(BaseOutputEvent):
+    ...
+
+
+@Topic.register(CancelInputEvent)
+def handle_cancel_input_event(event: CancelInputEvent, **kwargs):
+    event.session.pop_context()
+    Topic.push(CancelOutputEvent(markup="Never mind."))
@@ -15,11 +15,13 @@ class CreateItemOutputEvent(BaseOutputEvent):
 
 @Topic.register(CreateItemInputEvent)
 def handle_create_item_input_event(event: CreateItemInputEvent, **kwargs):
-    thing = crud.create_thing_for_room(
-        session=event.session.get_orm(),
-        data=ThingCreate(name=event.item_name),
-        room_id=event.session.user.room_id
-    )
+    room_id = event.session.user.room_id
+    with Topic.active().locks.rooms(room_id):
+        thing = crud.create_thing_for_room(
+            session=event.session.get_orm(),
+            data=ThingCreate(name=event.item_name),
+            room_id=room_id,
+        )
     output_event = CreateItemOutputEvent(
         markup=f"You create {aan(thing.name)} {thing.name} and drop it on the ground here.",
     )
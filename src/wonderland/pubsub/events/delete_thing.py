@@ -1,11 +1,16 @@
+from src.wonderland.core.settings import Settings
 from src.wonderland.pubsub.events.base import BaseInputEvent, BaseOutputEvent
+from src.wonderland.pubsub.events.cancel import CancelInputEvent
 from src.wonderland.pubsub.topic import Topic
 from src.wonderland import crud
-from src.wonderland.utils import aan
+
+
+DELETE_CONTEXT = "delete"
 
 
 class DeleteItemInputEvent(BaseInputEvent):
     item_name: str
+    thing_id: int | None = None
 
 
 class DeleteItemOutputEvent(BaseOutputEvent):
@@ -14,20 +19,52 @@ class DeleteItemOutputEvent(BaseOutputEvent):
 
 @Topic.register(DeleteItemInputEvent)
 def handle_delete_item_input_event(event: DeleteItemInputEvent, **kwargs):
+    room_id = event.session.user.room_id
     try:
-        thing = crud.delete_thing_by_name(
-            session=event.session.get_orm(),
-            name=event.item_name,
-            room_id=event.session.user.room_id,
-        )
+        # The delete is also a compare and swap on the thing's version, for
+        # writers which do not lock, e.g. another shard process.
+        with Topic.active().locks.rooms(room_id):
+            if event.thing_id is not None:
+                event.session.pop_context(DELETE_CONTEXT)
+                with Topic.active().locks.things(event.thing_id):
+                    thing = crud.delete_thing_by_id(
+                        session=event.session.get_orm(),
+                        thing_id=event.thing_id,
+                        room_id=room_id,
+                    )
+            else:
+                thing = crud.delete_thing_by_name(
+                    session=event.session.get_orm(),
+                    name=event.item_name,
+                    room_id=room_id,
+                    choices=Settings.DELETE_MAX_CHOICES,
+                )
         message = f"You snap your fingers, and the {thing.name} vanishes."
     except crud.NoResults:
         message = f"Could not find anything like \"{event.item_name}\"."
     except crud.MoreThanOne as e:
+        # Imported here, the commands package imports the events package
+        from src.wonderland.commands.context import CommandContext
+
+        options = {
+            str(idx): (DeleteItemInputEvent, {"item_name": thing.name, "thing_id": thing.id})
+            for idx, thing in enumerate(e.results, start=1)
+        }
+        options["cancel"] = (CancelInputEvent, {})
+        event.session.push_context(CommandContext.choice(
+            DELETE_CONTEXT,
+            options,
+            timeout=Settings.PROMPT_TIMEOUT,
+        ))
+        choices = ", ".join(
+            f"{idx}) {thing.name} #{thing.id}" for idx, thing in enumerate(e.results, start=1)
+        )
+        rest = e.total - len(e.results)
+        if rest:
+            choices += f" (and {rest:,} more)"
         message = (
-            f"Multiple things match \"{event.item_name}\". Use the delete "
-            f"command again, but pick one of the following: "
-            f"{', '.join(e.results)}"
+            f"Multiple things match \"{event.item_name}\". Which one should "
+            f"vanish? {choices}, or cancel."
         )
     output_event = DeleteItemOutputEvent(markup=message)
     Topic.push(output_event)
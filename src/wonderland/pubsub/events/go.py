@@ -0,0 +1,29 @@
+from src.wonderland import crud
+from src.wonderland.pubsub.events.base import BaseInputEvent, BaseOutputEvent
+from src.wonderland.pubsub.events.look import LookInputEvent
+from src.wonderland.pubsub.topic import Topic
+from src.wonderland.shard.worker import ShardWorker
+
+
+class GoInputEvent(BaseInputEvent):
+    exit: str
+
+
+class GoOutputEvent(BaseOutputEvent):
+    ...
+
+
+@Topic.register(GoInputEvent)
+def handle_go_input_event(event: GoInputEvent, **kwargs):
+    session = event.session
+    portal = crud.get_room_portal_by_name(session=session.get_orm(), room_id=session.user.room_id, name=event.exit)
+    if portal is None or portal.target_id is None:
+        Topic.push(GoOutputEvent(markup="You cannot go that way."))
+        return
+    if portal.is_locked:
+        Topic.push(GoOutputEvent(markup=f"The way {portal.name} is locked."))
+        return
+    Topic.push(GoOutputEvent(markup=f"You go {portal.name}."))
+    # A player handed off to another shard is shown the room by that shard
+    if not ShardWorker.traverse(session, portal):
+        Topic.push(LookInputEvent(session=session, raw_message="look"))
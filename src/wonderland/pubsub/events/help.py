@@ -1,6 +1,11 @@
+import typing as t
+
 from src.wonderland.pubsub.events.base import BaseInputEvent, BaseOutputEvent
 from src.wonderland.pubsub.topic import Topic
 
+if t.TYPE_CHECKING:
+    from src.wonderland.commands.registry import CommandRegistry
+
 
 class HelpInputEvent(BaseInputEvent):
     ...
@@ -10,25 +15,60 @@ class HelpOutputEvent(BaseOutputEvent):
     ...
 
 
-@Topic.register(HelpInputEvent)
-def handle_help_input_event(event: HelpInputEvent, **kwargs):
+class HelpDocument:
     """
-    TODO: Build this help document from the list of registered commands, similar to how argparse lib works.
-    """
-    help_doc = """
-    The following commands are available:
-    ├─ look ─── Describe your environment.
-    ├─ create ─ Create something.
-    │           Must include the name of the something. Square 
-    │           brackets are not required.
-    │           Example: create red apple
-    ├─ go ───── Move between spaces.
-    │           Must include the space where you'd like to go.
-    │           Example: go house
-    └─ help ─── Shows this help message.
+    The help message, generated from the registered commands.
+
+    The message is rendered once into an output event, which is pushed as is
+    for every help request. It is only rebuilt when commands are registered
+    or removed, see `CommandRegistry.subscribe`. Declared commands are not
+    materialized to render it.
     """
-    help_doc = "\n".join(l.strip() for l in help_doc.splitlines())
-    output_event = HelpOutputEvent(
-        markup=help_doc
-    )
-    Topic.push(output_event)
+
+    _event: HelpOutputEvent | None = None
+
+    def __new__(cls, *args, **kwargs):
+        """This class is not meant to be instantiated."""
+        raise NotImplementedError("Will not instantiate HelpDocument class.")
+
+    @classmethod
+    def rebuild(cls, registry: "CommandRegistry"):
+        cls._event = HelpOutputEvent(markup=cls.render(registry))
+
+    @classmethod
+    def event(cls) -> HelpOutputEvent:
+        if cls._event is None:
+            from src.wonderland.commands.registry import CommandRegistry
+            cls.rebuild(CommandRegistry())
+        return cls._event
+
+    @staticmethod
+    def render(registry: "CommandRegistry") -> str:
+        """
+        Draw the commands as a tree, similar to:
+
+        ├─ look ─── Describe your environment.
+        ├─ create ─ Create something.
+        │           Usage: create <item_name>
+        └─ help ─── Shows this help message.
+        """
+        # One document for every player: admin commands are left out
+        commands = [command for command in registry.declared if not command.admin]
+        width = max((len(command.trigger) for command in commands), default=0)
+        lines = ["The following commands are available:"]
+        for idx, command in enumerate(commands):
+            is_last = idx == len(commands) - 1
+            branch, trunk = ("└─", " ") if is_last else ("├─", "│")
+            details = command.description.splitlines() or [""]
+            if command.pos_args or command.opt_args:
+                details.insert(1, f"Usage: {command.usage}")
+            fill = "─" * (width - len(command.trigger) + 1)
+            lines.append(f"{branch} {command.trigger} {fill} {details[0]}".rstrip())
+            indent = " " * (width + 5)
+            lines.extend(f"{trunk}{indent}{detail}" for detail in details[1:])
+        return "\n".join(lines)
+
+
+@Topic.register(HelpInputEvent)
+def handle_help_input_event(event: HelpInputEvent, **kwargs):
+    Topic.push(HelpDocument.event())
@@ -1,7 +1,32 @@
+from pydantic import BaseModel
+
+from src.wonderland.core.snapshots import RoomSnapshot, RoomSnapshots
 from src.wonderland.pubsub.events.base import BaseInputEvent, BaseOutputEvent
 from src.wonderland.pubsub.topic import Topic
-from src.wonderland import crud
-from src.wonderland.utils import aan
+from src.wonderland.render import LookRenderer
+
+
+class RoomView(BaseModel):
+    """What a player saw of a room, for clients receiving deltas, see `transport.DeltaEncoder`."""
+
+    room_id: int
+    version: int
+    name: str
+    description: str | None = None
+    counts: dict[str, int] = {}
+    """How many things of each listed name."""
+    total: int = 0
+
+    @classmethod
+    def from_snapshot(cls, snapshot: RoomSnapshot) -> "RoomView":
+        return cls.model_construct(
+            room_id=snapshot.room_id,
+            version=snapshot.version,
+            name=snapshot.name,
+            description=snapshot.description,
+            counts=dict(snapshot.counts),
+            total=snapshot.total,
+        )
 
 
 class LookInputEvent(BaseInputEvent):
@@ -9,25 +34,19 @@ class LookInputEvent(BaseInputEvent):
 
 
 class LookOutputEvent(BaseOutputEvent):
-    ...
+    room: RoomView | None = None
 
 
 @Topic.register(LookInputEvent)
 def handle_look_input_event(event: LookInputEvent, **kwargs):
-    room = crud.get_room(
-        session=event.session.get_orm(),
-        room_id=event.session.user.room_id
-    )
-    things = crud.list_things_by_room(
-        session=event.session.get_orm(),
-        room_id=event.session.user.room_id,
-    )
-    markup = f"You look around the {room.name}."
-    if room.description:
-        markup += "\n" + room.description
-    for thing in things:
-        markup += f" You see {aan(thing.name)} {thing.name}."
+    room_id = event.session.user.room_id
+    # The snapshot is immutable, the lock only keeps a rebuild from reading
+    # the room halfway through a write.
+    with Topic.active().locks.rooms(room_id):
+        snapshot = RoomSnapshots.get(room_id, orm=event.session.get_orm())
+    markup = LookRenderer.render(snapshot)
     output_event = LookOutputEvent(
         markup=markup,
+        room=RoomView.from_snapshot(snapshot),
     )
     Topic.push(output_event)
@@ -0,0 +1,61 @@
+from src.wonderland.core.memory import MemoryAccounting
+from src.wonderland.pubsub.events.base import BaseInputEvent, BaseOutputEvent
+from src.wonderland.pubsub.topic import Topic
+
+
+class MemoryInputEvent(BaseInputEvent):
+    action: str = ""
+    """Empty for a report, or "start", "diff" and "stop" to trace allocations."""
+
+
+class MemoryOutputEvent(BaseOutputEvent):
+    ...
+
+
+class MemoryReportOutputEvent(BaseOutputEvent):
+    """Where the server's memory goes, see `MemoryAccounting.report`."""
+
+    report: dict
+
+
+@Topic.register(MemoryInputEvent)
+def handle_memory_input_event(event: MemoryInputEvent, **kwargs):
+    user = event.session.user
+    if user is None or not user.is_admin:
+        Topic.push(MemoryOutputEvent(markup="Only admins can do that."))
+        return
+    action = event.action.lower()
+    if action == "start":
+        MemoryAccounting.start()
+        Topic.push(MemoryOutputEvent(markup="Tracing allocations. Run \"memory diff\" to see what grew."))
+    elif action == "diff":
+        try:
+            path = MemoryAccounting.diff()
+        except RuntimeError as e:
+            Topic.push(MemoryOutputEvent(markup=str(e)))
+            return
+        Topic.push(MemoryOutputEvent(markup=f"Wrote the allocations which grew to {path}."))
+    elif action == "stop":
+        MemoryAccounting.stop()
+        Topic.push(MemoryOutputEvent(markup="Stopped tracing allocations."))
+    elif action:
+        Topic.push(MemoryOutputEvent(markup=f"Unknown action {event.action!r}, try start, diff or stop."))
+    else:
+        report = MemoryAccounting.report()
+        Topic.push(MemoryReportOutputEvent(markup=render_report(report), report=report))
+
+
+def render_report(report: dict) -> str:
+    queue, sessions, traced = report["queue"], report["sessions"], report["tracemalloc"]
+    lines = [
+        f"Queue: {queue['depth']:,} events, {queue['bytes'] / 1024:,.1f} KiB.",
+        f"Sessions: {sessions['live']:,} live, {sessions['bytes'] / 1024:,.1f} KiB"
+        f" (mean {sessions['mean_bytes']:,.0f} B, max {sessions['max_bytes']:,} B),"
+        f" {sessions['hibernated']:,} hibernated, {sessions['hibernated_bytes'] / 1024:,.1f} KiB.",
+        f"ORM identity map: {report['orm']['identity_map']:,} objects.",
+    ]
+    if traced["tracing"]:
+        lines.append(f"Traced: {traced['bytes'] / 1024:,.1f} KiB, peak {traced['peak_bytes'] / 1024:,.1f} KiB.")
+    lines.append("Live events:")
+    lines.extend(f"  {name}: {count:,}" for name, count in report["events"].items())
+    return "\n".join(lines)
@@ -0,0 +1,5 @@
+from src.wonderland.pubsub.events.base import BaseOutputEvent
+
+
+class ThrottledOutputEvent(BaseOutputEvent):
+    """Sent instead of processing input which exceeded a rate limit."""
@@ -0,0 +1,258 @@
+import json
+import os
+import struct
+import time
+import zlib
+from logging import Logger, getLogger
+from pathlib import Path
+from threading import Condition, Lock, Thread
+from typing import BinaryIO, Iterator
+
+from src.wonderland.core.settings import Settings
+from src.wonderland.pubsub.events.base import BaseEvent, BaseInputEvent, event_type_path, import_event_type
+from src.wonderland.pubsub.topic import Topic
+
+
+class JournalCorrupted(Exception):
+    """Raised when a journal record fails its checksum in the middle of a segment."""
+
+
+class Journal:
+    """
+    An append-only, segmented log of input events.
+
+    **Notes:**
+
+    -   Every record is framed as ``<length:u32><crc32:u32><payload>`` where the
+        payload is the JSON encoded event tagged with its import path. A torn
+        record at the tail of the newest segment (e.g. after a crash) is
+        ignored when reading.
+
+    -   Appending only serializes the event and hands the bytes to a
+        background flusher. The flusher writes and `fsync`s everything that
+        accumulated since the last commit in one go ("group commit"), so the
+        cost of an `fsync` is shared by every event in the batch.
+
+    -   Segments are rotated once they grow past `segment_bytes` and are named
+        so that lexical order is replay order.
+
+    -   Only the events pushed from outside of the handlers are recorded. The
+        events pushed or dispatched by a handler (e.g. the commands of a
+        batch) are not, replaying their parent runs that handler again.
+    """
+
+    _header = struct.Struct("<II")
+    """Record header: payload length and payload crc32."""
+
+    def __init__(
+            self,
+            directory: Path | str | None = None,
+            *,
+            segment_bytes: int = Settings.JOURNAL_SEGMENT_BYTES,
+            commit_interval: float = Settings.JOURNAL_COMMIT_INTERVAL,
+            commit_batch: int = Settings.JOURNAL_COMMIT_BATCH,
+    ):
+        self.directory = Path(directory or Settings.JOURNAL_DIR)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self.commit_interval = commit_interval
+        self.commit_batch = commit_batch
+        self.commits = 0
+        """Number of group commits (`fsync` calls) performed so far."""
+        self.records = 0
+        """Number of records made durable so far."""
+        self._logger: Logger = getLogger("Journal")
+        self._pending: list[bytes] = []
+        self._pending_lock = Condition(Lock())
+        self._io_lock = Lock()
+        self._closed = False
+        self._topics: list[Topic] = []
+        self._segment_index, self._file = self._open_segment()
+        self._flusher = Thread(target=self._run, name="journal-flusher", daemon=True)
+        self._flusher.start()
+
+    # +-----------------------------------------------------------------------+
+    # |                               W R I T E                               |
+    # +-----------------------------------------------------------------------+
+    def append(self, event: BaseEvent, **kwargs):
+        """
+        Queue an event for the next group commit.
+
+        The signature matches a `Topic` handler so the journal can subscribe
+        to input events directly, see `attach`.
+
+        :param event: The event to record.
+        """
+        if Topic.nested():
+            # Handling its parent again on replay pushes it again
+            return
+        record = self.encode(event)
+        with self._pending_lock:
+            if self._closed:
+                raise RuntimeError("Cannot append to a closed journal.")
+            self._pending.append(record)
+            if len(self._pending) >= self.commit_batch:
+                self._pending_lock.notify()
+
+    def flush(self):
+        """Write and `fsync` every pending record before returning."""
+        self._commit_pending()
+
+    def close(self):
+        """Flush pending records, stop the flusher and close the segment."""
+        with self._pending_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._pending_lock.notify()
+        self._flusher.join()
+        self.flush()
+        for topic in list(self._topics):
+            self.detach(topic)
+        with self._io_lock:
+            self._file.close()
+
+    def attach(self, topic: Topic | None = None):
+        """Subscribe the journal to every input event pushed to the topic."""
+        topic = topic or Topic.active()
+        topic.add_handler(BaseInputEvent, self.append)
+        self._topics.append(topic)
+
+    def detach(self, topic: Topic | None = None):
+        """Stop recording the input events of the topic."""
+        topic = topic or Topic.active()
+        topic.remove_handler(BaseInputEvent, self.append)
+        self._topics.remove(topic)
+
+    def _run(self):
+        while True:
+            with self._pending_lock:
+                if not self._pending and not self._closed:
+                    self._pending_lock.wait(self.commit_interval)
+                if self._closed:
+                    return
+            self._commit_pending()
+
+    def _commit_pending(self):
+        # The batch is taken under the IO lock, so batches drained by the
+        # flusher and by `flush` are written in the order they were taken.
+        with self._io_lock:
+            with self._pending_lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return
+            self._file.write(b"".join(batch))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.commits += 1
+            self.records += len(batch)
+            if self._file.tell() >= self.segment_bytes:
+                self._file.close()
+                self._segment_index, self._file = self._open_segment(self._segment_index + 1)
+
+    def _open_segment(self, index: int | None = None) -> tuple[int, BinaryIO]:
+        if index is None:
+            existing = self.segments(self.directory)
+            index = int(existing[-1].stem.split("-")[-1]) if existing else 1
+            if existing:
+                self._truncate_torn_tail(existing[-1])
+        path = self.directory / f"journal-{index:08d}.log"
+        return index, open(path, "ab")
+
+    def _truncate_torn_tail(self, path: Path):
+        """
+        Cut a torn record (e.g. after a crash) off the end of a segment, so the
+        records appended after a restart are not hidden behind it.
+        """
+        data = path.read_bytes()
+        valid = self._valid_length(data)
+        if valid < len(data):
+            self._logger.warning("Truncating %d bytes of a torn record off %s", len(data) - valid, path)
+            with open(path, "r+b") as file:
+                file.truncate(valid)
+                file.flush()
+                os.fsync(file.fileno())
+
+    # +-----------------------------------------------------------------------+
+    # |                                R E A D                                |
+    # +-----------------------------------------------------------------------+
+    @staticmethod
+    def segments(directory: Path | str | None = None) -> list[Path]:
+        """List the segments of a journal in replay order."""
+        return sorted(Path(directory or Settings.JOURNAL_DIR).glob("journal-*.log"))
+
+    @classmethod
+    def read(cls, directory: Path | str | None = None) -> Iterator[BaseEvent]:
+        """
+        Decode every event recorded in the journal, oldest first.
+
+        :param directory: The journal directory, defaults to the configured one.
+        :return: An iterator of events.
+        """
+        segments = cls.segments(directory)
+        for idx, path in enumerate(segments):
+            data = path.read_bytes()
+            valid = cls._valid_length(data)
+            if valid < len(data) and idx < len(segments) - 1:
+                raise JournalCorrupted(f"Bad record at byte {valid} of {path}.")
+            for payload in cls._payloads(data[:valid]):
+                yield cls.decode(payload)
+
+    @classmethod
+    def _payloads(cls, data: bytes) -> Iterator[bytes]:
+        cursor = 0
+        while cursor + cls._header.size <= len(data):
+            length, crc = cls._header.unpack_from(data, cursor)
+            start = cursor + cls._header.size
+            payload = data[start:start + length]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                return
+            yield payload
+            cursor = start + length
+
+    @classmethod
+    def _valid_length(cls, data: bytes) -> int:
+        """The bytes of a segment up to the end of its last intact record."""
+        cursor = 0
+        for payload in cls._payloads(data):
+            cursor += cls._header.size + len(payload)
+        return cursor
+
+    @classmethod
+    def replay(cls, directory: Path | str | None = None, topic: Topic | None = None) -> int:
+        """
+        Push every recorded event back through a topic.
+
+        The topic should not have a journal attached, otherwise the replayed
+        events are recorded a second time.
+
+        :param directory: The journal directory, defaults to the configured one.
+        :param topic: The topic which should process the events.
+        :return: The number of replayed events.
+        """
+        topic = topic or Topic.active()
+        count = 0
+        started = time.perf_counter()
+        for event in cls.read(directory):
+            topic.push(event)
+            count += 1
+        getLogger("Journal").info(
+            "Replayed %d events in %.3fs", count, time.perf_counter() - started
+        )
+        return count
+
+    # +-----------------------------------------------------------------------+
+    # |                       S E R I A L I Z A T I O N                       |
+    # +-----------------------------------------------------------------------+
+    @classmethod
+    def encode(cls, event: BaseEvent) -> bytes:
+        payload = b'{"type":"%s","event":%s}' % (
+            event_type_path(type(event)).encode(),
+            event.model_dump_json().encode(),
+        )
+        return cls._header.pack(len(payload), zlib.crc32(payload)) + payload
+
+    @staticmethod
+    def decode(payload: bytes) -> BaseEvent:
+        record = json.loads(payload)
+        return import_event_type(record["type"]).model_validate(record["event"])
@@ -0,0 +1,153 @@
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Mapping
+
+from src.wonderland.core.settings import Settings
+
+if TYPE_CHECKING:
+    from src.wonderland.pubsub.events.base import BaseEvent
+
+
+class _Lane:
+    """The queued events of one priority class, with its counters."""
+
+    __slots__ = ("name", "weight", "credit", "items", "pushed", "popped", "high_water", "wait_seconds", "rescued")
+
+    def __init__(self, name: str, weight: int):
+        self.name = name
+        self.weight = weight
+        self.credit = 0
+        self.items: deque[tuple[float, "BaseEvent"]] = deque()
+        self.pushed = 0
+        self.popped = 0
+        self.high_water = 0
+        self.wait_seconds = 0.0
+        self.rescued = 0
+
+
+class LaneQueue:
+    """
+    The queue of a `Topic`, split into priority lanes.
+
+    **Notes:**
+
+    -   An event goes to the lane named by its `lane` class variable, e.g.
+        `"system"` for lifecycle events, `"output"` and `"input"` for the
+        events of players. Events are FIFO within a lane.
+
+    -   Lanes are served by smooth weighted round-robin: out of every
+        `sum(weights)` events popped while all lanes are backlogged, each
+        lane gets `weight` of them, interleaved. A flood of input therefore
+        never holds back disconnects or the delivery of output for long.
+
+    -   Starvation protection: when the lane picked by weight is not the
+        highest priority one, an event of a lower lane which waited longer
+        than `max_wait` (and longer than the picked lane's next event) is
+        served instead. The highest priority lane (`"system"`) is never
+        pre-empted, and a rescued lane is charged for the turn it took, so
+        rescues at most double its share instead of turning the queue into
+        a single FIFO.
+
+    -   The queue is not thread safe, the `Topic` guards it with its lock.
+    """
+
+    def __init__(self, weights: Mapping[str, int] | None = None, *, max_wait: float = Settings.TOPIC_LANE_MAX_WAIT):
+        """
+        :param weights: The lanes and their weights, highest priority first.
+            Defaults to `Settings.TOPIC_LANES`.
+        :param max_wait: Seconds after which a waiting event is served first.
+        """
+        weights = weights if weights is not None else Settings.TOPIC_LANES
+        self.max_wait = max_wait
+        self._lanes = [_Lane(name, weight) for name, weight in weights.items()]
+        self._by_name = {lane.name: lane for lane in self._lanes}
+        self._by_class: dict[type["BaseEvent"], _Lane] = dict()
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self):
+        """The queued events per lane, as `(lane name, event)`, oldest first."""
+        for lane in self._lanes:
+            for _, event in lane.items:
+                yield lane.name, event
+
+    def _lane_for(self, event_klass: type["BaseEvent"]) -> _Lane:
+        lane = self._by_class.get(event_klass)
+        if lane is None:
+            name = getattr(event_klass, "lane", self._lanes[0].name)
+            lane = self._by_name.get(name)
+            if lane is None:
+                raise ValueError(f"{event_klass.__name__} uses the unknown lane {name!r}.")
+            self._by_class[event_klass] = lane
+        return lane
+
+    def append(self, event: "BaseEvent"):
+        lane = self._lane_for(type(event))
+        lane.items.append((time.monotonic(), event))
+        lane.pushed += 1
+        if len(lane.items) > lane.high_water:
+            lane.high_water = len(lane.items)
+        self._size += 1
+
+    def pop(self) -> "BaseEvent":
+        """Take the next event to process. Raises `IndexError` when empty."""
+        if not self._size:
+            raise IndexError("pop from an empty queue")
+        now = time.monotonic()
+        backlogged = [lane for lane in self._lanes if lane.items]
+        if len(backlogged) == 1:
+            chosen = backlogged[0]
+        else:
+            chosen = None
+            total = 0
+            for lane in backlogged:
+                lane.credit += lane.weight
+                total += lane.weight
+                if chosen is None or lane.credit > chosen.credit:
+                    chosen = lane
+            rescued = self._starving(backlogged, chosen, now)
+            if rescued is not None:
+                # The rescued lane takes the turn, and pays for it
+                chosen = rescued
+            chosen.credit -= total
+        enqueued_at, event = chosen.items.popleft()
+        chosen.popped += 1
+        chosen.wait_seconds += now - enqueued_at
+        if not chosen.items:
+            chosen.credit = 0
+        self._size -= 1
+        return event
+
+    def _starving(self, lanes: list[_Lane], picked: _Lane, now: float) -> _Lane | None:
+        """
+        A lane below the picked one whose next event waited too long, and
+        longer than the picked one's. A lane still paying for a previous turn
+        (negative credit) is not rescued again.
+        """
+        if picked is self._lanes[0]:
+            return None
+        oldest = picked
+        for lane in lanes[lanes.index(picked) + 1:]:
+            if lane.credit >= 0 and lane.items[0][0] < oldest.items[0][0]:
+                oldest = lane
+        if oldest is picked or now - oldest.items[0][0] <= self.max_wait:
+            return None
+        oldest.rescued += 1
+        return oldest
+
+    def stats(self) -> dict[str, dict]:
+        """Depth and throughput counters per lane."""
+        return {
+            lane.name: {
+                "weight": lane.weight,
+                "depth": len(lane.items),
+                "high_water": lane.high_water,
+                "pushed": lane.pushed,
+                "popped": lane.popped,
+                "mean_wait_seconds": lane.wait_seconds / lane.popped if lane.popped else 0.0,
+                "rescued": lane.rescued,
+            }
+            for lane in self._lanes
+        }
@@ -0,0 +1,279 @@
+import random
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as DeadlineExceeded
+from contextvars import ContextVar, copy_context
+from logging import Logger, getLogger
+from threading import Lock
+from typing import TYPE_CHECKING, Callable
+
+from src.wonderland import crud
+from src.wonderland.core.db import open_session
+from src.wonderland.core.settings import Settings
+from src.wonderland.session import Session
+
+if TYPE_CHECKING:
+    from src.wonderland.pubsub.events.base import BaseEvent
+
+
+_supervised: ContextVar[bool] = ContextVar("supervised", default=False)
+"""Set within a handler running on a supervisor thread."""
+
+
+class DeadLetter:
+    """An event one of its handlers failed on, or did not finish in time."""
+
+    __slots__ = ("event", "handler", "error", "at")
+
+    def __init__(self, event: "BaseEvent", handler: Callable, error: BaseException):
+        self.event = event
+        self.handler = handler
+        self.error = error
+        self.at = time.time()
+
+    def __repr__(self):
+        return f"DeadLetter({type(self.event).__name__}, {_name(self.handler)}, {self.error!r})"
+
+
+class _HandlerStats:
+    """The counters and circuit breaker state of one handler."""
+
+    __slots__ = ("calls", "failures", "timeouts", "retries", "skipped", "trips", "seconds", "streak", "open_until")
+
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.skipped = 0
+        self.trips = 0
+        self.seconds = 0.0
+        self.streak = 0
+        """Consecutive timeouts and failures."""
+        self.open_until = 0.0
+        """While in the future, the breaker is open and the handler skipped."""
+
+
+def _name(handler: Callable) -> str:
+    return getattr(handler, "__qualname__", repr(handler))
+
+
+class HandlerSupervisor:
+    """
+    Runs the handlers of a `Topic` so that one bad handler cannot take down
+    the others.
+
+    **Notes:**
+
+    -   A handler raising does not stop the remaining handlers of the event.
+        The event is kept in a bounded dead-letter queue with the error, see
+        `dead_letters`.
+
+    -   A handler with a deadline runs on a supervisor thread while the
+        dispatcher waits at most that long for it. A handler which misses
+        its deadline keeps running in the background, but the dispatcher
+        moves on to the next handler. Its event goes to the dead-letter
+        queue too.
+
+    -   A handler with a deadline gets its own ORM session, closed once it
+        returns. A handler still running past its deadline therefore never
+        shares a session with the ones which run after it.
+
+    -   Handlers pushing events from a supervisor thread run the handlers of
+        those events inline, within their own deadline. Re-entrant room
+        locks held by the parent handler therefore stay usable.
+
+    -   After `threshold` consecutive timeouts or failures a handler's
+        circuit breaker opens and the handler is skipped for `cooldown`
+        seconds. Then a single call is let through. Another timeout or
+        failure opens the breaker again, a success closes it.
+
+    -   A handler losing an optimistic concurrency race (`crud.Conflict`)
+        is run again, up to `retries` times with a short jittered backoff.
+        Its database session was rolled back, so it reads fresh records.
+        Handlers should therefore write before they push output.
+
+    -   Python cannot interrupt a thread. A handler which never returns
+        keeps a supervisor thread busy for good. Once every thread is busy,
+        the other supervised handlers time out too and their breakers open.
+    """
+
+    def __init__(
+            self,
+            *,
+            timeout: float | None = Settings.HANDLER_TIMEOUT,
+            threshold: int = Settings.HANDLER_BREAKER_THRESHOLD,
+            cooldown: float = Settings.HANDLER_BREAKER_COOLDOWN,
+            dead_letters: int = Settings.DEAD_LETTER_SIZE,
+            threads: int = Settings.HANDLER_THREADS,
+            retries: int = Settings.HANDLER_CONFLICT_RETRIES,
+            backoff: float = Settings.HANDLER_CONFLICT_BACKOFF,
+            retry_on: tuple[type[Exception], ...] = (crud.Conflict,),
+    ):
+        """
+        :param timeout: The deadline of handlers which do not set their own,
+            in seconds. `None` runs them inline, without a deadline.
+        :param threshold: Consecutive timeouts or failures which open a
+            handler's breaker.
+        :param cooldown: Seconds a handler is skipped once its breaker opens.
+        :param dead_letters: How many dead letters are kept.
+        :param threads: The maximum number of supervisor threads.
+        :param retries: How many times a conflicting handler is run again.
+        :param backoff: The base delay before a retry, in seconds. Doubled
+            at each attempt, with jitter.
+        :param retry_on: The exceptions which are worth a retry.
+        """
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.retry_on = retry_on
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.threads = threads
+        self._dead_letters: deque[DeadLetter] = deque(maxlen=dead_letters)
+        self._handlers: dict[Callable, _HandlerStats] = dict()
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = Lock()
+        self._logger: Logger = getLogger("Topic")
+
+    def _stats(self, handler: Callable) -> _HandlerStats:
+        stats = self._handlers.get(handler)
+        if stats is None:
+            stats = self._handlers.setdefault(handler, _HandlerStats())
+        return stats
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.threads, thread_name_prefix="topic-handler")
+        return self._executor
+
+    def run(self, handler: Callable[["BaseEvent"], None], event: "BaseEvent", timeout: float | None = None):
+        """
+        Run a handler, isolating its failures.
+
+        :param handler: The handler.
+        :param event: The event to handle.
+        :param timeout: The handler's deadline, in seconds, if any.
+        """
+        stats = self._stats(handler)
+        if stats.open_until:
+            if time.monotonic() < stats.open_until:
+                stats.skipped += 1
+                return
+            stats.open_until = 0.0
+        started = time.perf_counter()
+        try:
+            if timeout is None or _supervised.get():
+                self._attempt(handler, event, stats)
+            else:
+                future = self._get_executor().submit(copy_context().run, self._run_supervised, handler, event, stats)
+                try:
+                    future.result(timeout)
+                except DeadlineExceeded as e:
+                    if not future.done():
+                        self._timed_out(handler, stats, event, e)
+                        return
+                    raise
+        except Exception as e:
+            stats.failures += 1
+            self._dead_letters.append(DeadLetter(event, handler, e))
+            self._logger.exception("Handler %s failed on %s", _name(handler), type(event).__name__)
+            self._strike(handler, stats)
+        else:
+            stats.streak = 0
+        finally:
+            stats.calls += 1
+            stats.seconds += time.perf_counter() - started
+
+    def _attempt(self, handler: Callable[["BaseEvent"], None], event: "BaseEvent", stats: _HandlerStats):
+        """Run a handler, retrying it when it loses a concurrency race."""
+        for attempt in range(self.retries + 1):
+            try:
+                return handler(event)
+            except self.retry_on:
+                if attempt == self.retries:
+                    raise
+                stats.retries += 1
+                time.sleep(self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+    def _run_supervised(self, handler: Callable[["BaseEvent"], None], event: "BaseEvent", stats: _HandlerStats):
+        _supervised.set(True)
+        with open_session() as orm:
+            # What the handler loaded outlives its session, e.g. the `User`
+            # it logged in. Keep it readable once detached.
+            orm.expire_on_commit = False
+            Session.use_orm(orm)
+            self._attempt(handler, event, stats)
+
+    def _timed_out(self, handler: Callable, stats: _HandlerStats, event: "BaseEvent", error: BaseException):
+        stats.timeouts += 1
+        self._dead_letters.append(DeadLetter(event, handler, error))
+        self._logger.warning("Handler %s missed its deadline on %s", _name(handler), type(event).__name__)
+        self._strike(handler, stats)
+
+    def _strike(self, handler: Callable, stats: _HandlerStats):
+        """Count a timeout or failure, opening the breaker after too many."""
+        stats.streak += 1
+        if stats.streak >= self.threshold:
+            stats.trips += 1
+            stats.open_until = time.monotonic() + self.cooldown
+            self._logger.warning(
+                "Handler %s disabled for %.1fs after %d timeouts or failures",
+                _name(handler), self.cooldown, stats.streak,
+            )
+
+    def dead_letters(self) -> list[DeadLetter]:
+        """The events handlers failed on, oldest first."""
+        return list(self._dead_letters)
+
+    def drain_dead_letters(self) -> list[DeadLetter]:
+        """Take the dead letters out of the queue, e.g. to retry them."""
+        letters = []
+        while self._dead_letters:
+            letters.append(self._dead_letters.popleft())
+        return letters
+
+    def stats(self, top: int = 10) -> dict:
+        """
+        Summarize the health of the handlers.
+
+        :param top: How many of the worst handlers to include.
+        :return: Totals, open breakers and the handlers with the most
+            failures and timeouts.
+        """
+        now = time.monotonic()
+        entries = list(self._handlers.items())
+        worst = sorted(entries, key=lambda item: item[1].failures + item[1].timeouts, reverse=True)[:top]
+        return {
+            "handlers": len(entries),
+            "calls": sum(stats.calls for _, stats in entries),
+            "failures": sum(stats.failures for _, stats in entries),
+            "timeouts": sum(stats.timeouts for _, stats in entries),
+            "retries": sum(stats.retries for _, stats in entries),
+            "skipped": sum(stats.skipped for _, stats in entries),
+            "dead_letters": len(self._dead_letters),
+            "open_breakers": [_name(handler) for handler, stats in entries if stats.open_until > now],
+            "worst": [
+                {
+                    "handler": _name(handler),
+                    "calls": stats.calls,
+                    "failures": stats.failures,
+                    "timeouts": stats.timeouts,
+                    "retries": stats.retries,
+                    "skipped": stats.skipped,
+                    "trips": stats.trips,
+                    "seconds": stats.seconds,
+                }
+                for handler, stats in worst
+                if stats.failures or stats.timeouts
+            ],
+        }
+
+    def close(self):
+        """Stop the supervisor threads, without waiting for hung handlers."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
@@ -1,7 +1,51 @@
-from threading import Lock, Thread
-from typing import Callable, Optional
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import update_wrapper
+from threading import Condition, Lock, Thread, current_thread
+from types import MethodType
+from typing import Callable, Iterator, Optional
 from logging import Logger, getLogger
 
+from src.wonderland.core.locks import LockManager
+from src.wonderland.pubsub.lanes import LaneQueue
+from src.wonderland.pubsub.supervisor import HandlerSupervisor
+
+
+_active_topic: ContextVar[Optional["Topic"]] = ContextVar("active_topic", default=None)
+"""The topic processing the current event, if any."""
+
+_depth: ContextVar[int] = ContextVar("dispatch_depth", default=0)
+"""How many events are being handled in the current context, see `Topic.nested`."""
+
+_collector: ContextVar[tuple[type["BaseEvent"], list["BaseEvent"]] | None] = ContextVar("collector", default=None)
+"""Events of this type pushed in the current context are collected, see `Topic.collect`."""
+
+
+class _topicmethod:
+    """
+    Let a `Topic` method be called on an instance or on the class itself.
+
+    Called on the class, the method is bound to `Topic.active()`, so code
+    written against the class (e.g. `Topic.push(...)` in a handler) keeps
+    working and talks to the topic which is processing the current event.
+    """
+
+    def __init__(self, func):
+        self.__func__ = func
+        update_wrapper(self, func)
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            instance = owner.active()
+        return MethodType(self.__func__, instance)
+
+
+class _declaremethod(_topicmethod):
+    """Like `_topicmethod`, but called on the class it is bound to the class."""
+
+    def __get__(self, instance, owner):
+        return MethodType(self.__func__, owner if instance is None else instance)
+
 
 class Topic:
     """
@@ -12,90 +56,370 @@ class Topic:
     -   This is a base class that orchestrates the connections between events
         and their corresponding handlers.
 
+    -   Every instance is an independent world: it has its own queue, handler
+        registry, lock and worker thread. Several topics can live in one
+        process without contending with each other.
+
+    -   Methods can also be called on the class, e.g. `Topic.push(event)`.
+        They then apply to the topic processing the current event, or to the
+        default instance outside of event processing, see `active`.
+
+    -   Handlers declared with the `@Topic.register` decorator apply to every
+        topic. Handlers added on an instance (`topic.add_handler`, or
+        `@topic.register`) only apply to that instance.
+
     -   The `Topic` class is designed with *thread safety* in mind. All methods
         which mutate state are guarded by a Lock to prevent race conditions.
+
+    -   Queued events are dispatched through a `HandlerSupervisor`: a failing
+        handler does not stop the others, and a handler may be given a
+        deadline with `register(..., timeout=...)`. `dispatch` called
+        directly runs the handlers bare and lets exceptions propagate, e.g.
+        so a batch can roll back.
     """
 
-    __queue: list["BaseEvent"] | None = list()
-    """A naive collection of unprocessed events."""
+    __declared: dict[type["BaseEvent"], list[Callable[["BaseEvent"], None]]] = dict()
+    """Handlers declared with `@Topic.register`, shared by every topic."""
 
-    __registry: dict[type["BaseEvent"], list[Callable[["BaseEvent"], None]]] | None = dict()
-    """A registry of event types and their associated handlers (or subscribers)."""
+    __declared_timeouts: dict[Callable[["BaseEvent"], None], float] = dict()
+    """Deadlines of declared handlers, in seconds."""
 
-    __thread_lock: Lock = Lock()
-    """A `threading.Lock()` object used for thread synchronization."""
+    __declared_version: int = 0
+    """Bumped whenever a handler is declared, to invalidate dispatch caches."""
 
-    __logger: Logger = getLogger("Topic")
-    """A Logger object used to log information from the Topic class."""
+    __defaults: dict[type["Topic"], "Topic"] = dict()
+    """The default instance of `Topic` and of each of its subclasses."""
 
-    __pool: list[Thread] = []
-    """A pool of threads where events are processed."""
+    __class_lock: Lock = Lock()
+    """A `threading.Lock()` guarding the class level state."""
 
-    def __new__(cls, *args, **kwargs):
-        """This class is not meant to be instantiated."""
-        raise NotImplementedError(
-            "Will not instantiate Topic class. Try subclassing for "
-            "customization."
-        )
+    def __init__(
+            self,
+            *,
+            autoprocess: bool = True,
+            supervisor: HandlerSupervisor | None = None,
+            lanes: dict[str, int] | None = None,
+    ):
+        """
+        :param autoprocess: Process every event as soon as it is pushed. When
+            disabled, events wait in the queue for `process_next_event` or for
+            the worker thread started with `start_workers`.
+        :param supervisor: Runs the handlers of queued events. Defaults to the
+            deadlines and breaker settings in `Settings`.
+        :param lanes: The priority lanes of the queue and their weights,
+            see `LaneQueue`. Defaults to `Settings.TOPIC_LANES`.
+        """
+        self.autoprocess = autoprocess
 
-    @classmethod
-    def _get_logger(cls) -> Logger:
-        return cls.__logger
+        self.__queue: LaneQueue = LaneQueue(lanes)
+        """Unprocessed events, in priority lanes."""
 
-    @classmethod
-    def push(cls, event: "BaseEvent"):
-        with cls.__thread_lock:
-            cls.__queue.append(event)
-        cls.process_next_event()
+        self.__registry: dict[type["BaseEvent"], list[Callable[["BaseEvent"], None]]] = dict()
+        """A registry of event types and their associated handlers (or subscribers)."""
 
-    @classmethod
-    def pop(cls) -> "BaseEvent":
-        with cls.__thread_lock:
-            return cls.__queue.pop(-1)
+        self.__dispatch: dict[type["BaseEvent"], list[Callable[["BaseEvent"], None]]] = dict()
+        """Resolved handlers per concrete event type, rebuilt when handlers change."""
 
-    @classmethod
-    def add_handler(cls, event_klass: type["BaseEvent"], handler: Callable[["BaseEvent"], None]):
-        with cls.__thread_lock:
-            cls.__registry.setdefault(event_klass, list()).append(handler)
+        self.__timeouts: dict[Callable[["BaseEvent"], None], float] = dict()
+        """Deadlines of the handlers added to this instance, in seconds."""
+
+        self.__dispatch_version: int = -1
+        """The value of `__declared_version` the dispatch cache was built for."""
+
+        self.__thread_lock: Lock = Lock()
+        """A `threading.Lock()` object used for thread synchronization."""
+
+        self.__pending = Condition(self.__thread_lock)
+        """Signals worker threads that events were pushed."""
+
+        self.__logger: Logger = getLogger("Topic")
+        """A Logger object used to log information from the Topic class."""
 
+        self.__pool: list[Thread] = []
+        """A pool of threads where events are processed."""
+
+        self.__closing: bool = False
+        """Set by `close` to stop the worker threads."""
+
+        self.locks: LockManager = LockManager()
+        """Per room and per thing locks for the handlers of this world."""
+
+        self.supervisor: HandlerSupervisor = supervisor if supervisor is not None else HandlerSupervisor()
+        """Isolates failing and slow handlers, see `HandlerSupervisor`."""
+
+    # +-----------------------------------------------------------------------+
+    # |                           I N S T A N C E S                           |
+    # +-----------------------------------------------------------------------+
     @classmethod
-    def remove_handler(cls, event_klass: type["BaseEvent"], handler: Callable[["BaseEvent"], None]):
-        with cls.__thread_lock:
-            cls.__registry[event_klass].remove(handler)
+    def default(cls) -> "Topic":
+        """The topic used when the class is used directly, created on demand."""
+        topic = cls.__defaults.get(cls)
+        if topic is None:
+            with cls.__class_lock:
+                topic = cls.__defaults.get(cls)
+                if topic is None:
+                    topic = cls.__defaults[cls] = cls()
+        return topic
 
     @classmethod
-    def register(cls, event_klass: type["BaseEvent"]):
+    def active(cls) -> "Topic":
+        """The topic processing the current event, or the default topic."""
+        topic = _active_topic.get()
+        if topic is not None and isinstance(topic, cls):
+            return topic
+        return cls.default()
+
+    @contextmanager
+    def activate(self) -> Iterator["Topic"]:
+        """Route calls made on the class to this topic within the block."""
+        token = _active_topic.set(self)
+        try:
+            yield self
+        finally:
+            _active_topic.reset(token)
+
+    # +-----------------------------------------------------------------------+
+    # |                              E V E N T S                              |
+    # +-----------------------------------------------------------------------+
+    @_topicmethod
+    def _get_logger(self) -> Logger:
+        return self.__logger
+
+    @_topicmethod
+    def push(self, event: "BaseEvent"):
+        collector = _collector.get()
+        if collector is not None and isinstance(event, collector[0]):
+            collector[1].append(event)
+            return
+        self.enqueue(event)
+        if self.autoprocess:
+            self.process_next_event()
+
+    @_topicmethod
+    def enqueue(self, event: "BaseEvent"):
+        """
+        Queue an event without processing it, whatever `autoprocess`, e.g.
+        from a thread which must not run handlers. The worker started with
+        `start_workers` handles it.
+
+        :param event: The event to queue.
+        """
+        with self.__thread_lock:
+            self.__queue.append(event)
+            self.__pending.notify()
+
+    @_topicmethod
+    def pop(self) -> "BaseEvent":
+        with self.__thread_lock:
+            return self.__queue.pop()
+
+    @_topicmethod
+    def queued(self) -> list[tuple[str, "BaseEvent"]]:
+        """A copy of the queued events, as `(lane name, event)`."""
+        with self.__thread_lock:
+            return list(self.__queue)
+
+    @_topicmethod
+    def lane_stats(self) -> dict[str, dict]:
+        """Depth and throughput counters per queue lane."""
+        with self.__thread_lock:
+            return self.__queue.stats()
+
+    @_topicmethod
+    def add_handler(
+            self,
+            event_klass: type["BaseEvent"],
+            handler: Callable[["BaseEvent"], None],
+            *,
+            timeout: float | None = None,
+    ):
+        with self.__thread_lock:
+            self.__registry.setdefault(event_klass, list()).append(handler)
+            if timeout is not None:
+                self.__timeouts[handler] = timeout
+            self.__dispatch.clear()
+
+    @_topicmethod
+    def remove_handler(self, event_klass: type["BaseEvent"], handler: Callable[["BaseEvent"], None]):
+        with self.__thread_lock:
+            self.__registry[event_klass].remove(handler)
+            self.__timeouts.pop(handler, None)
+            self.__dispatch.clear()
+
+    @_declaremethod
+    def register(self_or_cls, event_klass: type["BaseEvent"], *, timeout: float | None = None):
         """
         Decorate a function as a subscriber for the given event type.
 
+        Used on the class, the handler applies to every topic. Used on an
+        instance, it only applies to that topic.
+
         :param event_klass: The event type to register.
+        :param timeout: The handler's deadline in seconds, see
+            `HandlerSupervisor`. Defaults to the supervisor's.
         :return: A decorated function.
         """
         def register_decorator(func):
-            cls.add_handler(event_klass, func)
+            if isinstance(self_or_cls, Topic):
+                self_or_cls.add_handler(event_klass, func, timeout=timeout)
+            else:
+                Topic.declare(event_klass, func, timeout=timeout)
             return func
         return register_decorator
 
     @classmethod
-    def process_next_event(cls, raise_if_empty=True) -> Optional["BaseEvent"]:
+    def declare(
+            cls,
+            event_klass: type["BaseEvent"],
+            handler: Callable[["BaseEvent"], None],
+            *,
+            timeout: float | None = None,
+    ):
+        """Add a handler which applies to every topic."""
+        with Topic.__class_lock:
+            Topic.__declared.setdefault(event_klass, list()).append(handler)
+            if timeout is not None:
+                Topic.__declared_timeouts[handler] = timeout
+            Topic.__declared_version += 1
+
+    @_topicmethod
+    def handlers_for(self, event_klass: type["BaseEvent"]) -> list[Callable[["BaseEvent"], None]]:
+        """
+        Resolve every handler subscribed to an event type or to its parents.
+
+        :param event_klass: The concrete event type.
+        :return: The handlers, declared ones first.
+        """
+        if self.__dispatch_version != Topic.__declared_version:
+            with self.__thread_lock:
+                self.__dispatch.clear()
+                self.__dispatch_version = Topic.__declared_version
+        handlers = self.__dispatch.get(event_klass)
+        if handlers is None:
+            with self.__thread_lock:
+                handlers = [
+                    handler
+                    for registry in (Topic.__declared, self.__registry)
+                    for klass, klass_handlers in list(registry.items())
+                    if issubclass(event_klass, klass)
+                    for handler in klass_handlers
+                ]
+                self.__dispatch[event_klass] = handlers
+        return handlers
+
+    @_topicmethod
+    def process_next_event(self, raise_if_empty=True) -> Optional["BaseEvent"]:
         try:
-            next_event = cls.pop()
+            next_event = self.pop()
         except IndexError as e:
             if raise_if_empty:
                 raise
             return
-        for event_klass, handlers in cls.__registry.items():
-            if isinstance(next_event, event_klass):
-                for handler in handlers:
-                    handler(next_event)
-        #             t = Thread(target=handler, args=(next_event,))
-        #             t.start()
-        #             cls.__pool.append(t)
-        # cls.__pool = [t for t in cls.__pool if t.is_alive()]
+        self.dispatch(next_event, isolate=True)
         return next_event
 
-    @classmethod
-    def close(cls):
-        for t in cls.__pool:
-            if t.is_alive():
+    @_topicmethod
+    def dispatch(self, event: "BaseEvent", *, isolate: bool = False):
+        """
+        Run the handlers of an event right away, bypassing the queue.
+
+        :param event: The event to handle.
+        :param isolate: Run the handlers through the `supervisor`. Otherwise
+            the first exception stops the dispatch and propagates.
+        """
+        token = _active_topic.set(self)
+        depth = _depth.set(_depth.get() + 1)
+        try:
+            if isolate:
+                run = self.supervisor.run
+                for handler in self.handlers_for(type(event)):
+                    run(handler, event, self.__timeout_of(handler))
+            else:
+                for handler in self.handlers_for(type(event)):
+                    handler(event)
+        finally:
+            _depth.reset(depth)
+            _active_topic.reset(token)
+
+    @staticmethod
+    def nested() -> bool:
+        """
+        Whether the event being handled was pushed or dispatched by a handler
+        of another event, e.g. the commands of a batch.
+        """
+        return _depth.get() > 1
+
+    def __timeout_of(self, handler: Callable[["BaseEvent"], None]) -> float | None:
+        timeout = self.__timeouts.get(handler)
+        if timeout is None:
+            timeout = Topic.__declared_timeouts.get(handler, self.supervisor.timeout)
+        return timeout
+
+    @staticmethod
+    @contextmanager
+    def collect(event_klass: type["BaseEvent"]) -> Iterator[list["BaseEvent"]]:
+        """
+        Collect the events of a type pushed within the block, in this thread,
+        instead of processing them.
+
+        :param event_klass: The event type to collect, e.g. output events.
+        :return: The list the events are collected into.
+        """
+        collected = []
+        token = _collector.set((event_klass, collected))
+        try:
+            yield collected
+        finally:
+            _collector.reset(token)
+
+    # +-----------------------------------------------------------------------+
+    # |                             W O R K E R S                             |
+    # +-----------------------------------------------------------------------+
+    @_topicmethod
+    def start_workers(self, count: int = 1):
+        """
+        Start threads which process queued events in the background.
+
+        Handlers without a deadline share the ORM session of the process
+        (`Session.get_orm`) and the `User` instances of the live sessions,
+        neither of which may be used by two threads at once, so a topic has
+        at most one worker.
+
+        :param count: The number of threads to start, at most one.
+        :raises ValueError: When it would run more than one worker.
+        """
+        with self.__thread_lock:
+            alive = [t for t in self.__pool if t.is_alive()]
+            if count + len(alive) > 1:
+                raise ValueError("A topic has at most one worker, its handlers share the ORM session.")
+            self.__closing = False
+            self.__pool = alive
+            for _ in range(count):
+                t = Thread(target=self.__work, name=f"topic-worker-{len(self.__pool)}", daemon=True)
+                t.start()
+                self.__pool.append(t)
+
+    @_topicmethod
+    def workers(self) -> int:
+        """How many worker threads are running, see `start_workers`."""
+        with self.__thread_lock:
+            return sum(t.is_alive() for t in self.__pool)
+
+    def __work(self):
+        while True:
+            with self.__thread_lock:
+                while not self.__queue and not self.__closing:
+                    self.__pending.wait()
+                if self.__closing and not self.__queue:
+                    return
+            self.process_next_event(raise_if_empty=False)
+
+    @_topicmethod
+    def close(self):
+        with self.__thread_lock:
+            self.__closing = True
+            self.__pending.notify_all()
+        for t in self.__pool:
+            if t.is_alive() and t is not current_thread():
                 t.join()
+        self.supervisor.close()
@@ -0,0 +1,59 @@
+from src.wonderland.core.snapshots import RoomSnapshot
+from src.wonderland.utils import plural, quantify
+
+
+class LookRenderer:
+    """
+    Render and cache what a player sees when looking around a room.
+
+    **Notes:**
+
+    -   Rooms are rendered from their `RoomSnapshot`, without touching the
+        ORM. The rendered text is cached per room along with the snapshot's
+        version, and only rebuilt once a newer snapshot was published.
+
+    -   Identical things are grouped and counted by the database, e.g.
+        "You see 3 apples.", so a room full of copies renders in one pass
+        over the distinct names.
+
+    -   Only the first `Settings.LOOK_MAX_NAMES` names are listed. A larger
+        room ends with "...and 1,234 more items." and is never loaded whole.
+    """
+
+    _cache: dict[int, tuple[int, str]] = dict()
+    """Rendered text per room id, with the snapshot version it was rendered from."""
+
+    hits: int = 0
+    misses: int = 0
+
+    def __new__(cls, *args, **kwargs):
+        """This class is not meant to be instantiated."""
+        raise NotImplementedError("Will not instantiate LookRenderer class.")
+
+    @classmethod
+    def render(cls, snapshot: RoomSnapshot) -> str:
+        """
+        Describe a room, from the cache when it did not change.
+
+        :param snapshot: The room to describe, see `RoomSnapshots.get`.
+        :return: The description markup.
+        """
+        cached = cls._cache.get(snapshot.room_id)
+        if cached is not None and cached[0] == snapshot.version:
+            cls.hits += 1
+            return cached[1]
+        cls.misses += 1
+        parts = [f"You look around the {snapshot.name}."]
+        if snapshot.description:
+            parts.append("\n" + snapshot.description)
+        parts.extend(f" You see {quantify(count, name)}." for name, count in snapshot.counts)
+        rest = snapshot.total - sum(count for _, count in snapshot.counts)
+        if rest:
+            parts.append(f" ...and {rest:,} more {'item' if rest == 1 else plural('item')}.")
+        markup = "".join(parts)
+        cls._cache[snapshot.room_id] = (snapshot.version, markup)
+        return markup
+
+    @classmethod
+    def clear(cls):
+        cls._cache.clear()
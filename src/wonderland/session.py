@@ -1,16 +1,343 @@
-from pydantic import BaseModel
+import struct
+import time
+import typing as t
+from contextvars import ContextVar
+from itertools import count
+from threading import RLock
+
+from pydantic import BaseModel, PrivateAttr
+from sqlalchemy import event, inspect
 from sqlmodel import Session as OrmSession
 
+from src.wonderland import crud
+from src.wonderland.core.settings import Settings
 from src.wonderland.models import User
 
+if t.TYPE_CHECKING:
+    from src.wonderland.commands.context import CommandContext
+    from src.wonderland.commands.limits import TokenBucket
+
+
+_orm: ContextVar[OrmSession | None] = ContextVar("orm", default=None)
+"""The ORM session of the current handler, when it has its own."""
+
 
 class Session(BaseModel):
-    user: User
+    id: int | None = None
+    user: User | None = None
+    _contexts: list["CommandContext"] = PrivateAttr(default_factory=list)
+    _buckets: dict[str, "TokenBucket"] = PrivateAttr(default_factory=dict)
 
     @classmethod
     def get_orm(cls) -> OrmSession:
-        return getattr(cls, "orm")
+        return _orm.get() or getattr(cls, "orm")
 
     @classmethod
     def set_orm(cls, orm: OrmSession):
         setattr(cls, "orm", orm)
+
+    @classmethod
+    def use_orm(cls, orm: OrmSession):
+        """
+        Give the current context its own ORM session, e.g. a handler on a
+        supervisor thread. The shared one is left to the other contexts.
+        """
+        _orm.set(orm)
+
+    # +-----------------------------------------------------------------------+
+    # |                            C O N T E X T S                            |
+    # +-----------------------------------------------------------------------+
+    def push_context(self, context: "CommandContext"):
+        """Make a command context active until it is popped or expires."""
+        self._contexts.append(context)
+
+    def pop_context(self, name: str | None = None) -> t.Optional["CommandContext"]:
+        """
+        Leave the active context.
+
+        :param name: Only pop the active context if it has this name.
+        :return: The popped context, if any.
+        """
+        if not self._contexts:
+            return None
+        if name is not None and self._contexts[-1].name != name:
+            return None
+        return self._contexts.pop()
+
+    def active_context(self) -> t.Optional["CommandContext"]:
+        """The innermost context which has not expired, dropping expired ones."""
+        while self._contexts and self._contexts[-1].expired():
+            self._contexts.pop()
+        return self._contexts[-1] if self._contexts else None
+
+
+class SessionRegistry:
+    """
+    The live sessions of this process, by id.
+
+    **Notes:**
+
+    -   Input events only carry the id of their session (and of its user),
+        see `BaseInputEvent.session`. The session, its `User` and its
+        command contexts are never copied into events.
+
+    -   There is one `User` instance per user id, shared by every session of
+        that user. Handlers update it in place (e.g. `crud.update_user`) and
+        every session sees the change.
+
+    -   Sessions are also indexed by the room their user stands in. The
+        index follows room moves made through the ORM.
+
+    -   A session referenced by an event but unknown to this process (a
+        replayed journal, another shard) is restored from the user id.
+
+    -   Sessions idle for `Settings.SESSION_IDLE_TIMEOUT` are hibernated: they
+        are packed into a few bytes and their `User`, command contexts and
+        rate limit buckets are released. The next input resumes them, see
+        `touch`. Contexts have expired and buckets have refilled by then, so
+        nothing observable is lost.
+
+    -   A disconnected session is hibernated too, and can be resumed by a
+        reconnecting client within `Settings.SESSION_GRACE`.
+
+    -   The indexes are shared by every thread handling input (e.g. one per
+        client connection), every method which reads or changes several of
+        them takes the registry's (re-entrant) lock.
+    """
+
+    _sessions: dict[int, Session] = dict()
+    _users: dict[int, User] = dict()
+    _user_sessions: dict[int, set[int]] = dict()
+    _rooms: dict[int | None, set[int]] = dict()
+    _last_seen: dict[int, float] = dict()
+    _hibernated: dict[int, bytes] = dict()
+    _record = struct.Struct("<Qd?")
+    """A hibernated session: user id, hibernated since, disconnected."""
+    _next_sweep: float = 0.0
+    _ids = count(1)
+    _lock: RLock = RLock()
+
+    def __new__(cls, *args, **kwargs):
+        """This class is not meant to be instantiated."""
+        raise NotImplementedError("Will not instantiate SessionRegistry class.")
+
+    @classmethod
+    def open(cls, user: User | None = None) -> Session:
+        """Create and register a session for a new connection."""
+        return cls.attach(Session(user=user))
+
+    @classmethod
+    def attach(cls, session: Session) -> Session:
+        """Register a session, assigning it an id if it has none."""
+        with cls._lock:
+            if session.id is None:
+                session.id = next(cls._ids)
+                while session.id in cls._sessions or session.id in cls._hibernated:
+                    session.id = next(cls._ids)
+            cls._sessions[session.id] = session
+            cls._last_seen[session.id] = time.monotonic()
+            if session.user is not None:
+                cls.bind_user(session, session.user)
+        return session
+
+    @classmethod
+    def close(cls, session_id: int) -> Session | None:
+        """Forget a session for good."""
+        with cls._lock:
+            cls._hibernated.pop(session_id, None)
+            cls._last_seen.pop(session_id, None)
+            session = cls._sessions.pop(session_id, None)
+            if session is not None and session.user is not None:
+                cls._unbind_user(session)
+        return session
+
+    @classmethod
+    def get(cls, session_id: int) -> Session | None:
+        return cls._sessions.get(session_id)
+
+    @classmethod
+    def resolve(cls, session_id: int, user_id: int | None = None) -> Session:
+        """
+        Find a session by id, resuming or restoring it if it is not live.
+
+        :param session_id: The id of the session.
+        :param user_id: The user to restore the session with.
+        :return: The live session.
+        """
+        session = cls._sessions.get(session_id)
+        if session is None:
+            session = cls.resume(session_id)
+        if session is None:
+            user = None
+            if user_id is not None:
+                user = crud.get_user(session=Session.get_orm(), user_id=user_id)
+            session = cls.attach(Session(id=session_id, user=user))
+        return session
+
+    @classmethod
+    def touch(cls, session: Session) -> Session:
+        """
+        Record activity on a session, resuming it if it was hibernated.
+
+        Called once per input at ingress. Idle sessions are swept from here
+        every `Settings.SESSION_SWEEP_INTERVAL`, so no timer thread is needed.
+
+        :param session: The session sending input.
+        :return: The same session, live.
+        """
+        now = time.monotonic()
+        with cls._lock:
+            if session.id not in cls._sessions:
+                if cls.resume(session.id, into=session) is None:
+                    cls.attach(session)
+            cls._last_seen[session.id] = now
+        if now >= cls._next_sweep:
+            cls.sweep(now)
+        return session
+
+    @classmethod
+    def bind_user(cls, session: Session, user: User):
+        """Log a user in on a session, sharing one `User` per user id."""
+        with cls._lock:
+            if session.user is not None and session.id in cls._user_sessions.get(session.user.id, ()):
+                cls._unbind_user(session)
+            live = cls._users.setdefault(user.id, user)
+            session.user = live
+            cls._user_sessions.setdefault(user.id, set()).add(session.id)
+            cls._rooms.setdefault(live.room_id, set()).add(session.id)
+
+    @classmethod
+    def _unbind_user(cls, session: Session):
+        user = session.user
+        sessions = cls._user_sessions.get(user.id, set())
+        sessions.discard(session.id)
+        if not sessions:
+            cls._user_sessions.pop(user.id, None)
+            cls._users.pop(user.id, None)
+        cls._rooms.get(user.room_id, set()).discard(session.id)
+
+    @classmethod
+    def in_room(cls, room_id: int) -> list[Session]:
+        """The live sessions whose user stands in a room."""
+        with cls._lock:
+            return [cls._sessions[session_id] for session_id in cls._rooms.get(room_id, ())]
+
+    @classmethod
+    def occupied_rooms(cls) -> list[int]:
+        """The rooms where at least one live session's user stands."""
+        with cls._lock:
+            return [room_id for room_id, sessions in cls._rooms.items() if sessions and room_id is not None]
+
+    @classmethod
+    def _move_user(cls, user_id: int, old_room_id: int | None, new_room_id: int | None):
+        with cls._lock:
+            for session_id in cls._user_sessions.get(user_id, ()):
+                cls._rooms.get(old_room_id, set()).discard(session_id)
+                cls._rooms.setdefault(new_room_id, set()).add(session_id)
+
+    @classmethod
+    def count(cls) -> int:
+        return len(cls._sessions)
+
+    # +-----------------------------------------------------------------------+
+    # |                         H I B E R N A T I O N                         |
+    # +-----------------------------------------------------------------------+
+    @classmethod
+    def hibernate(cls, session_id: int, *, disconnected: bool = False) -> bool:
+        """
+        Pack a session away and release everything it holds.
+
+        A session without a user (still at the login prompt) has nothing
+        worth resuming and is closed instead.
+
+        :param session_id: The id of the session.
+        :param disconnected: Whether its client is gone. Disconnected
+            sessions are forgotten after `Settings.SESSION_GRACE`.
+        :return: `True` if the session was hibernated.
+        """
+        with cls._lock:
+            record = cls._hibernated.get(session_id)
+            if record is not None:
+                user_id, _, _ = cls._record.unpack(record)
+                cls._hibernated[session_id] = cls._record.pack(user_id, time.monotonic(), disconnected)
+                return True
+            session = cls._sessions.get(session_id)
+            if session is None or session.user is None:
+                cls.close(session_id)
+                return False
+            user_id = session.user.id
+            cls.close(session_id)
+            # A client may still hold the session, keep only an empty shell
+            session.user = None
+            session._contexts.clear()
+            session._buckets.clear()
+            cls._hibernated[session_id] = cls._record.pack(user_id, time.monotonic(), disconnected)
+        return True
+
+    @classmethod
+    def resume(cls, session_id: int, *, into: Session | None = None) -> Session | None:
+        """
+        Bring a hibernated session back, e.g. when its client reconnects.
+
+        :param session_id: The id of the session.
+        :param into: The session shell to resume into, if the client kept it.
+        :return: The live session, or `None` if it was not hibernated or its
+            grace period is over.
+        """
+        with cls._lock:
+            record = cls._hibernated.pop(session_id, None)
+            if record is None:
+                return cls._sessions.get(session_id)
+            user_id, since, disconnected = cls._record.unpack(record)
+            if disconnected and time.monotonic() - since > Settings.SESSION_GRACE:
+                return None
+            user = cls._users.get(user_id)
+            if user is None:
+                user = crud.get_user(session=Session.get_orm(), user_id=user_id)
+            session = into if into is not None else Session(id=session_id)
+            session.user = user
+            return cls.attach(session)
+
+    @classmethod
+    def sweep(cls, now: float | None = None) -> tuple[int, int]:
+        """
+        Hibernate idle sessions and forget disconnected ones past their grace.
+
+        :param now: The current `time.monotonic()`.
+        :return: How many sessions were hibernated and forgotten.
+        """
+        now = now if now is not None else time.monotonic()
+        cls._next_sweep = now + Settings.SESSION_SWEEP_INTERVAL
+        hibernated = forgotten = 0
+        idle_since = now - Settings.SESSION_IDLE_TIMEOUT
+        for session_id, last_seen in list(cls._last_seen.items()):
+            if last_seen < idle_since and cls.hibernate(session_id):
+                hibernated += 1
+        expired_since = now - Settings.SESSION_GRACE
+        for session_id, record in list(cls._hibernated.items()):
+            _, since, disconnected = cls._record.unpack(record)
+            if disconnected and since < expired_since:
+                cls.close(session_id)
+                forgotten += 1
+        return hibernated, forgotten
+
+    @classmethod
+    def snapshot(cls) -> tuple[list[Session], list[bytes]]:
+        """A consistent copy of the live sessions and of the hibernated ones, packed."""
+        with cls._lock:
+            return list(cls._sessions.values()), list(cls._hibernated.values())
+
+    @classmethod
+    def stats(cls) -> dict:
+        return {
+            "live": len(cls._sessions),
+            "hibernated": len(cls._hibernated),
+            "users": len(cls._users),
+        }
+
+
+@event.listens_for(User, "after_update")
+def _follow_room_moves(mapper, connection, target):
+    history = inspect(target).attrs.room_id.history
+    for old_room_id in history.deleted:
+        SessionRegistry._move_user(target.id, old_room_id, target.room_id)
@@ -0,0 +1,2 @@
+from .router import ShardRouter
+from .worker import ShardWorker
@@ -0,0 +1,165 @@
+import multiprocessing
+from logging import Logger, getLogger
+from threading import Lock, Thread
+from typing import Callable
+
+from src.wonderland import crud
+from src.wonderland.core.db import new_session
+from src.wonderland.core.settings import Settings
+from src.wonderland.pubsub.codec import WireCodec
+from src.wonderland.pubsub.events.base import BaseInputEvent, BaseOutputEvent
+from src.wonderland.session import Session, SessionRegistry
+from src.wonderland.shard.worker import ShardWorker
+
+
+class ShardRouter:
+    """
+    Spread the world over several worker processes, one set of lands each.
+
+    **Notes:**
+
+    -   Lands are assigned to shards round-robin when the router starts. A
+        land created later is assigned by `land_id % shards`.
+
+    -   Input events are routed to the shard owning the land of the room
+        the player stands in, `session.user.room_id`. The room to land
+        mapping is cached and refreshed from the database on a miss. Players
+        in no room (e.g. not logged in yet), or in a room which does not
+        exist, go to shard 0 without asking the database again.
+
+    -   `push_event` can be given to `App(push=...)`, so lines of input are
+        parsed (and throttled) by the router's process, then handled by the
+        shard. See `src/debug/shard_server.py`.
+
+    -   The broker is a pair of `multiprocessing` queues per shard (inbox) and
+        one shared queue back to the router (outbox), drained by a collector
+        thread which calls `on_output` for every output event.
+
+    -   When a player walks through a `RoomPortal` into a land owned by
+        another shard, the worker asks the router to hand the session off.
+        The router updates the connection's room and tells the new shard to
+        adopt the player.
+    """
+
+    def __init__(
+            self,
+            shards: int = Settings.SHARD_COUNT,
+            on_output: Callable[[int, BaseOutputEvent], None] | None = None,
+    ):
+        self.shards = shards
+        self.on_output = on_output
+        self._logger: Logger = getLogger("ShardRouter")
+        self._context = multiprocessing.get_context("spawn")
+        self._inboxes: list[multiprocessing.Queue] = []
+        self._outbox: multiprocessing.Queue | None = None
+        self._processes: list[multiprocessing.Process] = []
+        self._collector: Thread | None = None
+        self._land_shard: dict[int, int] = dict()
+        self._room_land: dict[int, int | None] = dict()
+        self._connections: dict[int, Session] = dict()
+        self._lock = Lock()
+
+    def start(self):
+        """Assign lands to shards and spawn one worker process per shard."""
+        self._refresh_rooms()
+        land_ids = sorted({land_id for land_id in self._room_land.values() if land_id is not None})
+        for idx, land_id in enumerate(land_ids):
+            self._land_shard[land_id] = idx % self.shards
+        self._outbox = self._context.Queue()
+        for idx in range(self.shards):
+            inbox = self._context.Queue()
+            owned = {land_id for land_id, shard in self._land_shard.items() if shard == idx}
+            process = self._context.Process(
+                target=ShardWorker.main,
+                args=(idx, owned, inbox, self._outbox),
+                name=f"wonderland-shard-{idx}",
+                daemon=True,
+            )
+            process.start()
+            self._inboxes.append(inbox)
+            self._processes.append(process)
+        self._collector = Thread(target=self._collect, name="shard-collector", daemon=True)
+        self._collector.start()
+
+    def close(self):
+        """Stop every worker once it has drained its inbox."""
+        for inbox in self._inboxes:
+            inbox.put(None)
+        for process in self._processes:
+            process.join()
+        if self._outbox is not None:
+            self._outbox.put(None)
+        if self._collector is not None:
+            self._collector.join()
+
+    # +-----------------------------------------------------------------------+
+    # |                             R O U T I N G                             |
+    # +-----------------------------------------------------------------------+
+    def connect(self, session: Session) -> int:
+        """Register a client session, its id is the connection id."""
+        connection_id = SessionRegistry.attach(session).id
+        with self._lock:
+            self._connections[connection_id] = session
+        return connection_id
+
+    def disconnect(self, connection_id: int):
+        with self._lock:
+            self._connections.pop(connection_id, None)
+        SessionRegistry.close(connection_id)
+
+    def push(self, connection_id: int, event: BaseInputEvent):
+        """Forward an input event to the shard which owns the player's room."""
+        user = event.session.user
+        shard = self.shard_for_room(user.room_id if user is not None else None)
+        self._inboxes[shard].put(("input", connection_id, WireCodec.encode(event)))
+
+    def push_event(self, event: BaseInputEvent):
+        """Forward an input event from the connection of its session."""
+        self.push(event.session_id, event)
+
+    def shard_for_room(self, room_id: int | None) -> int:
+        if room_id is None:
+            return 0
+        if room_id not in self._room_land:
+            self._refresh_rooms()
+            # Remember the miss, the next push from this room must not rescan
+            self._room_land.setdefault(room_id, None)
+        land_id = self._room_land.get(room_id)
+        if land_id is None:
+            return 0
+        shard = self._land_shard.get(land_id)
+        if shard is None:
+            shard = self._assign_land(land_id)
+        return shard
+
+    def _assign_land(self, land_id: int) -> int:
+        shard = land_id % self.shards
+        with self._lock:
+            self._land_shard[land_id] = shard
+        owned = {land for land, owner in self._land_shard.items() if owner == shard}
+        self._inboxes[shard].put(("lands", None, owned))
+        return shard
+
+    def _refresh_rooms(self):
+        with new_session() as orm:
+            self._room_land = dict(crud.list_room_lands(session=orm))
+
+    def _collect(self):
+        while True:
+            message = self._outbox.get()
+            if message is None:
+                return
+            kind, connection_id, payload = message
+            if kind == "output":
+                if self.on_output is not None:
+                    self.on_output(connection_id, WireCodec.decode(payload))
+            elif kind == "handoff":
+                self._hand_off(connection_id, *payload)
+
+    def _hand_off(self, connection_id: int | None, user_id: int, room_id: int):
+        session = self._connections.get(connection_id)
+        if session is not None:
+            session.user.room_id = room_id
+        shard = self.shard_for_room(room_id)
+        self._logger.debug("Handing user %s off to shard %s", user_id, shard)
+        self._inboxes[shard].put(("adopt", connection_id, user_id))
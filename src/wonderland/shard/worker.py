@@ -0,0 +1,110 @@
+from multiprocessing import Queue
+from typing import Optional
+
+from src.wonderland import crud
+from src.wonderland.models import RoomPortal
+from src.wonderland.pubsub.codec import WireCodec
+from src.wonderland.pubsub.events import LookInputEvent
+from src.wonderland.pubsub.events.base import BaseOutputEvent
+from src.wonderland.pubsub.topic import Topic
+from src.wonderland.session import Session, SessionRegistry
+
+
+class ShardWorker:
+    """
+    The world of a single shard, running in its own process.
+
+    **Notes:**
+
+    -   A worker owns a set of `Land`s. It only ever receives input events
+        from players standing in one of the rooms of those lands, so its
+        `Topic` (and its GIL) is not shared with any other shard.
+
+    -   Messages are tuples of `(kind, connection_id, payload)`. Events travel
+        encoded with the `WireCodec`.
+
+    -   Output events produced while processing an input are sent back to the
+        connection which sent the input.
+    """
+
+    current: Optional["ShardWorker"] = None
+    """The worker running in this process, if any."""
+
+    def __init__(self, index: int, land_ids: set[int], inbox: Queue, outbox: Queue):
+        self.index = index
+        self.land_ids = land_ids
+        self.inbox = inbox
+        self.outbox = outbox
+        self._connection: int | None = None
+
+    @classmethod
+    def main(cls, index: int, land_ids: set[int], inbox: Queue, outbox: Queue):
+        """Process entry point, see `ShardRouter.start`."""
+        # Imported here so the parent process does not pay for the app setup
+        from src.wonderland.app import App
+        from src.wonderland.core.db import new_session
+
+        worker = cls(index, land_ids, inbox, outbox)
+        cls.current = worker
+        Session.set_orm(new_session())
+        App()
+        Topic.add_handler(BaseOutputEvent, worker.forward_output)
+        worker.run()
+
+    def run(self):
+        while True:
+            message = self.inbox.get()
+            if message is None:
+                break
+            kind, connection_id, payload = message
+            self._connection = connection_id
+            if kind == "input":
+                event = WireCodec.decode(payload)
+                SessionRegistry.touch(event.session)
+                Topic.push(event)
+            elif kind == "adopt":
+                self.adopt(payload)
+            elif kind == "lands":
+                self.land_ids = payload
+            self._connection = None
+        Topic.close()
+
+    def forward_output(self, event: BaseOutputEvent, **kwargs):
+        self.outbox.put(("output", self._connection, WireCodec.encode(event)))
+
+    def adopt(self, user_id: int):
+        """Welcome a player handed off by another shard."""
+        session = SessionRegistry.resolve(self._connection, user_id)
+        # The player may have visited this shard before, their `User` moved
+        # in another process since.
+        crud.refresh_user(session=Session.get_orm(), user=session.user)
+        Topic.push(LookInputEvent(session=session, raw_message="look"))
+
+    @classmethod
+    def traverse(cls, session: Session, portal: RoomPortal) -> bool:
+        """
+        Move the session's player through a portal.
+
+        If the portal leads to a land owned by another shard, the player is
+        handed off to that shard and their next input is routed there.
+
+        :param session: The session of the moving player.
+        :param portal: The portal being traversed.
+        :return: `True` when the player was handed off to another shard.
+        """
+        orm = session.get_orm()
+        with Topic.active().locks.rooms(portal.source_id, portal.target_id):
+            session.user = crud.update_user(
+                session=orm,
+                user=session.user,
+                field="room_id",
+                value=portal.target_id,
+            )
+        worker = cls.current
+        if worker is None:
+            return False
+        target = crud.get_room(session=orm, room_id=portal.target_id)
+        if target.land_id in worker.land_ids:
+            return False
+        worker.outbox.put(("handoff", worker._connection, (session.user.id, target.id)))
+        return True
@@ -0,0 +1,334 @@
+import time
+from collections import Counter, defaultdict
+from threading import Event, Thread, current_thread
+from typing import Callable, Iterable
+
+try:
+    import numpy as np
+except ImportError:  # numpy is the optional `sim` extra
+    np = None
+
+from sqlmodel import Session as OrmSession
+
+from src.wonderland import crud
+from src.wonderland.core.settings import Settings
+from src.wonderland.core.snapshots import RoomSnapshots
+from src.wonderland.core.versions import RoomVersions
+from src.wonderland.models import ThingCreate
+from src.wonderland.pubsub.events.ambient import AmbientOutputEvent
+from src.wonderland.pubsub.topic import Topic
+from src.wonderland.session import SessionRegistry
+from src.wonderland.utils import quantify
+
+
+WANDERS = 1
+"""Behaviour flag: the entity randomly takes the exits of its room."""
+
+DECAYS = 2
+"""Behaviour flag: the entity is deleted once its timer runs out."""
+
+
+class SimulationEngine:
+    """
+    Advance thousands of world entities (wandering NPCs, decaying items) at
+    once, without an ORM object or an event per entity.
+
+    **Notes:**
+
+    -   Entities are `Thing` rows. Their state lives in NumPy arrays, one
+        slot per entity: its room, its decay timer and its behaviour flags.
+        Each `tick` updates every entity with a handful of vectorized
+        operations.
+
+    -   Wanderers pick an exit uniformly among the open `RoomPortal`s of
+        their room. The portals are kept as a CSR adjacency (an offset per
+        room into a flat array of target rooms), so sampling a move is two
+        array lookups.
+
+    -   Only rooms someone can see produce output: the changes of a tick
+        are summed up per room, e.g. "3 rats wander in.", and pushed as one
+        `AmbientOutputEvent` per occupied room.
+
+    -   The database is written every `persist_every` ticks, in one
+        transaction: a bulk UPDATE for the entities which changed room and
+        a bulk DELETE for the decayed ones. Until then `look` shows the
+        last persisted state.
+
+    -   Timers and behaviour flags only live in memory. After a restart the
+        entities have to be added again.
+    """
+
+    def __init__(
+            self,
+            orm: OrmSession,
+            *,
+            move_chance: float = Settings.SIM_MOVE_CHANCE,
+            persist_every: int = Settings.SIM_PERSIST_EVERY,
+            seed: int | None = None,
+            observed_rooms: Callable[[], Iterable[int]] = SessionRegistry.occupied_rooms,
+    ):
+        """
+        :param orm: The ORM session the state is persisted with. The engine
+            should have its own when it runs in a thread, see `start`.
+        :param move_chance: Chance of a wanderer to take an exit, per tick.
+        :param persist_every: Ticks between two writes to the database.
+        :param seed: Seed of the random generator, for reproducible runs.
+        :param observed_rooms: The rooms which should receive output.
+        """
+        if np is None:
+            raise ImportError("The simulation engine needs numpy: pip install wonderland[sim]")
+        self.orm = orm
+        self.move_chance = move_chance
+        self.persist_every = persist_every
+        self.observed_rooms = observed_rooms
+        self.ticks = 0
+        self._rng = np.random.default_rng(seed)
+
+        # Entities
+        self._size = 0
+        self._ids = np.zeros(0, np.int64)
+        self._rooms = np.zeros(0, np.int64)
+        """The room of each entity, as an index into `_room_ids`."""
+        self._persisted = np.zeros(0, np.int64)
+        """The room of each entity in the database."""
+        self._timers = np.zeros(0, np.float64)
+        self._flags = np.zeros(0, np.uint8)
+        self._alive = np.zeros(0, bool)
+        self._names: list[str] = []
+        self._decayed: list[tuple[int, int]] = []
+        """Thing ids and persisted room indexes awaiting deletion."""
+
+        # Rooms
+        self._room_ids = np.zeros(0, np.int64)
+        self._room_index: dict[int, int] = dict()
+        self._offsets = np.zeros(1, np.int64)
+        self._targets = np.zeros(0, np.int64)
+        self.load_portals()
+
+        self._stop = Event()
+        self._thread: Thread | None = None
+
+    def __len__(self) -> int:
+        return int(self._alive[:self._size].sum())
+
+    # +-----------------------------------------------------------------------+
+    # |                               R O O M S                               |
+    # +-----------------------------------------------------------------------+
+    def _index_of(self, room_id: int) -> int:
+        index = self._room_index.get(room_id)
+        if index is None:
+            index = self._room_index[room_id] = len(self._room_ids)
+            self._room_ids = np.append(self._room_ids, room_id)
+            # A new room has no exits until the portals are reloaded
+            self._offsets = np.append(self._offsets, self._offsets[-1])
+        return index
+
+    def load_portals(self):
+        """(Re)build the adjacency of rooms from the open portals."""
+        edges = crud.list_open_portal_edges(session=self.orm)
+        sources = np.array([self._index_of(source) for source, _ in edges], np.int64)
+        targets = np.array([self._index_of(target) for _, target in edges], np.int64)
+        order = np.argsort(sources, kind="stable")
+        self._targets = targets[order]
+        degree = np.bincount(sources, minlength=len(self._room_ids))
+        self._offsets = np.concatenate(([0], np.cumsum(degree))).astype(np.int64)
+
+    # +-----------------------------------------------------------------------+
+    # |                            E N T I T I E S                            |
+    # +-----------------------------------------------------------------------+
+    def add(
+            self,
+            thing_ids: Iterable[int],
+            room_id: int,
+            name: str,
+            *,
+            wanders: bool = False,
+            decays_in: float | None = None,
+    ):
+        """
+        Simulate existing things.
+
+        :param thing_ids: The things, all named `name` and standing in `room_id`.
+        :param room_id: The room of the things.
+        :param name: The name of the things, used in the output.
+        :param wanders: Whether the things move through the portals.
+        :param decays_in: Seconds before the things are deleted, if ever.
+        """
+        ids = np.fromiter(thing_ids, np.int64)
+        count = len(ids)
+        room = self._index_of(room_id)
+        flags = (WANDERS if wanders else 0) | (DECAYS if decays_in is not None else 0)
+        self._compact()
+        self._ids = np.concatenate((self._ids[:self._size], ids))
+        self._rooms = np.concatenate((self._rooms[:self._size], np.full(count, room, np.int64)))
+        self._persisted = np.concatenate((self._persisted[:self._size], np.full(count, room, np.int64)))
+        self._timers = np.concatenate((self._timers[:self._size], np.full(count, decays_in or 0.0)))
+        self._flags = np.concatenate((self._flags[:self._size], np.full(count, flags, np.uint8)))
+        self._alive = np.concatenate((self._alive[:self._size], np.ones(count, bool)))
+        self._names.extend([name] * count)
+        self._size += count
+
+    def spawn(
+            self,
+            name: str,
+            room_id: int,
+            count: int = 1,
+            *,
+            wanders: bool = False,
+            decays_in: float | None = None,
+    ) -> list[int]:
+        """
+        Create things in the database and simulate them.
+
+        :return: The ids of the new things.
+        """
+        thing_ids = crud.create_things_for_room_bulk(
+            session=self.orm,
+            data=[ThingCreate(name=name)] * count,
+            room_id=room_id,
+        )
+        self.add(thing_ids, room_id, name, wanders=wanders, decays_in=decays_in)
+        return thing_ids
+
+    def _compact(self):
+        """Drop the slots of decayed entities, once they are deleted."""
+        if self._decayed:
+            return
+        alive = self._alive[:self._size]
+        if alive.all():
+            return
+        keep = np.flatnonzero(alive)
+        for name in ("_ids", "_rooms", "_persisted", "_timers", "_flags", "_alive"):
+            setattr(self, name, getattr(self, name)[keep])
+        self._names = [self._names[index] for index in keep.tolist()]
+        self._size = len(keep)
+
+    # +-----------------------------------------------------------------------+
+    # |                                T I C K                                |
+    # +-----------------------------------------------------------------------+
+    def tick(self, seconds: float = Settings.SIM_TICK_SECONDS):
+        """
+        Advance every entity, push the output of occupied rooms and persist
+        the state every `persist_every` ticks.
+
+        :param seconds: The time elapsed since the last tick.
+        """
+        self.ticks += 1
+        size = self._size
+        alive = self._alive[:size]
+        flags = self._flags[:size]
+        rooms = self._rooms[:size]
+        observed = np.zeros(len(self._room_ids), bool)
+        observed[np.fromiter(
+            (self._room_index[room] for room in self.observed_rooms() if room in self._room_index),
+            np.int64,
+        )] = True
+        messages: dict[int, Counter] = defaultdict(Counter)
+
+        decaying = alive & ((flags & DECAYS) != 0)
+        timers = self._timers[:size]
+        timers[decaying] -= seconds
+        expired = np.flatnonzero(decaying & (timers <= 0))
+        if expired.size:
+            alive[expired] = False
+            self._decayed.extend(zip(self._ids[expired].tolist(), self._persisted[expired].tolist()))
+            for index in expired[observed[rooms[expired]]].tolist():
+                messages[rooms[index]][(self._names[index], "crumbles to dust", "crumble to dust")] += 1
+
+        wanderers = np.flatnonzero(alive & ((flags & WANDERS) != 0))
+        if wanderers.size:
+            moving = wanderers[self._rng.random(wanderers.size) < self.move_chance]
+            sources = rooms[moving]
+            degree = self._offsets[sources + 1] - self._offsets[sources]
+            has_exit = degree > 0
+            moving, sources, degree = moving[has_exit], sources[has_exit], degree[has_exit]
+            picks = self._offsets[sources] + (self._rng.random(moving.size) * degree).astype(np.int64)
+            targets = self._targets[picks]
+            rooms[moving] = targets
+            seen = observed[sources] | observed[targets]
+            for index, source, target in zip(moving[seen].tolist(), sources[seen].tolist(), targets[seen].tolist()):
+                name = self._names[index]
+                if observed[source]:
+                    messages[source][(name, "wanders off", "wander off")] += 1
+                if observed[target]:
+                    messages[target][(name, "wanders in", "wander in")] += 1
+
+        # The background thread only queues its output, the topic's worker
+        # runs the handlers, see `start`.
+        push = Topic.enqueue if current_thread() is self._thread else Topic.push
+        for room, counts in messages.items():
+            markup = " ".join(
+                f"{quantify(count, name).capitalize()} {singular if count == 1 else plural}."
+                for (name, singular, plural), count in counts.items()
+            )
+            push(AmbientOutputEvent(room_id=int(self._room_ids[room]), markup=markup))
+
+        if self.persist_every and self.ticks % self.persist_every == 0:
+            self.persist()
+
+    def persist(self):
+        """Write the rooms of moved entities and delete decayed ones."""
+        size = self._size
+        alive = self._alive[:size]
+        moved = np.flatnonzero(alive & (self._rooms[:size] != self._persisted[:size]))
+        moves = list(zip(
+            self._ids[moved].tolist(),
+            self._room_ids[self._rooms[moved]].tolist(),
+        ))
+        decayed_ids = [thing_id for thing_id, _ in self._decayed]
+        touched = set(self._room_ids[self._persisted[moved]].tolist())
+        touched.update(self._room_ids[self._rooms[moved]].tolist())
+        touched.update(self._room_ids[np.array([room for _, room in self._decayed], np.int64)].tolist())
+        if not touched:
+            return
+        locks = Topic.active().locks
+        with locks.rooms(*touched):
+            with crud.transaction(self.orm):
+                renumbered = crud.move_things(session=self.orm, moves=moves, locks=locks)
+                crud.delete_things_by_id(session=self.orm, thing_ids=decayed_ids)
+            RoomVersions.bump(*touched)
+            RoomSnapshots.invalidate(*touched)
+        if renumbered:
+            # Things which wandered into another land were created again there
+            index = np.flatnonzero(np.isin(self._ids[:size], list(renumbered)))
+            self._ids[index] = [renumbered[thing_id] for thing_id in self._ids[index].tolist()]
+        self._persisted[moved] = self._rooms[moved]
+        self._decayed = []
+        self._compact()
+
+    # +-----------------------------------------------------------------------+
+    # |                              T H R E A D                              |
+    # +-----------------------------------------------------------------------+
+    def start(self, interval: float = Settings.SIM_TICK_SECONDS):
+        """
+        Tick in a background thread, queueing output on the active topic.
+
+        The thread never runs handlers itself, they would race the topic's
+        worker on the shared ORM session. The worker delivers the output.
+
+        :param interval: Seconds between two ticks.
+        :raises ValueError: When the topic has no worker, see
+            `Topic.start_workers`.
+        """
+        topic = Topic.active()
+        if not topic.workers():
+            raise ValueError("The simulation needs a topic worker to deliver its output.")
+        self._stop.clear()
+        self._thread = Thread(target=self._run, args=(topic, interval), name="simulation", daemon=True)
+        self._thread.start()
+
+    def _run(self, topic: Topic, interval: float):
+        with topic.activate():
+            last = time.monotonic()
+            while not self._stop.wait(interval):
+                now = time.monotonic()
+                self.tick(now - last)
+                last = now
+            self.persist()
+
+    def stop(self):
+        """Stop ticking and persist the state."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,314 @@
+import json
+import statistics
+import time
+import typing as t
+from pathlib import Path
+from threading import Lock
+
+from src.wonderland import crud
+from src.wonderland.core.settings import Settings
+from src.wonderland.models import UserCreate
+from src.wonderland.pubsub.events.app import ClientConnectInputEvent, ClientDisconnectInputEvent
+from src.wonderland.pubsub.events.base import BaseOutputEvent
+from src.wonderland.pubsub.topic import Topic
+from src.wonderland.session import Session, SessionRegistry
+
+try:
+    import resource
+except ImportError:  # Not on Windows
+    resource = None
+
+if t.TYPE_CHECKING:
+    from src.wonderland.app import App
+
+
+class ReplayMismatch(AssertionError):
+    """Raised when a replay did not send the outputs of its baseline."""
+
+
+class PerformanceRegression(AssertionError):
+    """Raised when a replay was slower or bigger than its baseline allows."""
+
+
+# +---------------------------------------------------------------------------+
+# |                               R E C O R D                                 |
+# +---------------------------------------------------------------------------+
+class TraceRecorder:
+    """
+    Record what the clients of a live server send, to replay it later with
+    `TraceReplayer`.
+
+    **Notes:**
+
+    -   A trace is a JSON lines file. Each record has the seconds since the
+        recording started (`at`), the id of the session (`session`) and its
+        `kind`: `"connect"` and `"disconnect"` of a client, `"input"` with the
+        raw `line` given to `App.handle_input`, or `"open"` with the `user`
+        name of a session which was opened logged in, without connecting.
+
+    -   Raw lines are recorded rather than events, so a replay goes through
+        the command registry, the rate limiter and the handlers again.
+
+    -   Records are written as they come, a trace is readable up to the last
+        complete line after a crash.
+    """
+
+    def __init__(self, path: Path | str | None = None):
+        """
+        :param path: The trace file, defaults to a new file in `Settings.TRACE_DIR`.
+        """
+        if path is None:
+            Settings.TRACE_DIR.mkdir(parents=True, exist_ok=True)
+            path = Settings.TRACE_DIR / f"trace-{time.strftime('%Y%m%d-%H%M%S')}.jsonl"
+        self.path = Path(path)
+        self.records = 0
+        self._started = time.monotonic()
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._seen: set[int] = set()
+        self._lock = Lock()
+        self._topics: list[Topic] = []
+
+    def record(self, session: Session, line: str):
+        """Record a line of input, see `App.handle_input`."""
+        if session.id not in self._seen:
+            self._write(session, "open", user=session.user.name if session.user is not None else None)
+        self._write(session, "input", line=line)
+
+    def _on_connect(self, event: ClientConnectInputEvent, **kwargs):
+        self._write(event.session, "connect")
+
+    def _on_disconnect(self, event: ClientDisconnectInputEvent, **kwargs):
+        self._write(event.session, "disconnect")
+
+    def _write(self, session: Session, kind: str, **fields):
+        with self._lock:
+            self._seen.add(session.id)
+            record = {"at": round(time.monotonic() - self._started, 6), "session": session.id, "kind": kind, **fields}
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+            self.records += 1
+
+    def attach(self, topic: Topic | None = None):
+        """Record the clients connecting to and disconnecting from the topic."""
+        topic = topic or Topic.active()
+        topic.add_handler(ClientConnectInputEvent, self._on_connect)
+        topic.add_handler(ClientDisconnectInputEvent, self._on_disconnect)
+        self._topics.append(topic)
+
+    def close(self):
+        for topic in self._topics:
+            topic.remove_handler(ClientConnectInputEvent, self._on_connect)
+            topic.remove_handler(ClientDisconnectInputEvent, self._on_disconnect)
+        self._topics.clear()
+        with self._lock:
+            self._file.close()
+
+    @staticmethod
+    def read(path: Path | str) -> t.Iterator[dict]:
+        """The records of a trace, ignoring a torn last line."""
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    return
+
+
+# +---------------------------------------------------------------------------+
+# |                               R E P L A Y                                 |
+# +---------------------------------------------------------------------------+
+class ReplayResult(t.NamedTuple):
+    inputs: int
+    events_per_second: float
+    """Lines of input handled per second of handling, waits excluded."""
+    p99_ms: float
+    """99th percentile of the time to handle a line of input."""
+    peak_rss_mb: float | None
+    """Peak resident memory of the process, `None` where it cannot be read."""
+    outputs: list[tuple[int, str]]
+    """The markup sent to each session of the trace, in order."""
+
+    def as_baseline(self) -> dict:
+        return self._asdict()
+
+    @classmethod
+    def from_baseline(cls, baseline: dict) -> "ReplayResult":
+        return cls(**{**baseline, "outputs": [tuple(output) for output in baseline["outputs"]]})
+
+    @classmethod
+    def median(cls, results: t.Sequence["ReplayResult"]) -> "ReplayResult":
+        """
+        Combine several replays of a trace, a single one is too noisy to
+        compare with a baseline: a few hundred inputs take milliseconds, most
+        of them waiting on the disk for the database to commit.
+
+        :param results: The replays, on the same seed.
+        :return: The median of each measure.
+        :raises ReplayMismatch: When the replays sent different outputs.
+        """
+        first = results[0]
+        for idx, result in enumerate(results[1:], start=1):
+            if result.outputs != first.outputs:
+                raise ReplayMismatch(f"Replay {idx} sent other outputs than replay 0, the trace is not deterministic.")
+        rss = [result.peak_rss_mb for result in results if result.peak_rss_mb is not None]
+        return cls(
+            inputs=first.inputs,
+            events_per_second=statistics.median(result.events_per_second for result in results),
+            p99_ms=statistics.median(result.p99_ms for result in results),
+            peak_rss_mb=statistics.median(rss) if rss else None,
+            outputs=first.outputs,
+        )
+
+    def check(
+            self,
+            baseline: dict,
+            *,
+            min_throughput: float = Settings.TRACE_MIN_THROUGHPUT,
+            max_p99: float = Settings.TRACE_MAX_P99,
+            max_rss: float = Settings.TRACE_MAX_RSS,
+    ):
+        """
+        Compare the replay with a stored baseline, see `as_baseline`. Both
+        should be the `median` of several replays.
+
+        :param baseline: The baseline of the same trace on the same seed.
+        :param min_throughput: Share of the baseline's inputs per second to reach.
+        :param max_p99: Multiple of the baseline's p99 latency not to exceed.
+        :param max_rss: Multiple of the baseline's peak memory not to exceed.
+        :raises ReplayMismatch: When the outputs differ.
+        :raises PerformanceRegression: When a budget is exceeded.
+        """
+        expected = [tuple(output) for output in baseline["outputs"]]
+        if self.outputs != expected:
+            idx = next(
+                (i for i, pair in enumerate(zip(self.outputs, expected)) if pair[0] != pair[1]),
+                min(len(self.outputs), len(expected)),
+            )
+            got = self.outputs[idx] if idx < len(self.outputs) else None
+            want = expected[idx] if idx < len(expected) else None
+            raise ReplayMismatch(f"Output {idx} differs: expected {want!r}, got {got!r}.")
+        failures = []
+        if self.events_per_second < baseline["events_per_second"] * min_throughput:
+            failures.append(f"{self.events_per_second:,.0f} inputs/s, baseline {baseline['events_per_second']:,.0f}")
+        if self.p99_ms > baseline["p99_ms"] * max_p99:
+            failures.append(f"p99 {self.p99_ms:.3f} ms, baseline {baseline['p99_ms']:.3f} ms")
+        if self.peak_rss_mb is not None and baseline.get("peak_rss_mb"):
+            if self.peak_rss_mb > baseline["peak_rss_mb"] * max_rss:
+                failures.append(f"peak RSS {self.peak_rss_mb:.1f} MB, baseline {baseline['peak_rss_mb']:.1f} MB")
+        if failures:
+            raise PerformanceRegression("; ".join(failures))
+
+
+class TraceReplayer:
+    """
+    Replay a trace against a fresh, seeded database and measure how fast it
+    was handled.
+
+    **Notes:**
+
+    -   Every line goes through `App.handle_input`, so the command registry,
+        the rate limiter and the `Topic` handlers all run as they did live.
+        The outputs pushed while handling a line are collected for the
+        session which sent it, see `Topic.collect`.
+
+    -   Replays at full speed by default, or at `speed` times the recorded
+        pace (1.0 is real time). Either way the app's rate limiter reads the
+        trace's clock, so the same inputs are throttled and the outputs do
+        not depend on the speed.
+
+    -   Handlers must run inline (`Settings.HANDLER_TIMEOUT = None`, the
+        default), otherwise their outputs are pushed from another thread and
+        not collected.
+
+    -   The database must be seeded the same way for every replay of a trace,
+        e.g. from an empty directory, or the outputs will differ.
+    """
+
+    def __init__(self, app_factory: t.Callable[..., "App"], *, speed: float | None = None):
+        """
+        :param app_factory: Builds the app, called with the `rate_limiter` to use.
+        :param speed: Pace of the replay, `None` for full speed.
+        """
+        # Imported here, the commands package imports the events package
+        from src.wonderland.commands.limits import RateLimiter
+
+        self.speed = speed
+        self._now = 0.0
+        self.app = app_factory(rate_limiter=RateLimiter(clock=lambda: self._now))
+
+    def replay(self, path: Path | str) -> ReplayResult:
+        """
+        Replay every record of a trace.
+
+        :param path: The trace file, see `TraceRecorder`.
+        :return: The outputs and the measured performance.
+        """
+        sessions: dict[int, Session] = dict()
+        outputs: list[tuple[int, str]] = []
+        latencies: list[float] = []
+        started = time.perf_counter()
+        for record in TraceRecorder.read(path):
+            self._now = record["at"]
+            if self.speed:
+                delay = started + record["at"] / self.speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            key = record["session"]
+            with Topic.collect(BaseOutputEvent) as collected:
+                began = time.perf_counter()
+                self._apply(record, sessions)
+                elapsed = time.perf_counter() - began
+            if record["kind"] == "input":
+                latencies.append(elapsed)
+            outputs.extend((key, event.markup) for event in collected)
+        busy = sum(latencies)
+        latencies.sort()
+        return ReplayResult(
+            inputs=len(latencies),
+            events_per_second=len(latencies) / busy if busy else 0.0,
+            p99_ms=latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1e3 if latencies else 0.0,
+            peak_rss_mb=_peak_rss_mb(),
+            outputs=outputs,
+        )
+
+    def _apply(self, record: dict, sessions: dict[int, Session]):
+        key, kind = record["session"], record["kind"]
+        if kind == "open":
+            sessions[key] = SessionRegistry.open(user=self._user(record.get("user")))
+        elif kind == "connect":
+            sessions[key] = session = SessionRegistry.open()
+            Topic.push(ClientConnectInputEvent(session=session, raw_message=""))
+        elif kind == "input":
+            self.app.handle_input(sessions[key], record["line"])
+        elif kind == "disconnect":
+            session = sessions.pop(key)
+            Topic.push(ClientDisconnectInputEvent(session=session, raw_message=""))
+
+    @staticmethod
+    def _user(name: str | None):
+        if name is None:
+            return None
+        orm = Session.get_orm()
+        user = crud.get_user_by_name(session=orm, name=name)
+        if user is None:
+            user = crud.create_user(session=orm, data=UserCreate(name=name))
+        return user
+
+
+def _peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    # Kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_baseline(path: Path | str) -> dict | None:
+    path = Path(path)
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def save_baseline(path: Path | str, result: ReplayResult):
+    Path(path).write_text(json.dumps(result.as_baseline(), indent=1), encoding="utf-8")
+
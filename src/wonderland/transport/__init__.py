@@ -0,0 +1,3 @@
+from .deflate import DeflateParams, PerMessageDeflate, negotiate_deflate
+from .delta import DeltaDecoder, DeltaEncoder
+from .stream import Message, OutboundStream
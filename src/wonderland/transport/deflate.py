@@ -0,0 +1,159 @@
+import typing as t
+import zlib
+
+from src.wonderland.core.settings import Settings
+
+_TAIL = b"\x00\x00\xff\xff"
+"""Ends every sync flush, left out of the message and added back to inflate it (RFC 7692 7.2.1)."""
+
+
+class DeflateParams(t.NamedTuple):
+    """The permessage-deflate parameters agreed with a client."""
+
+    server_context_takeover: bool = True
+    client_context_takeover: bool = True
+    server_max_window_bits: int = 15
+    client_max_window_bits: int = 15
+
+    def header(self) -> str:
+        """The `Sec-WebSocket-Extensions` response accepting these parameters."""
+        parts = ["permessage-deflate"]
+        if not self.server_context_takeover:
+            parts.append("server_no_context_takeover")
+        if not self.client_context_takeover:
+            parts.append("client_no_context_takeover")
+        if self.server_max_window_bits < 15:
+            parts.append(f"server_max_window_bits={self.server_max_window_bits}")
+        if self.client_max_window_bits < 15:
+            parts.append(f"client_max_window_bits={self.client_max_window_bits}")
+        return "; ".join(parts)
+
+
+def negotiate_deflate(offers: str | None) -> DeflateParams | None:
+    """
+    Pick the first permessage-deflate offer of a client we can accept.
+
+    :param offers: The client's `Sec-WebSocket-Extensions` header.
+    :return: The agreed parameters, or `None` to send messages uncompressed.
+    """
+    if not offers or not Settings.TRANSPORT_DEFLATE:
+        return None
+    for offer in offers.split(","):
+        name, *raw_params = [part.strip() for part in offer.split(";")]
+        if name != "permessage-deflate":
+            continue
+        params = _accept_offer(raw_params)
+        if params is not None:
+            return params
+    return None
+
+
+def _accept_offer(raw_params: list[str]) -> DeflateParams | None:
+    seen = set()
+    params = DeflateParams()
+    for raw in raw_params:
+        key, _, value = (part.strip().strip('"') for part in raw.partition("="))
+        if key in seen:
+            return None
+        seen.add(key)
+        if key == "server_no_context_takeover" and not value:
+            params = params._replace(server_context_takeover=False)
+        elif key == "client_no_context_takeover" and not value:
+            params = params._replace(client_context_takeover=False)
+        elif key == "server_max_window_bits" and value.isdigit() and 9 <= int(value) <= 15:
+            # zlib cannot write a raw deflate stream with a 256 bytes window
+            params = params._replace(server_max_window_bits=int(value))
+        elif key == "client_max_window_bits" and (not value or value.isdigit() and 8 <= int(value) <= 15):
+            # Without a value the client only tells it supports the parameter
+            params = params._replace(client_max_window_bits=int(value or 15))
+        else:
+            return None
+    return params
+
+
+class PerMessageDeflate:
+    """
+    Compress the messages sent on one connection and inflate those received,
+    as agreed by `negotiate_deflate`.
+
+    **Notes:**
+
+    -   With context takeover (the default, unless the client asked for
+        `server_no_context_takeover`) one compressor lives as long as the
+        connection. Its window keeps the previous messages, so a message
+        repeating a recent one (e.g. the same room looked at again) shrinks
+        to a few back references.
+
+    -   Every message ends with a sync flush, so the client can inflate it
+        as soon as it arrives.
+
+    -   Messages under `Settings.TRANSPORT_DEFLATE_MIN_BYTES` are sent as
+        they are, with the RSV1 bit clear.
+
+    -   zlib cannot write a raw deflate stream with a 256 bytes window: an
+        offer limiting the server to 8 bits is declined, and a client's 8
+        bits window is inflated with 9 bits, which accepts it.
+    """
+
+    __slots__ = (
+        "params", "is_server", "level", "min_bytes",
+        "_compressor", "_decompressor", "raw_bytes", "sent_bytes",
+    )
+
+    def __init__(
+            self,
+            params: DeflateParams,
+            *,
+            is_server: bool = True,
+            level: int = Settings.TRANSPORT_DEFLATE_LEVEL,
+            min_bytes: int = Settings.TRANSPORT_DEFLATE_MIN_BYTES,
+    ):
+        self.params = params
+        self.is_server = is_server
+        self.level = level
+        self.min_bytes = min_bytes
+        self._compressor = None
+        self._decompressor = None
+        self.raw_bytes = 0
+        self.sent_bytes = 0
+
+    def compress(self, data: bytes) -> tuple[bytes, bool]:
+        """
+        Compress an outgoing message.
+
+        :param data: The message payload.
+        :return: The payload to send, and whether it was compressed (RSV1).
+        """
+        self.raw_bytes += len(data)
+        if len(data) < self.min_bytes:
+            self.sent_bytes += len(data)
+            return data, False
+        if self.is_server:
+            takeover, window_bits = self.params.server_context_takeover, self.params.server_max_window_bits
+        else:
+            takeover, window_bits = self.params.client_context_takeover, self.params.client_max_window_bits
+        if self._compressor is None or not takeover:
+            self._compressor = zlib.compressobj(self.level, zlib.DEFLATED, -max(window_bits, 9))
+        compressed = self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        if compressed.endswith(_TAIL):
+            compressed = compressed[:-len(_TAIL)]
+        self.sent_bytes += len(compressed)
+        return compressed, True
+
+    def decompress(self, data: bytes, compressed: bool = True) -> bytes:
+        """
+        Inflate an incoming message.
+
+        :param data: The received payload.
+        :param compressed: Whether the message had the RSV1 bit set.
+        :return: The message payload.
+        """
+        if not compressed:
+            return data
+        if self.is_server:
+            takeover, window_bits = self.params.client_context_takeover, self.params.client_max_window_bits
+        else:
+            takeover, window_bits = self.params.server_context_takeover, self.params.server_max_window_bits
+        if self._decompressor is None or not takeover:
+            self._decompressor = zlib.decompressobj(-max(window_bits, 9))
+        return self._decompressor.decompress(data + _TAIL)
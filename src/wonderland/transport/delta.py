@@ -0,0 +1,110 @@
+import json
+
+from src.wonderland.pubsub.events.look import RoomView
+
+
+class DeltaEncoder:
+    """
+    Send a client only what changed in a room since it last looked at it.
+
+    **Notes:**
+
+    -   Driven by the room version of each `RoomView`: the first view of a
+        room is sent whole (`"full"`), the same version again is sent as a
+        bare `{"room", "version"}` and a newer one as the names whose count
+        changed since the `"base"` version the client holds (0 when gone).
+
+    -   Versions come from the clock of the shard process owning the room
+        (see `RoomVersions`), so after a hand-off or a restart they may go
+        back or repeat. An unchanged version is only trusted when the view
+        is unchanged too, anything else is diffed by content.
+
+    -   One encoder per connection. It keeps the last view of at most
+        `max_rooms` rooms, the least recently seen is forgotten first and
+        sent whole when seen again.
+    """
+
+    __slots__ = ("max_rooms", "_views")
+
+    def __init__(self, max_rooms: int = 16):
+        self.max_rooms = max_rooms
+        self._views: dict[int, RoomView] = dict()
+
+    def encode(self, view: RoomView) -> dict:
+        """
+        The change of a room since the client's last view of it.
+
+        :param view: What the client sees now.
+        :return: The delta, JSON serializable, see `DeltaDecoder.apply`.
+        """
+        last = self._views.pop(view.room_id, None)
+        self._views[view.room_id] = view
+        if len(self._views) > self.max_rooms:
+            del self._views[next(iter(self._views))]
+        delta = {"room": view.room_id, "version": view.version}
+        if last is None:
+            delta["full"] = {
+                "name": view.name,
+                "description": view.description,
+                "counts": view.counts,
+                "total": view.total,
+            }
+            return delta
+        if last.version == view.version and last == view:
+            return delta
+        delta["base"] = last.version
+        if view.name != last.name:
+            delta["name"] = view.name
+        if view.description != last.description:
+            delta["description"] = view.description
+        counts = {name: count for name, count in view.counts.items() if last.counts.get(name) != count}
+        counts.update((name, 0) for name in last.counts if name not in view.counts)
+        if counts:
+            delta["counts"] = counts
+        if view.total != last.total:
+            delta["total"] = view.total
+        return delta
+
+    def forget(self, room_id: int):
+        self._views.pop(room_id, None)
+
+
+class DeltaDecoder:
+    """The client side of `DeltaEncoder`: rebuild the rooms from their deltas."""
+
+    __slots__ = ("_views",)
+
+    def __init__(self):
+        self._views: dict[int, RoomView] = dict()
+
+    def apply(self, delta: dict | str | bytes) -> RoomView:
+        """
+        Apply a delta to the room it describes.
+
+        :param delta: A delta from `DeltaEncoder.encode`, or its JSON.
+        :return: The room as the server sees it.
+        :raises KeyError: When the delta is based on a room never received.
+        """
+        if not isinstance(delta, dict):
+            delta = json.loads(delta)
+        room_id = delta["room"]
+        if "full" in delta:
+            view = RoomView(room_id=room_id, version=delta["version"], **delta["full"])
+        else:
+            last = self._views[room_id]
+            counts = dict(last.counts)
+            for name, count in delta.get("counts", {}).items():
+                if count:
+                    counts[name] = count
+                else:
+                    counts.pop(name, None)
+            view = RoomView(
+                room_id=room_id,
+                version=delta["version"],
+                name=delta.get("name", last.name),
+                description=delta.get("description", last.description),
+                counts=counts,
+                total=delta.get("total", last.total),
+            )
+        self._views[room_id] = view
+        return view
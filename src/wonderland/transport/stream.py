@@ -0,0 +1,82 @@
+import json
+import typing as t
+
+from src.wonderland.core.settings import Settings
+from src.wonderland.pubsub.events.base import BaseOutputEvent
+from src.wonderland.transport.deflate import DeflateParams, PerMessageDeflate
+from src.wonderland.transport.delta import DeltaEncoder
+
+
+class Message(t.NamedTuple):
+    """One websocket message, ready to be framed."""
+
+    data: bytes
+    compressed: bool
+    """Whether the RSV1 bit is set, see `PerMessageDeflate`."""
+
+
+class OutboundStream:
+    """
+    Turn the output events of one connection into websocket messages.
+
+    **Notes:**
+
+    -   Plain mode sends the event's markup as it is. Delta mode sends JSON
+        objects instead: `{"markup": ...}` for most events, and only
+        `{"room": <delta>}` for the events describing a room (e.g. "look"),
+        which the client applies to its copy of the room and renders itself,
+        see `DeltaEncoder` and `DeltaDecoder`.
+
+    -   Either mode is then compressed when the client negotiated
+        permessage-deflate, see `negotiate_deflate`.
+
+    -   Not thread safe: each connection's messages are encoded in order, by
+        the one thread writing to its socket.
+    """
+
+    __slots__ = ("deflate", "deltas", "events", "raw_bytes", "sent_bytes")
+
+    def __init__(self, *, deflate: DeflateParams | None = None, deltas: bool = Settings.TRANSPORT_DELTAS):
+        """
+        :param deflate: The compression agreed with the client, `None` if none.
+        :param deltas: Whether the client asked for structured deltas.
+        """
+        self.deflate = PerMessageDeflate(deflate) if deflate is not None else None
+        self.deltas = DeltaEncoder() if deltas else None
+        self.events = 0
+        self.raw_bytes = 0
+        """Bytes the markup of the events would take, sent whole and uncompressed."""
+        self.sent_bytes = 0
+
+    def encode(self, event: BaseOutputEvent) -> Message:
+        """
+        Encode an output event for this connection.
+
+        :param event: The event.
+        :return: The message to send.
+        """
+        markup = event.markup.encode()
+        self.events += 1
+        self.raw_bytes += len(markup)
+        data = markup
+        if self.deltas is not None:
+            view = getattr(event, "room", None)
+            if view is not None:
+                body = {"room": self.deltas.encode(view)}
+            else:
+                body = {"markup": event.markup}
+            data = json.dumps(body, separators=(",", ":")).encode()
+        compressed = False
+        if self.deflate is not None:
+            data, compressed = self.deflate.compress(data)
+        self.sent_bytes += len(data)
+        return Message(data, compressed)
+
+    def stats(self) -> dict:
+        return {
+            "events": self.events,
+            "raw_bytes": self.raw_bytes,
+            "sent_bytes": self.sent_bytes,
+            "bytes_per_event": self.sent_bytes / self.events if self.events else 0.0,
+            "ratio": self.sent_bytes / self.raw_bytes if self.raw_bytes else 0.0,
+        }
@@ -1 +1 @@
-from .grammar import aan
+from .grammar import aan, plural, quantify
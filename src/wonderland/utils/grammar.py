@@ -9,3 +9,31 @@ def aan(word: str) -> str:
         if word.startswith(vowel):
             return "an"
     return "a"
+
+
+def plural(word: str) -> str:
+    """
+    Naively pluralize the given word. Only the last word of a phrase is
+    pluralized, e.g. 'red apple' becomes 'red apples'.
+
+    :param word: The word to pluralize.
+    :return: The plural form of the word.
+    """
+    if word.endswith(("s", "x", "z", "ch", "sh")):
+        return word + "es"
+    if word.endswith("y") and word[-2:-1] not in ("", "a", "e", "i", "o", "u"):
+        return word[:-1] + "ies"
+    return word + "s"
+
+
+def quantify(count: int, word: str) -> str:
+    """
+    Describe an amount of something, e.g. 'an apple' or '3 apples'.
+
+    :param count: How many of the thing there are.
+    :param word: The name of the thing.
+    :return: The word with its article or its quantity.
+    """
+    if count == 1:
+        return f"{aan(word)} {word}"
+    return f"{count:,} {plural(word)}"